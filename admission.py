@@ -0,0 +1,175 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+import logging
+from typing import Deque, Dict, List, Optional, Tuple
+
+from instrumentation import record_stage
+from documents import documents
+from inspection import inspections
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Output formats that rasterize every page, so cost scales with pages x DPI
+RENDER_FORMATS = {"jpg", "jpeg", "png", "tiff", "pptx", "ppt"}
+
+# Render DPI implied by the convert "quality" form field
+QUALITY_DPI = {"high": 300, "medium": 150, "low": 72}
+
+# Cost units each operation may have in flight at once. One unit is roughly one
+# page rendered at 150 DPI, or one MB of input for operations that don't render.
+# Override with FLIPFILE_ADMISSION_<OPERATION>=<units>, e.g. FLIPFILE_ADMISSION_CONVERT=800
+DEFAULT_CAPACITY = {
+    "convert": 400,
+    "compress": 200,
+    "edit": 200,
+    "protect": 200,
+    "unlock": 50,
+    "extract-colors": 100,
+    "images-to-pdf": 400,
+    "batch": 400,
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when an operation's wait queue is full or the wait timed out"""
+
+    def __init__(self, operation: str, retry_after: int):
+        super().__init__(f"Server busy with {operation} jobs, retry in {retry_after}s")
+        self.operation = operation
+        self.retry_after = retry_after
+
+
+class WeightedSemaphore:
+    """FIFO semaphore where each holder takes a variable number of units
+
+    Strict FIFO means a large job at the head of the queue is not starved by a
+    stream of small ones slipping past it.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.available = capacity
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def queued_units(self) -> int:
+        return sum(weight for weight, _ in self._waiters)
+
+    async def acquire(self, weight: int):
+        if not self._waiters and self.available >= weight:
+            self.available -= weight
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (weight, future)
+        self._waiters.append(entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled: hand the units back
+                self.release(weight)
+            else:
+                self._waiters.remove(entry)
+                self._wake()
+            raise
+
+    def release(self, weight: int):
+        self.available += weight
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self._waiters[0][0] <= self.available:
+            weight, future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.available -= weight
+            future.set_result(None)
+
+
+class AdmissionController:
+    """Admit heavy tool calls by estimated cost, queueing or rejecting the excess"""
+
+    def __init__(self, capacity: Optional[Dict[str, int]] = None, max_waiting: int = 32,
+                 max_wait: float = 30.0):
+        capacity = dict(DEFAULT_CAPACITY, **(capacity or {}))
+        for operation in capacity:
+            env_value = os.environ.get(f"FLIPFILE_ADMISSION_{operation.upper().replace('-', '_')}")
+            if env_value:
+                capacity[operation] = int(env_value)
+
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self._semaphores = {op: WeightedSemaphore(units) for op, units in capacity.items()}
+        # Smoothed seconds of processing per cost unit, used for Retry-After
+        self._seconds_per_unit = {op: 0.05 for op in capacity}
+
+    def estimate_cost(self, input_paths: List[Path], operation: str,
+                      output_format: Optional[str] = None, dpi: int = 150) -> int:
+        """Estimate cost units from input size and, for rasterizing jobs, pages x DPI"""
+        size_mb = sum(documents.size(path) for path in input_paths) / MB
+        cost = max(1.0, size_mb)
+        scale = (dpi / 150) ** 2
+
+        if operation == "compress":
+            cost *= max(1.0, scale)
+        elif operation in ("convert", "images-to-pdf") and (
+                output_format in RENDER_FORMATS or operation == "images-to-pdf"):
+            pages = sum(self._page_count(path) for path in input_paths)
+            cost = max(cost, pages * scale)
+
+        return max(1, math.ceil(cost))
+
+    def _page_count(self, path: Path) -> int:
+        if path.suffix.lower() != ".pdf":
+            return 1
+        # Unreadable input counts as one page; the tool itself reports the error
+        return inspections.get(path)["pages"] or 1
+
+    def check(self, operation: str):
+        """Fail fast, before any upload is written, if the queue is already full"""
+        semaphore = self._semaphores[operation]
+        if semaphore.waiting >= self.max_waiting:
+            raise AdmissionRejected(operation, self._retry_after(operation))
+
+    def _retry_after(self, operation: str) -> int:
+        semaphore = self._semaphores[operation]
+        backlog = semaphore.queued_units + semaphore.capacity - semaphore.available
+        seconds = backlog * self._seconds_per_unit[operation] / semaphore.capacity
+        return min(60, max(1, math.ceil(seconds)))
+
+    @asynccontextmanager
+    async def admit(self, operation: str, cost: int):
+        """Hold cost units of the operation's budget for the duration of the block"""
+        self.check(operation)
+        semaphore = self._semaphores[operation]
+        # A job bigger than the whole budget runs alone rather than never
+        weight = min(cost, semaphore.capacity)
+
+        queued = time.perf_counter()
+        try:
+            await asyncio.wait_for(semaphore.acquire(weight), self.max_wait)
+        except asyncio.TimeoutError:
+            raise AdmissionRejected(operation, self._retry_after(operation))
+        record_stage(operation, "queue", time.perf_counter() - queued)
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            semaphore.release(weight)
+            elapsed = time.perf_counter() - started
+            self._seconds_per_unit[operation] = (
+                0.8 * self._seconds_per_unit[operation] + 0.2 * elapsed / cost
+            )
@@ -0,0 +1,160 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+from pathlib import Path
+import logging
+from typing import Dict, Iterable, Optional, Set
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from stats import stats
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Files too small to be worth compressing are always sent as-is
+MIN_COMPRESS_SIZE = 512
+
+CACHE_CONTROL = {
+    # The page itself must revalidate so a deploy shows up on the next load;
+    # the ETag turns that into a 304 with no body
+    ".html": "no-cache",
+    ".css": "public, max-age=3600",
+    ".js": "public, max-age=3600",
+}
+
+
+class Asset:
+    """One file held in memory with its precompressed variants"""
+
+    __slots__ = ("path", "media_type", "mtime_ns", "etag", "variants")
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if self.media_type.startswith("text/") or self.media_type == "application/javascript":
+            self.media_type += "; charset=utf-8"
+        self.load()
+
+    def load(self):
+        self.mtime_ns = self.path.stat().st_mtime_ns
+        body = self.path.read_bytes()
+        digest = hashlib.sha1(body).hexdigest()[:16]
+        self.etag = f'"{digest}"'
+        # encoding -> (body, etag); each encoding gets its own strong ETag
+        self.variants = {"identity": (body, self.etag)}
+
+    def compress(self):
+        """Add the gzip and brotli variants (brotli at quality 11 takes a while)"""
+        body, _ = self.variants["identity"]
+        digest = self.etag.strip('"')
+        if len(body) >= MIN_COMPRESS_SIZE:
+            variants = dict(self.variants)
+            variants["gzip"] = (gzip.compress(body, 9, mtime=0), f'"{digest}-gz"')
+            if brotli is not None:
+                variants["br"] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+            self.variants = variants
+
+    def select(self, accept_encoding: str):
+        """Pick the smallest variant the client accepts"""
+        accepted = {token.split(";")[0].strip() for token in accept_encoding.lower().split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.variants:
+                return encoding, self.variants[encoding]
+        return "identity", self.variants["identity"]
+
+
+class StaticAssets:
+    """Serve a fixed set of files from memory, reloading them when they change on disk"""
+
+    def __init__(self, directory: Path, names: Iterable[str], reload_interval: Optional[float] = None):
+        self.directory = Path(directory)
+        if reload_interval is None:
+            reload_interval = float(os.environ.get("FLIPFILE_ASSET_RELOAD", "1"))
+        self.reload_interval = reload_interval
+        self._next_check = time.monotonic() + reload_interval
+        self._assets: Dict[str, Asset] = {}
+        self._reloading: Set[str] = set()
+        for name in names:
+            path = self.directory / name
+            if path.exists():
+                self._assets[name] = Asset(path)
+            else:
+                logger.warning(f"Static asset not found: {path}")
+        # Compressed variants are built off the startup path; until they are
+        # ready the uncompressed body is served
+        threading.Thread(target=self._compress_all, name="asset-compress", daemon=True).start()
+
+    def _compress_all(self):
+        for asset in list(self._assets.values()):
+            try:
+                asset.compress()
+            except Exception as e:
+                logger.error(f"Error compressing {asset.path}: {e}")
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._assets
+
+    def _maybe_reload(self):
+        # Polling mtimes at most once per interval keeps the hot path to a clock read
+        if self.reload_interval <= 0:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        for name, asset in list(self._assets.items()):
+            if name in self._reloading:
+                continue
+            try:
+                changed = asset.path.stat().st_mtime_ns != asset.mtime_ns
+            except OSError as e:
+                logger.error(f"Error reloading {asset.path}: {e}")
+                continue
+            if changed:
+                # Compression takes a while, so it runs off the event loop like
+                # at startup; the old version is served until the new one is ready
+                self._reloading.add(name)
+                threading.Thread(target=self._reload, args=(name, asset.path),
+                                 name="asset-reload", daemon=True).start()
+
+    def _reload(self, name: str, path: Path):
+        try:
+            asset = Asset(path)
+            asset.compress()
+            # Swapped in whole, so a response never mixes a body and ETag from two versions
+            self._assets[name] = asset
+            logger.info(f"Reloaded static asset: {path}")
+        except Exception as e:
+            logger.error(f"Error reloading {path}: {e}")
+        finally:
+            self._reloading.discard(name)
+
+    def response(self, name: str, request: Request) -> Response:
+        """Build the response for an asset, honouring Accept-Encoding and If-None-Match"""
+        self._maybe_reload()
+        asset = self._assets[name]
+        encoding, (body, etag) = asset.select(request.headers.get("accept-encoding", ""))
+
+        headers = {
+            "ETag": etag,
+            "Cache-Control": CACHE_CONTROL.get(asset.path.suffix, "no-cache"),
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in if_none_match):
+            stats.cache("browser", hit=True)
+            return Response(status_code=304, headers=headers)
+        stats.cache("browser", hit=False)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=asset.media_type, headers=headers)
@@ -0,0 +1,68 @@
+"""Compare two bench.run result files and flag regressions
+
+    python -m bench.compare base.json head.json --threshold 10
+
+Cases are matched by id and compared on median time. The exit status is 1
+when any case got slower by more than the threshold (or started failing),
+so this can gate CI.
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any],
+            threshold: float) -> Tuple[List[str], List[str]]:
+    """Return (report lines, ids of regressed cases)"""
+    lines = [f"{'case':70} {'base ms':>10} {'head ms':>10} {'change':>8}"]
+    regressions = []
+
+    for case_id in sorted(set(base["results"]) | set(head["results"])):
+        old = base["results"].get(case_id)
+        new = head["results"].get(case_id)
+
+        if old is None or new is None:
+            lines.append(f"{case_id:70} {'only in ' + ('head' if old is None else 'base'):>30}")
+            continue
+        if "error" in new and "error" not in old:
+            lines.append(f"{case_id:70} {'now fails: ' + new['error'][:60]}")
+            regressions.append(case_id)
+            continue
+        if "error" in new or "error" in old:
+            lines.append(f"{case_id:70} {'error':>30}")
+            continue
+
+        change = (new["median"] - old["median"]) / old["median"] * 100
+        marker = ""
+        if change > threshold:
+            marker = "  REGRESSION"
+            regressions.append(case_id)
+        elif change < -threshold:
+            marker = "  faster"
+        lines.append(f"{case_id:70} {old['median'] * 1000:>10.1f} "
+                     f"{new['median'] * 1000:>10.1f} {change:>+7.1f}%{marker}")
+
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base", type=Path)
+    parser.add_argument("head", type=Path)
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Percent slowdown in median time that counts as a regression")
+    args = parser.parse_args()
+
+    base = json.loads(args.base.read_text())
+    head = json.loads(args.head.read_text())
+    lines, regressions = compare(base, head, args.threshold)
+
+    print(f"base: {base['environment'].get('commit')}  head: {head['environment'].get('commit')}")
+    print("\n".join(lines))
+    print(f"\n{len(regressions)} regression(s) over {args.threshold:g}%")
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Reproducible synthetic input corpus for the benchmarks
+
+Everything is generated offline from a fixed seed with reportlab, PyMuPDF,
+Pillow, openpyxl and python-docx, so two runs (or two commits) benchmark
+the same content. Encrypted files differ only in their random salts.
+
+    python -m bench.corpus --out bench/.corpus --sizes small,medium
+"""
+import argparse
+import io
+import random
+from pathlib import Path
+import logging
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+SEED = 20231101
+
+# Scale knobs per size class
+SIZES: Dict[str, Dict[str, int]] = {
+    "small": {"pages": 4, "images": 2, "image_px": 400, "rows": 50, "paragraphs": 20},
+    "medium": {"pages": 40, "images": 8, "image_px": 1200, "rows": 1000, "paragraphs": 300},
+    "large": {"pages": 300, "images": 24, "image_px": 2400, "rows": 10000, "paragraphs": 3000},
+}
+
+WORDS = (
+    "invoice total amount payment document report quarterly revenue customer "
+    "account balance statement summary analysis contract agreement section "
+    "policy review approval schedule delivery shipment order reference"
+).split()
+
+STANDARD_FONTS = [
+    "Helvetica", "Helvetica-Bold", "Helvetica-Oblique", "Helvetica-BoldOblique",
+    "Times-Roman", "Times-Bold", "Times-Italic", "Times-BoldItalic",
+    "Courier", "Courier-Bold", "Courier-Oblique", "Courier-BoldOblique",
+]
+
+ENCRYPTED_PASSWORD = "bench-secret"
+
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _photo(rng: random.Random, size: int):
+    """Smooth gradient with seeded noise, which compresses like a real photo"""
+    from PIL import Image, ImageFilter
+
+    width, height = size, size * 3 // 4
+    noise = Image.frombytes("RGB", (width // 8, height // 8),
+                            rng.randbytes((width // 8) * (height // 8) * 3))
+    img = noise.resize((width, height), Image.Resampling.BICUBIC)
+    return img.filter(ImageFilter.GaussianBlur(2))
+
+
+def text_heavy_pdf(path: Path, rng: random.Random, scale: Dict[str, int]):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(str(path), pagesize=letter, invariant=1)
+    width, height = letter
+    for _ in range(scale["pages"]):
+        y = height - 72
+        while y > 72:
+            c.drawString(72, y, _sentence(rng))
+            y -= 14
+        c.showPage()
+    c.save()
+
+
+def image_heavy_pdf(path: Path, rng: random.Random, scale: Dict[str, int]):
+    import fitz
+
+    doc = fitz.open()
+    for _ in range(max(1, scale["pages"] // 4)):
+        page = doc.new_page()
+        for index in range(scale["images"] // 2 or 1):
+            buffer = io.BytesIO()
+            _photo(rng, scale["image_px"]).save(buffer, "JPEG", quality=90)
+            top = 36 + index * 60
+            page.insert_image(fitz.Rect(36, top, 576, top + 400), stream=buffer.getvalue())
+    doc.save(path, garbage=1, deflate=True)
+    doc.close()
+
+
+def scanned_pdf(path: Path, rng: random.Random, scale: Dict[str, int]):
+    """Pages that are only a grayscale raster of text (no text layer)"""
+    import fitz
+    from PIL import Image, ImageDraw
+
+    doc = fitz.open()
+    for _ in range(max(1, scale["pages"] // 2)):
+        img = Image.new("L", (1275, 1650), 245)  # Letter at 150 DPI
+        draw = ImageDraw.Draw(img)
+        for line in range(45):
+            draw.text((120, 120 + line * 31), _sentence(rng, 14), fill=20)
+        buffer = io.BytesIO()
+        img.save(buffer, "PNG")
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=buffer.getvalue())
+    doc.save(path, deflate=True)
+    doc.close()
+
+
+def many_page_pdf(path: Path, rng: random.Random, scale: Dict[str, int]):
+    import fitz
+
+    doc = fitz.open()
+    for number in range(scale["pages"] * 10):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {number + 1}", fontsize=18)
+        page.insert_text((72, 110), _sentence(rng), fontsize=11)
+    doc.save(path, deflate=True)
+    doc.close()
+
+
+def many_font_pdf(path: Path, rng: random.Random, scale: Dict[str, int]):
+    """Every standard font plus the TrueType fonts bundled with reportlab, embedded"""
+    import reportlab
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    fonts = list(STANDARD_FONTS)
+    font_dir = Path(reportlab.__file__).parent / "fonts"
+    for ttf in sorted(font_dir.glob("*.ttf")):
+        pdfmetrics.registerFont(TTFont(ttf.stem, str(ttf)))
+        fonts.append(ttf.stem)
+
+    c = canvas.Canvas(str(path), pagesize=letter, invariant=1)
+    width, height = letter
+    for _ in range(scale["pages"]):
+        y = height - 72
+        for font in fonts:
+            c.setFont(font, 11)
+            c.drawString(72, y, f"{font}: {_sentence(rng, 8)}")
+            y -= 16
+        c.showPage()
+    c.save()
+
+
+def encrypted_pdf(path: Path, rng: random.Random, scale: Dict[str, int]):
+    import fitz
+
+    plain = path.with_name("_plain_" + path.name)
+    text_heavy_pdf(plain, rng, scale)
+    doc = fitz.open(plain)
+    doc.save(path, encryption=fitz.PDF_ENCRYPT_AES_256,
+             owner_pw=ENCRYPTED_PASSWORD, user_pw=ENCRYPTED_PASSWORD,
+             permissions=fitz.PDF_PERM_PRINT)
+    doc.close()
+    plain.unlink()
+
+
+def jpeg_image(path: Path, rng: random.Random, scale: Dict[str, int]):
+    _photo(rng, scale["image_px"]).save(path, "JPEG", quality=90)
+
+
+def png_image(path: Path, rng: random.Random, scale: Dict[str, int]):
+    _photo(rng, scale["image_px"]).save(path, "PNG")
+
+
+def xlsx_workbook(path: Path, rng: random.Random, scale: Dict[str, int]):
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Date", "Customer", "Reference", "Amount", "Status"])
+    for row in range(scale["rows"]):
+        ws.append([f"2023-{row % 12 + 1:02d}-{row % 28 + 1:02d}",
+                   rng.choice(WORDS).title(), f"REF-{rng.randrange(10 ** 6):06d}",
+                   round(rng.uniform(1, 10000), 2), rng.choice(["paid", "open", "void"])])
+    wb.save(path)
+
+
+def docx_document(path: Path, rng: random.Random, scale: Dict[str, int]):
+    from docx import Document
+
+    doc = Document()
+    for index in range(scale["paragraphs"]):
+        if index % 25 == 0:
+            doc.add_heading(_sentence(rng, 4), level=1)
+        doc.add_paragraph(" ".join(_sentence(rng) for _ in range(rng.randint(1, 6))))
+    doc.save(path)
+
+
+def text_file(path: Path, rng: random.Random, scale: Dict[str, int]):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in range(scale["rows"] * 5):
+            f.write(f"2023-11-01T00:00:{line % 60:02d} INFO request={line} {_sentence(rng)}\n")
+
+
+GENERATORS: Dict[str, Callable] = {
+    "text-heavy.pdf": text_heavy_pdf,
+    "image-heavy.pdf": image_heavy_pdf,
+    "scanned.pdf": scanned_pdf,
+    "many-page.pdf": many_page_pdf,
+    "many-font.pdf": many_font_pdf,
+    "encrypted.pdf": encrypted_pdf,
+    "photo.jpg": jpeg_image,
+    "photo.png": png_image,
+    "table.xlsx": xlsx_workbook,
+    "report.docx": docx_document,
+    "log.txt": text_file,
+}
+
+
+def build_corpus(out_dir: Path, sizes: List[str]) -> Dict[str, Dict[str, Path]]:
+    """Generate (or reuse) every corpus file; returns {size: {kind: path}}"""
+    corpus = {}
+    for size in sizes:
+        size_dir = out_dir / size
+        size_dir.mkdir(parents=True, exist_ok=True)
+        corpus[size] = {}
+        for kind, generate in GENERATORS.items():
+            path = size_dir / kind
+            if not path.exists():
+                # Seed per file so adding a generator never changes the others
+                rng = random.Random(f"{SEED}:{size}:{kind}")
+                logger.info(f"Generating {path}")
+                generate(path, rng, SIZES[size])
+            corpus[size][kind] = path
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the benchmark input corpus")
+    parser.add_argument("--out", type=Path, default=Path(__file__).parent / ".corpus")
+    parser.add_argument("--sizes", default="small,medium")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    corpus = build_corpus(args.out, args.sizes.split(","))
+    for size, files in corpus.items():
+        for kind, path in files.items():
+            print(f"{size:8} {kind:18} {path.stat().st_size:>12,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""A deployment layout of the repository for running the app locally
+
+The app imports its tools as tools.converter, tools.compressor, ... while
+the repository keeps them as flat modules at its root (and color-extractor.py
+isn't importable by name at all). write_layout creates a tools/ package that
+resolves those imports to the files in the repository, and links the
+static files the app serves from its working directory, so the app runs
+against the working tree without copying anything.
+"""
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Served from the working directory, which is the layout
+STATIC_FILES = ("index.html", "style.css", "main.js")
+
+TOOLS_INIT = '''\
+# Generated by bench.layout: tools.<name> loads <name>.py from the repository
+__path__.append({root!r})
+'''
+
+# Hyphenated file names can only be loaded by path
+COLOR_EXTRACTOR = '''\
+# Generated by bench.layout
+import importlib.util
+import sys
+
+_spec = importlib.util.spec_from_file_location(__name__, {path!r})
+_module = importlib.util.module_from_spec(_spec)
+sys.modules[__name__] = _module
+_spec.loader.exec_module(_module)
+'''
+
+
+def write_layout(directory: Path) -> Path:
+    """Write the tools/ package (and static file links) into directory and return it"""
+    package = directory / "tools"
+    package.mkdir(parents=True, exist_ok=True)
+    (package / "__init__.py").write_text(TOOLS_INIT.format(root=str(REPO_ROOT)))
+    (package / "color_extractor.py").write_text(
+        COLOR_EXTRACTOR.format(path=str(REPO_ROOT / "color-extractor.py"))
+    )
+    for name in STATIC_FILES:
+        link = directory / name
+        if (REPO_ROOT / name).exists() and not link.exists():
+            link.symlink_to(REPO_ROOT / name)
+    return directory
@@ -0,0 +1,341 @@
+"""HTTP load generator for the FastAPI app
+
+Spawns uvicorn locally (or targets --url), drives a weighted mix of tool
+endpoints with corpus files at one or more open-loop arrival rates, and
+reports latency percentiles, throughput, error rates and server RSS over time.
+
+    python -m bench.load --rates 1,2,4,8 --duration 30 --workers 2
+    python -m bench.load --url http://127.0.0.1:8000 --rates 5 --output load.json
+
+--app-dir is a deployment layout where the app's tool imports
+(tools.converter, ...) resolve; by default one is generated (bench.layout)
+in a temporary directory, which is also where the server keeps its files.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from bench.corpus import build_corpus
+from bench.layout import write_layout
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+class Scenario(NamedTuple):
+    name: str
+    weight: float
+    path: str
+    form: Dict[str, str]
+    file_kinds: Tuple[str, ...]
+    files_per_request: int = 1
+
+
+SCENARIOS = [
+    Scenario("compress", 30, "/api/compress", {"quality": "medium"},
+             ("text-heavy.pdf", "image-heavy.pdf", "scanned.pdf")),
+    Scenario("convert-docx", 10, "/api/convert", {"format": "docx"},
+             ("text-heavy.pdf", "many-font.pdf")),
+    Scenario("convert-pptx", 10, "/api/convert", {"format": "pptx"},
+             ("text-heavy.pdf", "image-heavy.pdf")),
+    Scenario("convert-txt", 10, "/api/convert", {"format": "txt"},
+             ("text-heavy.pdf", "many-page.pdf")),
+    Scenario("edit-rotate", 15, "/api/edit",
+             {"operation": "rotate", "parameters": '{"angle": 90}'},
+             ("many-page.pdf", "text-heavy.pdf")),
+    Scenario("extract-colors", 15, "/api/extract-colors", {"color_count": "5"},
+             ("photo.jpg", "photo.png")),
+    Scenario("batch-compress", 10, "/api/batch-process", {"operation": "compress"},
+             ("text-heavy.pdf", "image-heavy.pdf"), files_per_request=3),
+]
+
+# Share of requests drawn from each corpus size
+SIZE_MIX = {"small": 0.7, "medium": 0.25, "large": 0.05}
+
+
+def create_app():
+    """uvicorn --factory entry point: load the app module from a file path"""
+    app_file = Path(os.environ["FLIPFILE_APP_FILE"])
+    sys.path.insert(0, str(app_file.parent))
+    spec = importlib.util.spec_from_file_location("flipfile_app", app_file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _process_tree_rss(root_pid: int) -> int:
+    """Sum VmRSS over a process and all its descendants (Linux /proc)"""
+    children: Dict[int, List[int]] = {}
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat") as f:
+                # ppid is the 2nd field after the parenthesised command name
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry.name))
+
+    total, pending = 0, [root_pid]
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+
+class RSSSampler(threading.Thread):
+    """Samples server RSS at a fixed interval while the load runs"""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Tuple[float, int]] = []
+        self._stopped = threading.Event()
+        self.origin = time.perf_counter()
+
+    def run(self):
+        while not self._stopped.is_set():
+            self.samples.append((round(time.perf_counter() - self.origin, 2),
+                                 _process_tree_rss(self.pid)))
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Server:
+    """uvicorn subprocess serving the app on a free local port"""
+
+    def __init__(self, app_file: Path, app_dir: Path, workers: int):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        env = dict(os.environ, FLIPFILE_APP_FILE=str(app_file),
+                   PYTHONPATH=os.pathsep.join([str(REPO_ROOT), str(app_dir)]))
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "bench.load:create_app", "--factory",
+             "--host", "127.0.0.1", "--port", str(self.port),
+             "--workers", str(workers), "--log-level", "warning"],
+            cwd=app_dir, env=env,
+        )
+
+    def wait_ready(self, timeout: float = 60):
+        import httpx
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {self.process.returncode}")
+            try:
+                if httpx.get(self.url + "/api/stats", timeout=2).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.25)
+        raise RuntimeError("uvicorn did not become ready in time")
+
+    def stop(self):
+        self.process.send_signal(signal.SIGINT)
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def summarize(records: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(r["latency"] for r in records if r["ok"])
+    errors = sum(1 for r in records if not r["ok"])
+    return {
+        "requests": len(records),
+        "errors": errors,
+        "error_rate": errors / len(records) if records else 0.0,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "p99": _percentile(latencies, 99),
+    }
+
+
+async def drive(url: str, rate: float, duration: float, max_in_flight: int,
+                corpus: Dict[str, Dict[str, Path]], seed: int) -> Tuple[List[Dict[str, Any]], float]:
+    """Open-loop load: requests start on a Poisson schedule regardless of responses"""
+    import httpx
+
+    rng = random.Random(seed)
+    weights = [s.weight for s in SCENARIOS]
+    sizes = [size for size in SIZE_MIX if size in corpus]
+    size_weights = [SIZE_MIX[size] for size in sizes]
+    payloads: Dict[Path, bytes] = {}
+    records: List[Dict[str, Any]] = []
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def one_request(client, scenario: Scenario, paths: List[Path]):
+        files = [("files" if scenario.files_per_request > 1 else "file",
+                  (path.name, payloads.setdefault(path, path.read_bytes())))
+                 for path in paths]
+        started = time.perf_counter()
+        try:
+            response = await client.post(url + scenario.path, data=scenario.form, files=files)
+            ok, status = response.status_code < 400, response.status_code
+        except httpx.HTTPError as e:
+            ok, status = False, type(e).__name__
+        finally:
+            in_flight.release()
+        records.append({"scenario": scenario.name, "ok": ok, "status": status,
+                        "latency": time.perf_counter() - started,
+                        "bytes": sum(p.stat().st_size for p in paths)})
+
+    limits = httpx.Limits(max_connections=max_in_flight)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        tasks = []
+        started = time.perf_counter()
+        next_start = started
+        while next_start - started < duration:
+            await asyncio.sleep(max(0.0, next_start - time.perf_counter()))
+            scenario = rng.choices(SCENARIOS, weights)[0]
+            size = rng.choices(sizes, size_weights)[0]
+            paths = [corpus[size][rng.choice(scenario.file_kinds)]
+                     for _ in range(scenario.files_per_request)]
+            # Past the in-flight cap the client itself would become the bottleneck
+            await in_flight.acquire()
+            tasks.append(asyncio.create_task(one_request(client, scenario, paths)))
+            next_start += rng.expovariate(rate)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    return records, elapsed
+
+
+def run_step(url: str, rate: float, args, corpus, server_pid: Optional[int]) -> Dict[str, Any]:
+    sampler = RSSSampler(server_pid) if server_pid else None
+    if sampler:
+        sampler.start()
+    try:
+        records, elapsed = asyncio.run(
+            drive(url, rate, args.duration, args.max_in_flight, corpus, args.seed))
+    finally:
+        if sampler:
+            sampler.stop()
+
+    step = {"rate": rate, "elapsed": elapsed, "overall": summarize(records, elapsed),
+            "scenarios": {}}
+    for scenario in SCENARIOS:
+        subset = [r for r in records if r["scenario"] == scenario.name]
+        if subset:
+            step["scenarios"][scenario.name] = summarize(subset, elapsed)
+    if sampler:
+        step["rss"] = sampler.samples
+        step["peak_rss"] = max((rss for _, rss in sampler.samples), default=0)
+    return step
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value * 1000:9.0f}" if value is not None else f"{'-':>9}"
+
+
+def print_step(step: Dict[str, Any]):
+    overall = step["overall"]
+    peak = f"  peak RSS {step['peak_rss'] / 2 ** 20:.0f} MB" if "peak_rss" in step else ""
+    print(f"\nrate {step['rate']:g}/s: {overall['throughput']:.2f} req/s completed, "
+          f"{overall['error_rate'] * 100:.1f}% errors{peak}")
+    print(f"  {'scenario':16} {'reqs':>5} {'err%':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, summary in [*step["scenarios"].items(), ("all", overall)]:
+        print(f"  {name:16} {summary['requests']:>5} {summary['error_rate'] * 100:>6.1f} "
+              f"{_ms(summary['p50'])} {_ms(summary['p95'])} {_ms(summary['p99'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the FlipFile API")
+    parser.add_argument("--url", help="Target a running server instead of spawning uvicorn")
+    parser.add_argument("--app-file", type=Path, default=REPO_ROOT / "foo2-main.py")
+    parser.add_argument("--app-dir", type=Path,
+                        help="Deployment layout to serve from (default: a generated one)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--rates", default="1,2,4",
+                        help="Comma-separated arrival rates (req/s), run as successive steps")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per rate step")
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--sizes", default="small,medium")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--corpus", type=Path, default=Path(__file__).parent / ".corpus")
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    corpus = build_corpus(args.corpus.resolve(), args.sizes.split(","))
+
+    server = None
+    generated = None
+    url = args.url
+    if url is None:
+        app_dir = args.app_dir
+        if app_dir is None:
+            generated = app_dir = write_layout(Path(tempfile.mkdtemp(prefix="flipfile-load-")))
+        elif not (app_dir / "tools").is_dir():
+            parser.error(f"{app_dir} has no tools/ package; omit --app-dir to generate a layout")
+        server = Server(args.app_file.resolve(), app_dir.resolve(), args.workers)
+        server.wait_ready()
+        url = server.url
+        logger.info(f"uvicorn ({args.workers} worker(s)) listening on {url}")
+
+    steps = []
+    try:
+        for rate in (float(r) for r in args.rates.split(",")):
+            step = run_step(url, rate, args, corpus, server.process.pid if server else None)
+            print_step(step)
+            steps.append(step)
+    finally:
+        if server:
+            server.stop()
+        if generated:
+            shutil.rmtree(generated, ignore_errors=True)
+
+    if args.output:
+        args.output.write_text(json.dumps(
+            {"url": url, "workers": args.workers, "duration": args.duration,
+             "steps": steps}, indent=2))
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""Time every public tool method against the synthetic corpus
+
+    python -m bench.run --sizes small,medium --repeat 5 --output bench-results.json
+    python -m bench.run --filter PDFCompressor.compress --sizes large
+
+Results are written as JSON (see bench.compare for diffing two runs). Each
+case is run once untimed first so import and first-call costs do not skew
+the numbers; pass --no-warmup to measure cold calls instead.
+"""
+import argparse
+import asyncio
+import importlib.util
+import inspect
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from bench.corpus import build_corpus
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Tool class -> source file (color-extractor.py is not importable by name)
+TOOL_FILES = {
+    "PDFCompressor": "compressor.py",
+    "PDFConverter": "converter.py",
+    "PDFEditor": "editor.py",
+    "PDFProtector": "protector.py",
+    "ColorExtractor": "color-extractor.py",
+}
+
+LIBRARIES = ["PyMuPDF", "pikepdf", "reportlab", "Pillow", "python-pptx",
+             "python-docx", "openpyxl", "pdf2docx", "scikit-learn", "numpy"]
+
+PALETTE = [{"hex": "#3366CC", "rgb": {"r": 51, "g": 102, "b": 204}},
+           {"hex": "#DC3912", "rgb": {"r": 220, "g": 57, "b": 18}},
+           {"hex": "#FF9900", "rgb": {"r": 255, "g": 153, "b": 0}}]
+
+
+class Case(NamedTuple):
+    tool: str
+    method: str
+    label: str
+    # Builds (args, kwargs) from the {kind: path} corpus of one size
+    arguments: Callable[[Dict[str, Path]], tuple]
+
+    def case_id(self, size: str) -> str:
+        return f"{self.tool}.{self.method}[{self.label}]@{size}"
+
+
+def _page_count(path: Path) -> int:
+    import fitz
+
+    with fitz.open(path) as doc:
+        return len(doc)
+
+
+def _call(*args, **kwargs):
+    return args, kwargs
+
+
+CASES: List[Case] = [
+    # PDFCompressor
+    *[Case("PDFCompressor", "compress", f"{kind},{quality}",
+           lambda c, kind=kind, quality=quality: _call(c[kind], quality=quality))
+      for kind in ("text-heavy.pdf", "image-heavy.pdf", "scanned.pdf", "many-font.pdf")
+      for quality in ("low", "medium", "high", "extreme")],
+    Case("PDFCompressor", "batch_compress", "3 files",
+         lambda c: _call([c["text-heavy.pdf"], c["image-heavy.pdf"], c["many-font.pdf"]])),
+    Case("PDFCompressor", "estimate_compression", "image-heavy.pdf",
+         lambda c: _call(c["image-heavy.pdf"])),
+
+    # PDFConverter: from PDF
+    *[Case("PDFConverter", "convert", f"{kind}->{fmt}",
+           lambda c, kind=kind, fmt=fmt: _call(c[kind], fmt))
+      for kind in ("text-heavy.pdf", "image-heavy.pdf")
+      for fmt in ("docx", "xlsx", "pptx", "png", "jpg", "txt", "html")],
+    Case("PDFConverter", "convert", "many-page.pdf->pptx",
+         lambda c: _call(c["many-page.pdf"], "pptx")),
+    # PDFConverter: to PDF
+    *[Case("PDFConverter", "convert", f"{kind}->pdf",
+           lambda c, kind=kind: _call(c[kind], "pdf"))
+      for kind in ("report.docx", "table.xlsx", "photo.jpg", "photo.png", "log.txt")],
+    Case("PDFConverter", "images_to_pdf", "20 jpg + 5 png",
+         lambda c: _call([c["photo.jpg"]] * 20 + [c["photo.png"]] * 5)),
+
+    # PDFEditor
+    Case("PDFEditor", "edit", "rotate",
+         lambda c: _call(c["text-heavy.pdf"], "rotate", {"angle": 90})),
+    Case("PDFEditor", "merge_pdfs", "3 files",
+         lambda c: _call([c["text-heavy.pdf"], c["image-heavy.pdf"], c["many-font.pdf"]], {})),
+    *[Case("PDFEditor", "split_pdf", f"many-page.pdf,{split}",
+           lambda c, params=params: _call(c["many-page.pdf"], params))
+      for split, params in (("single_pages", {"type": "single_pages"}),
+                            ("every_10", {"type": "every_n", "n": 10}))],
+    Case("PDFEditor", "rotate_pages", "many-page.pdf",
+         lambda c: _call(c["many-page.pdf"], {"angle": 90, "pages": "all"})),
+    Case("PDFEditor", "reorder_pages", "many-page.pdf,reversed",
+         lambda c: _call(c["many-page.pdf"],
+                         {"order": list(range(_page_count(c["many-page.pdf"]), 0, -1))})),
+    Case("PDFEditor", "extract_pages", "many-page.pdf",
+         lambda c: _call(c["many-page.pdf"], {"pages": "1,2,3,5,8,13"})),
+    Case("PDFEditor", "delete_pages", "many-page.pdf",
+         lambda c: _call(c["many-page.pdf"], {"pages": "1,2,3,5,8,13"})),
+    Case("PDFEditor", "insert_pages", "text-heavy.pdf+many-font.pdf",
+         lambda c: _call(c["text-heavy.pdf"], {"insert_file": str(c["many-font.pdf"])})),
+    Case("PDFEditor", "resize_pages", "text-heavy.pdf,A4",
+         lambda c: _call(c["text-heavy.pdf"], {"size": "A4"})),
+    Case("PDFEditor", "add_blank_pages", "many-page.pdf,between",
+         lambda c: _call(c["many-page.pdf"], {"position": "between", "interval": 2})),
+    Case("PDFEditor", "extract_images", "image-heavy.pdf",
+         lambda c: _call(c["image-heavy.pdf"], {})),
+
+    # PDFProtector
+    *[Case("PDFProtector", "protect", f"{kind},{level}",
+           lambda c, kind=kind, level=level: _call(c[kind], "secret", encryption_level=level))
+      for kind in ("text-heavy.pdf", "image-heavy.pdf")
+      for level in ("128bit", "256bit")],
+    *[Case("PDFProtector", "protect_many", f"50 files,{level}",
+           lambda c, level=level: _call([{"input_path": c["text-heavy.pdf"], "password": f"pw{i}",
+                                          "encryption_level": level} for i in range(50)]))
+      for level in ("128bit", "256bit")],
+    Case("PDFProtector", "add_watermark", "text-heavy.pdf",
+         lambda c: _call(c["text-heavy.pdf"], "CONFIDENTIAL", position="diagonal")),
+    Case("PDFProtector", "add_digital_signature", "text-heavy.pdf",
+         lambda c: _call(c["text-heavy.pdf"], c["text-heavy.pdf"], "secret")),
+    Case("PDFProtector", "get_permission_info", "encrypted.pdf",
+         lambda c: _call(c["encrypted.pdf"])),
+
+    # ColorExtractor
+    *[Case("ColorExtractor", "extract", kind, lambda c, kind=kind: _call(c[kind], 5))
+      for kind in ("photo.jpg", "photo.png", "image-heavy.pdf")],
+    Case("ColorExtractor", "create_palette_image", "3 colors",
+         lambda c: _call(PALETTE, Path("processed"), "palette.png")),
+    *[Case("ColorExtractor", "generate_color_scheme", scheme,
+           lambda c, scheme=scheme: _call("#3366CC", scheme))
+      for scheme in ("monochromatic", "analogous", "complementary", "triadic", "tetradic")],
+]
+
+
+def _module_name(class_name: str) -> str:
+    return Path(TOOL_FILES[class_name]).stem.replace("-", "_")
+
+
+def load_tool(class_name: str):
+    """Instantiate a tool class from its source file in the repo root"""
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+
+    module_name = _module_name(class_name)
+    if module_name in sys.modules:
+        module = sys.modules[module_name]
+    else:
+        spec = importlib.util.spec_from_file_location(module_name,
+                                                      REPO_ROOT / TOOL_FILES[class_name])
+        module = importlib.util.module_from_spec(spec)
+        # Registered before executing so worker processes can unpickle its functions
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    return getattr(module, class_name)()
+
+
+def _output_bytes(result: Any) -> Optional[int]:
+    """Total size of the file(s) a tool call produced, if any"""
+    paths = result if isinstance(result, list) else [result]
+    if paths and all(isinstance(p, bytes) for p in paths):
+        return sum(len(p) for p in paths)
+    if paths and all(isinstance(p, Path) for p in paths):
+        return sum(p.stat().st_size for p in paths if p.exists())
+    return None
+
+
+def _clear_outputs():
+    for directory in ("processed", "temp"):
+        shutil.rmtree(directory, ignore_errors=True)
+        Path(directory).mkdir()
+
+
+async def _drain(results) -> List[bytes]:
+    return [data async for _, data in results]
+
+
+def run_case(loop, tool, case: Case, files: Dict[str, Path], repeat: int,
+             warmup: bool) -> Dict[str, Any]:
+    method = getattr(tool, case.method)
+    args, kwargs = case.arguments(files)
+    inputs = args[0] if isinstance(args[0], list) else [args[0]]
+    # Batch jobs are dicts naming their input (other dict arguments aren't inputs)
+    inputs = [p.get("input_path") if isinstance(p, dict) else p for p in inputs]
+    input_bytes = sum(p.stat().st_size for p in inputs if isinstance(p, Path))
+
+    def invoke():
+        result = method(*args, **kwargs)
+        if asyncio.iscoroutine(result):
+            result = loop.run_until_complete(result)
+        elif inspect.isasyncgen(result):
+            # Streaming tools yield (job, output bytes) as each finishes
+            result = loop.run_until_complete(_drain(result))
+        return result
+
+    record: Dict[str, Any] = {"tool": case.tool, "method": case.method,
+                              "label": case.label, "input_bytes": input_bytes}
+    try:
+        if warmup:
+            _clear_outputs()
+            invoke()
+        timings = []
+        for _ in range(repeat):
+            _clear_outputs()
+            started = time.perf_counter()
+            result = invoke()
+            timings.append(time.perf_counter() - started)
+        record.update({
+            "timings": timings,
+            "min": min(timings),
+            "median": statistics.median(timings),
+            "mean": statistics.fmean(timings),
+            "output_bytes": _output_bytes(result),
+        })
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def environment() -> Dict[str, Any]:
+    from importlib import metadata
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    versions = {}
+    for library in LIBRARIES:
+        try:
+            versions[library] = metadata.version(library)
+        except metadata.PackageNotFoundError:
+            versions[library] = None
+
+    return {
+        "commit": commit or None,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "libraries": versions,
+    }
+
+
+def run(sizes: List[str], repeat: int, warmup: bool, pattern: Optional[str],
+        corpus_dir: Path) -> Dict[str, Any]:
+    corpus = build_corpus(corpus_dir, sizes)
+    cases = [case for case in CASES
+             if not pattern or pattern in f"{case.tool}.{case.method}[{case.label}]"]
+
+    results = {}
+    tools = {}
+    original_cwd = os.getcwd()
+    loop = asyncio.new_event_loop()
+    # Tools write to ./processed and ./temp, so run inside a scratch directory
+    with tempfile.TemporaryDirectory(prefix="flipfile-bench-") as workdir:
+        os.chdir(workdir)
+        try:
+            for size in sizes:
+                for case in cases:
+                    if case.tool not in tools:
+                        tools[case.tool] = load_tool(case.tool)
+                    record = run_case(loop, tools[case.tool], case, corpus[size], repeat, warmup)
+                    record["size"] = size
+                    results[case.case_id(size)] = record
+
+                    if "error" in record:
+                        logger.warning(f"{case.case_id(size)}: {record['error']}")
+                    else:
+                        logger.info(f"{case.case_id(size)}: median {record['median'] * 1000:.1f} ms")
+        finally:
+            os.chdir(original_cwd)
+            loop.close()
+
+    return {"environment": environment(), "repeat": repeat, "warmup": warmup,
+            "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the FlipFile tool classes")
+    parser.add_argument("--sizes", default="small,medium",
+                        help="Comma-separated corpus sizes (small, medium, large)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-warmup", action="store_true")
+    parser.add_argument("--filter", dest="pattern",
+                        help="Only run cases whose id contains this text")
+    parser.add_argument("--corpus", type=Path, default=Path(__file__).parent / ".corpus")
+    parser.add_argument("--output", type=Path, default=Path("bench-results.json"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # Tool modules log every handled failure; keep the benchmark output readable
+    for class_name in TOOL_FILES:
+        logging.getLogger(_module_name(class_name)).setLevel(logging.CRITICAL)
+
+    report = run(args.sizes.split(","), args.repeat, not args.no_warmup,
+                 args.pattern, args.corpus.resolve())
+    args.output.write_text(json.dumps(report, indent=2))
+    errors = sum(1 for record in report["results"].values() if "error" in record)
+    print(f"Wrote {len(report['results'])} results ({errors} errors) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
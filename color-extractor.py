@@ -4,6 +4,9 @@ import logging
 from typing import List, Dict, Any, Tuple
 import tempfile
 
+from stats import counted
+from documents import documents
+
 logger = logging.getLogger(__name__)
 
 class ColorExtractor:
@@ -12,7 +15,9 @@ class ColorExtractor:
     def __init__(self):
         self.color_formats = ["hex", "rgb", "hsl", "cmyk"]
         self.color_spaces = ["rgb", "hsl", "lab", "hsv"]
+        self.max_colors = 8  # K-means clusters; more gives near-duplicate swatches
     
+    @counted("extract-colors")
     async def extract(self, input_path: Path, color_count: int = 5, 
                      color_format: str = "hex") -> List[Dict[str, Any]]:
         """Extract color palette from file"""
@@ -36,7 +41,7 @@ class ColorExtractor:
             from sklearn.cluster import KMeans
             
             # Open and resize image for faster processing
-            img = Image.open(image_path)
+            img = documents.open_image(image_path)
             img = img.convert("RGB")
             
             # Resize if image is too large
@@ -52,7 +57,7 @@ class ColorExtractor:
             
             # Use K-means clustering to find dominant colors
             if len(pixels) > color_count:
-                kmeans = KMeans(n_clusters=min(color_count, 8), 
+                kmeans = KMeans(n_clusters=min(color_count, self.max_colors), 
                               n_init=10, random_state=42)
                 kmeans.fit(pixels)
                 
@@ -86,7 +91,7 @@ class ColorExtractor:
             try:
                 from PIL import Image
                 
-                img = Image.open(image_path)
+                img = documents.open_image(image_path)
                 img = img.convert("RGB")
                 
                 # Get color frequencies
@@ -118,7 +123,7 @@ class ColorExtractor:
             from sklearn.cluster import KMeans
             import io
             
-            pdf = fitz.open(pdf_path)
+            pdf = documents.open_fitz(pdf_path)
             all_colors = []
             
             # Extract colors from each page
@@ -167,7 +172,7 @@ class ColorExtractor:
             
             # Cluster colors
             if len(all_colors) > color_count:
-                kmeans = KMeans(n_clusters=min(color_count, 8), 
+                kmeans = KMeans(n_clusters=min(color_count, self.max_colors), 
                               n_init=10, random_state=42)
                 kmeans.fit(all_colors)
                 colors = kmeans.cluster_centers_.astype(int)
@@ -4,6 +4,12 @@ from pathlib import Path
 import logging
 import subprocess
 import os
+from typing import List, Optional
+
+from instrumentation import stage
+from stats import counted
+from storage import processed
+from documents import documents
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +47,7 @@ class PDFCompressor:
             }
         }
     
+    @counted("compress")
     async def compress(self, input_path: Path, quality: str = "medium", 
                       dpi: Optional[int] = None, remove_metadata: bool = True) -> Path:
         """Compress PDF file"""
@@ -57,23 +64,31 @@ class PDFCompressor:
         
         settings["remove_metadata"] = remove_metadata
         
-        output_dir = Path("processed")
-        output_path = output_dir / f"compressed_{input_path.name}"
+        output_path = processed.path_for(f"compressed_{input_path.name}")
         
         try:
-            # Try using Ghostscript first (most effective)
-            if await self._has_ghostscript():
-                return await self._compress_with_ghostscript(input_path, output_path, settings)
+            # Try using Ghostscript first (most effective); encrypted inputs stay
+            # with pikepdf, which decrypts in memory rather than via the command line
+            if documents.password(input_path) is None and await self._has_ghostscript():
+                await self._compress_with_ghostscript(input_path, output_path, settings)
             else:
                 # Fallback to pikepdf
-                return await self._compress_with_pikepdf(input_path, output_path, settings)
+                await self._compress_with_pikepdf(input_path, output_path, settings)
                 
         except Exception as e:
             logger.error(f"Compression error: {e}")
-            # Final fallback: simple copy
-            import shutil
-            shutil.copy2(input_path, output_path)
-            return output_path
+        
+        # Never return a file larger than the input: when compression failed or
+        # didn't help, the output is the input itself (linked, not copied)
+        if not output_path.exists() or output_path.stat().st_size >= documents.size(input_path):
+            if documents.password(input_path) is not None:
+                # Except for an input opened with its password: like every other
+                # tool's output, this one comes back decrypted
+                with documents.open_pikepdf(input_path) as pdf:
+                    pdf.save(output_path)
+            else:
+                documents.passthrough(input_path, output_path)
+        return output_path
     
     async def _has_ghostscript(self) -> bool:
         """Check if Ghostscript is available"""
@@ -112,16 +127,17 @@ class PDFCompressor:
         
         gs_params.extend([
             f"-sOutputFile={output_path}",
-            str(input_path)
+            str(documents.local_path(input_path))
         ])
         
-        process = await asyncio.create_subprocess_exec(
-            *gs_params,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        
-        stdout, stderr = await process.communicate()
+        with stage("compress", "ghostscript"):
+            process = await asyncio.create_subprocess_exec(
+                *gs_params,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            
+            stdout, stderr = await process.communicate()
         
         if process.returncode != 0:
             raise Exception(f"Ghostscript error: {stderr.decode()}")
@@ -136,7 +152,8 @@ class PDFCompressor:
             from PIL import Image
             import io
             
-            pdf = pikepdf.open(input_path)
+            with stage("compress", "open"):
+                pdf = documents.open_pikepdf(input_path)
             
             # Remove metadata if requested
             if settings["remove_metadata"]:
@@ -146,18 +163,20 @@ class PDFCompressor:
             
             # Optimize images in PDF
             if settings.get("compress_images", True):
-                await self._optimize_pdf_images(pdf, settings)
+                with stage("compress", "encode"):
+                    await self._optimize_pdf_images(pdf, settings)
             
             # Remove embedded fonts if requested
             if settings.get("remove_embedded_fonts", False):
                 self._remove_embedded_fonts(pdf)
             
             # Save with compression
-            pdf.save(output_path, 
-                    compress_streams=True,
-                    stream_dict_compress=True,
-                    preserve_pdfa=False,
-                    object_stream_mode=pikepdf.ObjectStreamMode.generate)
+            with stage("compress", "save"):
+                pdf.save(output_path, 
+                        compress_streams=True,
+                        stream_dict_compress=True,
+                        preserve_pdfa=False,
+                        object_stream_mode=pikepdf.ObjectStreamMode.generate)
             
             pdf.close()
             return output_path
@@ -248,7 +267,7 @@ class PDFCompressor:
         """Estimate compression results"""
         import os
         
-        original_size = os.path.getsize(input_path)
+        original_size = documents.size(input_path)
         
         # Estimated compression ratios based on quality
         ratios = {
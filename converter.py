@@ -1,12 +1,46 @@
 import asyncio
+import io
 import tempfile
 from pathlib import Path
 import logging
 from typing import List, Optional
 import os
+import hashlib
+import uuid
+
+from instrumentation import stage
+from stats import counted
+from storage import processed
+from documents import documents
+from inspection import inspections, page_size
+from pools import run_in_pool
 
 logger = logging.getLogger(__name__)
 
+
+def _render_pages_to_jpeg(pdf_path: str, page_numbers: List[int], dpi: int,
+                          jpg_quality: int = 85, password: Optional[str] = None) -> List[bytes]:
+    """Render a run of PDF pages to JPEG bytes (runs inside a worker process)"""
+    import fitz
+    
+    if password is not None:
+        # Worker processes don't share the parent's passwords; this one is passed in
+        documents.set_password(pdf_path, password)
+    pdf_document = documents.open_fitz(pdf_path)
+    try:
+        mat = fitz.Matrix(dpi / 72, dpi / 72)
+        return [
+            pdf_document.load_page(page_num)
+            .get_pixmap(matrix=mat, alpha=False)
+            .tobytes("jpg", jpg_quality=jpg_quality)
+            for page_num in page_numbers
+        ]
+    finally:
+        pdf_document.close()
+        if password is not None:
+            documents.discard([pdf_path])
+
+
 class PDFConverter:
     """Handle PDF conversion to/from various formats"""
     
@@ -19,7 +53,13 @@ class PDFConverter:
             "image": [".jpg", ".jpeg", ".png", ".tiff", ".bmp", ".gif"],
             "text": [".txt", ".html", ".rtf"]
         }
+        
+        # PDF -> PowerPoint page render settings ("text" quality keeps the
+        # old editable text-box output instead)
+        self.slide_render_dpi = {"high": 200, "medium": 150, "low": 96}
+        self.slide_render_chunk = 16  # Pages handed to each render worker call
     
+    @counted("convert")
     async def convert(self, input_path: Path, output_format: str, 
                      quality: str = "high", pages: Optional[List[int]] = None) -> Path:
         """Convert file to specified format"""
@@ -34,9 +74,8 @@ class PDFConverter:
                                quality: str, pages: Optional[List[int]]) -> Path:
         """Convert PDF to other formats"""
         
-        output_dir = Path("processed")
         output_name = f"{pdf_path.stem}_converted.{output_format}"
-        output_path = output_dir / output_name
+        output_path = processed.path_for(output_name)
         
         try:
             if output_format in ["docx", "doc"]:
@@ -46,7 +85,7 @@ class PDFConverter:
                 return await self._pdf_to_excel(pdf_path, output_path, pages)
             
             elif output_format in ["pptx", "ppt"]:
-                return await self._pdf_to_powerpoint(pdf_path, output_path, pages)
+                return await self._pdf_to_powerpoint(pdf_path, output_path, pages, quality)
             
             elif output_format in ["jpg", "jpeg", "png", "tiff"]:
                 return await self._pdf_to_image(pdf_path, output_path, output_format, quality, pages)
@@ -68,8 +107,7 @@ class PDFConverter:
         if output_format != "pdf":
             raise ValueError("Can only convert to PDF from other formats")
         
-        output_dir = Path("processed")
-        output_path = output_dir / f"{input_path.stem}_converted.pdf"
+        output_path = processed.path_for(f"{input_path.stem}_converted.pdf")
         
         try:
             if input_path.suffix.lower() in [".docx", ".doc"]:
@@ -100,8 +138,11 @@ class PDFConverter:
         try:
             from pdf2docx import Converter
             
-            cv = Converter(str(pdf_path))
-            cv.convert(str(output_path), start=0, end=None)
+            with stage("convert", "open"):
+                # pdf2docx opens by file name, and decrypts with the password itself
+                cv = Converter(str(documents.local_path(pdf_path)), password=documents.password(pdf_path))
+            with stage("convert", "render"):
+                cv.convert(str(output_path), start=0, end=None)
             cv.close()
             
             return output_path
@@ -113,7 +154,7 @@ class PDFConverter:
             from docx.shared import Inches
             
             doc = Document()
-            pdf_document = fitz.open(pdf_path)
+            pdf_document = documents.open_fitz(pdf_path)
             
             for page_num in range(len(pdf_document)):
                 if pages and (page_num + 1) not in pages:
@@ -142,7 +183,7 @@ class PDFConverter:
             ws = wb.active
             ws.title = "PDF Data"
             
-            pdf_document = fitz.open(pdf_path)
+            pdf_document = documents.open_fitz(pdf_path)
             row = 1
             
             for page_num in range(len(pdf_document)):
@@ -168,8 +209,121 @@ class PDFConverter:
             raise
     
     async def _pdf_to_powerpoint(self, pdf_path: Path, output_path: Path,
-                                pages: Optional[List[int]]) -> Path:
+                                pages: Optional[List[int]], quality: str = "high") -> Path:
         """Convert PDF to PowerPoint"""
+        if quality == "text":
+            return await self._pdf_to_powerpoint_text(pdf_path, output_path, pages)
+        
+        try:
+            import fitz
+            from pptx import Presentation
+            from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+            from pptx.parts.image import Image as PptxImage, ImagePart
+            from pptx.util import Pt
+            
+            with stage("convert", "open"):
+                record = inspections.get(pdf_path)
+                if record["needs_password"]:
+                    # The record only holds what is readable without the password
+                    with documents.open_fitz(pdf_path) as pdf_document:
+                        page_numbers = [n for n in range(len(pdf_document))
+                                        if not pages or (n + 1) in pages]
+                        page_sizes = {n: (pdf_document[n].rect.width, pdf_document[n].rect.height)
+                                      for n in page_numbers}
+                else:
+                    page_numbers = [n for n in range(record["pages"] or 0)
+                                    if not pages or (n + 1) in pages]
+                    page_sizes = {n: page_size(record, n) for n in page_numbers}
+            
+            if not page_numbers:
+                raise ValueError("No pages selected for conversion")
+            
+            prs = Presentation()
+            blank_slide_layout = prs.slide_layouts[6]  # Blank layout
+            
+            # Size the deck after the first page so slides keep the page aspect
+            first_width, first_height = page_sizes[page_numbers[0]]
+            prs.slide_width = Pt(first_width)
+            prs.slide_height = Pt(first_height)
+            
+            dpi = self.slide_render_dpi.get(quality, 150)
+            chunk_size = self.slide_render_chunk
+            chunks = [page_numbers[i:i + chunk_size]
+                      for i in range(0, len(page_numbers), chunk_size)]
+            
+            # Identical renders (blank pages, repeated covers) share one media part.
+            # add_picture would find them by scanning every part in the package
+            # per picture, which grows quadratically with the deck
+            image_parts = {}
+            
+            def add_slides(page_nums: List[int], blobs: List[bytes]):
+                # Each picture is hashed and parsed, so this runs on a thread
+                for page_num, blob in zip(page_nums, blobs):
+                    digest = hashlib.sha1(blob).hexdigest()
+                    image_part = image_parts.get(digest)
+                    if image_part is None:
+                        image_part = ImagePart.new(prs.part.package, PptxImage.from_blob(blob))
+                        image_parts[digest] = image_part
+                    
+                    slide = prs.slides.add_slide(blank_slide_layout)
+                    rId = slide.part.relate_to(image_part, RT.IMAGE)
+                    
+                    # Fit the page render inside the slide, centered
+                    width, height = page_sizes[page_num]
+                    scale = min(prs.slide_width / Pt(width), prs.slide_height / Pt(height))
+                    pic_width = int(Pt(width) * scale)
+                    pic_height = int(Pt(height) * scale)
+                    slide.shapes._add_pic_from_image_part(
+                        image_part, rId,
+                        (prs.slide_width - pic_width) // 2,
+                        (prs.slide_height - pic_height) // 2,
+                        pic_width, pic_height
+                    )
+            
+            def save():
+                with stage("convert", "save"), open(output_path, "wb") as f:
+                    prs.save(f)
+            
+            loop = asyncio.get_running_loop()
+            if len(chunks) == 1:
+                # Small decks are not worth a trip to the worker pool; a thread
+                # keeps the event loop free and still sees in-memory uploads
+                with stage("convert", "render"):
+                    blobs = await loop.run_in_executor(
+                        None, _render_pages_to_jpeg, str(pdf_path), page_numbers, dpi)
+                await asyncio.to_thread(add_slides, page_numbers, blobs)
+            else:
+                # Worker processes can't see this process's in-memory uploads
+                shared_path = str(documents.local_path(pdf_path))
+                futures = [
+                    asyncio.ensure_future(run_in_pool(_render_pages_to_jpeg, shared_path, chunk,
+                                                      dpi, 85, documents.password(pdf_path)))
+                    for chunk in chunks
+                ]
+                try:
+                    # Slides are appended in page order as each chunk lands
+                    for chunk, future in zip(chunks, futures):
+                        with stage("convert", "render"):
+                            blobs = await future
+                        await asyncio.to_thread(add_slides, chunk, blobs)
+                finally:
+                    # A failed chunk leaves no other chunks rendering in the pool, and
+                    # a second failure among the finished ones is retrieved, not logged
+                    for future in futures:
+                        if not future.cancel() and not future.cancelled():
+                            future.exception()
+            
+            await asyncio.to_thread(save)
+            
+            return output_path
+            
+        except Exception as e:
+            logger.error(f"PDF to PowerPoint error: {e}")
+            raise
+    
+    async def _pdf_to_powerpoint_text(self, pdf_path: Path, output_path: Path,
+                                      pages: Optional[List[int]]) -> Path:
+        """Convert PDF to PowerPoint as editable text boxes"""
         try:
             import fitz
             from pptx import Presentation
@@ -178,7 +332,7 @@ class PDFConverter:
             prs = Presentation()
             blank_slide_layout = prs.slide_layouts[6]  # Blank layout
             
-            pdf_document = fitz.open(pdf_path)
+            pdf_document = documents.open_fitz(pdf_path)
             
             for page_num in range(len(pdf_document)):
                 if pages and (page_num + 1) not in pages:
@@ -217,7 +371,8 @@ class PDFConverter:
             import fitz
             from PIL import Image
             
-            pdf_document = fitz.open(pdf_path)
+            with stage("convert", "open"):
+                pdf_document = documents.open_fitz(pdf_path)
             images = []
             
             dpi = {"high": 300, "medium": 150, "low": 72}.get(quality, 150)
@@ -226,23 +381,25 @@ class PDFConverter:
                 if pages and (page_num + 1) not in pages:
                     continue
                 
-                page = pdf_document.load_page(page_num)
-                mat = fitz.Matrix(dpi / 72, dpi / 72)
-                pix = page.get_pixmap(matrix=mat)
-                
-                img_data = pix.tobytes(format)
-                img = Image.frombytes("RGB", [pix.width, pix.height], img_data)
+                with stage("convert", "render"):
+                    page = pdf_document.load_page(page_num)
+                    mat = fitz.Matrix(dpi / 72, dpi / 72)
+                    pix = page.get_pixmap(matrix=mat)
                 
-                if len(pdf_document) == 1 or pages:
-                    # Single image
-                    img.save(output_path, format=format.upper(), 
-                            quality=95 if quality == "high" else 85)
-                else:
-                    # Multiple images
-                    img_path = Path("processed") / f"{pdf_path.stem}_page_{page_num+1}.{format}"
-                    img.save(img_path, format=format.upper(), 
-                            quality=95 if quality == "high" else 85)
-                    images.append(img_path)
+                with stage("convert", "encode"):
+                    img_data = pix.tobytes(format)
+                    img = Image.frombytes("RGB", [pix.width, pix.height], img_data)
+                    
+                    if len(pdf_document) == 1 or pages:
+                        # Single image
+                        img.save(output_path, format=format.upper(), 
+                                quality=95 if quality == "high" else 85)
+                    else:
+                        # Multiple images
+                        img_path = processed.path_for(f"{pdf_path.stem}_page_{page_num+1}.{format}")
+                        img.save(img_path, format=format.upper(), 
+                                quality=95 if quality == "high" else 85)
+                        images.append(img_path)
             
             pdf_document.close()
             
@@ -262,7 +419,7 @@ class PDFConverter:
         try:
             import fitz
             
-            pdf_document = fitz.open(pdf_path)
+            pdf_document = documents.open_fitz(pdf_path)
             text_content = []
             
             for page_num in range(len(pdf_document)):
@@ -296,28 +453,16 @@ class PDFConverter:
     async def _word_to_pdf(self, word_path: Path, output_path: Path) -> Path:
         """Convert Word document to PDF"""
         try:
-            # Try using python-docx and reportlab
             from docx import Document
-            from reportlab.lib.pagesizes import letter
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.units import inch
+            from typesetter import PDFTypesetter
             
-            doc = Document(word_path)
-            c = canvas.Canvas(str(output_path), pagesize=letter)
-            width, height = letter
-            y = height - inch
+            doc = Document(documents.open_binary(word_path))
             
-            for paragraph in doc.paragraphs:
-                if y < inch:  # New page
-                    c.showPage()
-                    y = height - inch
-                
-                text = paragraph.text.strip()
-                if text:
-                    c.drawString(inch, y, text)
-                    y -= 14  # Line height
+            with stage("convert", "render"), \
+                    PDFTypesetter(output_path, font_name="Helvetica", font_size=11) as typesetter:
+                for paragraph in doc.paragraphs:
+                    typesetter.write_paragraph(paragraph.text.strip())
             
-            c.save()
             return output_path
             
         except Exception as e:
@@ -331,7 +476,7 @@ class PDFConverter:
             from reportlab.lib.pagesizes import letter
             from reportlab.pdfgen import canvas
             
-            wb = load_workbook(excel_path, data_only=True)
+            wb = load_workbook(documents.open_binary(excel_path), data_only=True)
             ws = wb.active
             
             c = canvas.Canvas(str(output_path), pagesize=letter)
@@ -371,7 +516,7 @@ class PDFConverter:
             from reportlab.lib.pagesizes import letter
             from reportlab.pdfgen import canvas
             
-            prs = Presentation(ppt_path)
+            prs = Presentation(documents.open_binary(ppt_path))
             c = canvas.Canvas(str(output_path), pagesize=letter)
             width, height = letter
             
@@ -401,62 +546,146 @@ class PDFConverter:
             logger.error(f"PowerPoint to PDF error: {e}")
             raise
     
-    async def _image_to_pdf(self, image_path: Path, output_path: Path, 
-                           quality: str) -> Path:
-        """Convert image to PDF"""
+    @counted("images-to-pdf")
+    async def images_to_pdf(self, image_paths: List[Path], output_path: Optional[Path] = None,
+                            page_size: str = "letter") -> Path:
+        """Assemble many images into one PDF, one page per image (or TIFF frame)
+        
+        JPEGs are embedded as-is as /DCTDecode streams; only formats PDF cannot
+        carry natively are decoded and Flate-compressed. page_size is "letter"
+        (image fitted on a letter page) or "image" (page sized to the image).
+        """
+        if not image_paths:
+            raise ValueError("No images to convert")
+        
+        if output_path is None:
+            output_path = processed.path_for(f"{image_paths[0].stem}_images.pdf")
+        
         try:
+            import pikepdf
             from PIL import Image
-            from reportlab.lib.pagesizes import letter
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.utils import ImageReader
             
-            img = Image.open(image_path)
-            c = canvas.Canvas(str(output_path), pagesize=letter)
-            width, height = letter
-            
-            # Calculate scaling
-            img_width, img_height = img.size
-            scale = min(width/img_width, height/img_height) * 0.8
-            
-            x = (width - img_width * scale) / 2
-            y = (height - img_height * scale) / 2
+            pdf = pikepdf.Pdf.new()
+            
+            for image_path in image_paths:
+                with stage("convert", "encode"), documents.open_image(image_path) as img:
+                    orientation = img.getexif().get(0x0112, 1)  # EXIF Orientation
+                    # Mirrored orientations cannot be expressed by rotating the
+                    # placement, so those JPEGs take the decode path too
+                    if (img.format == "JPEG" and img.mode in ("L", "RGB", "CMYK")
+                            and orientation in (1, 3, 6, 8)):
+                        xobjects = [(self._jpeg_xobject(pdf, image_path, img),
+                                     img.size, orientation)]
+                    else:
+                        xobjects = self._decoded_xobjects(pdf, img)
+                
+                for xobject, (width, height), orientation in xobjects:
+                    pdf.pages.append(self._image_page(pdf, xobject, width, height,
+                                                      orientation, page_size))
             
-            c.drawImage(ImageReader(img), x, y, 
-                       width=img_width * scale, 
-                       height=img_height * scale)
-            c.save()
+            with stage("convert", "save"):
+                pdf.save(output_path)
+            pdf.close()
             
             return output_path
             
         except Exception as e:
-            logger.error(f"Image to PDF error: {e}")
+            logger.error(f"Images to PDF error: {e}")
             raise
     
+    def _jpeg_xobject(self, pdf, image_path: Path, img):
+        """Wrap the raw JPEG file in an image XObject without decoding it"""
+        import pikepdf
+        
+        colorspaces = {"L": "/DeviceGray", "RGB": "/DeviceRGB", "CMYK": "/DeviceCMYK"}
+        xobject = pikepdf.Stream(pdf, documents.read_bytes(image_path))
+        xobject.Type = pikepdf.Name("/XObject")
+        xobject.Subtype = pikepdf.Name("/Image")
+        xobject.Width, xobject.Height = img.size
+        xobject.ColorSpace = pikepdf.Name(colorspaces[img.mode])
+        xobject.BitsPerComponent = 8
+        xobject.Filter = pikepdf.Name("/DCTDecode")
+        
+        # Photoshop-style CMYK JPEGs store inverted ink values
+        if img.mode == "CMYK" and "adobe" in img.info:
+            xobject.Decode = pikepdf.Array([1, 0] * 4)
+        
+        return xobject
+    
+    def _decoded_xobjects(self, pdf, img):
+        """Decode non-JPEG images (every frame of multi-page TIFFs) to Flate XObjects"""
+        import zlib
+        import pikepdf
+        from PIL import ImageOps, ImageSequence
+        
+        xobjects = []
+        for frame in ImageSequence.Iterator(img):
+            frame = ImageOps.exif_transpose(frame)
+            if frame.mode not in ("L", "RGB"):
+                frame = frame.convert("L" if frame.mode in ("1", "I", "I;16", "F") else "RGB")
+            
+            xobject = pikepdf.Stream(pdf, zlib.compress(frame.tobytes(), 6))
+            xobject.Type = pikepdf.Name("/XObject")
+            xobject.Subtype = pikepdf.Name("/Image")
+            xobject.Width, xobject.Height = frame.size
+            xobject.ColorSpace = pikepdf.Name("/DeviceGray" if frame.mode == "L" else "/DeviceRGB")
+            xobject.BitsPerComponent = 8
+            xobject.Filter = pikepdf.Name("/FlateDecode")
+            xobjects.append((xobject, frame.size, 1))
+        
+        return xobjects
+    
+    def _image_page(self, pdf, xobject, width: int, height: int,
+                    orientation: int, page_size: str):
+        """Build a page that draws one image XObject, honouring EXIF rotation"""
+        import pikepdf
+        
+        # Quarter-turn orientations are displayed with width and height swapped
+        if orientation in (6, 8):
+            width, height = height, width
+        
+        if page_size == "image":
+            page_width, page_height = width, height
+            scale = 1
+        else:
+            page_width, page_height = 612, 792  # Letter
+            scale = min(page_width / width, page_height / height) * 0.8
+        
+        w, h = width * scale, height * scale
+        x, y = (page_width - w) / 2, (page_height - h) / 2
+        
+        # Map the unit image square onto the displayed box
+        matrices = {
+            3: (-w, 0, 0, -h, x + w, y + h),
+            6: (0, -h, w, 0, x, y + h),
+            8: (0, h, -w, 0, x + w, y),
+        }
+        matrix = matrices.get(orientation, (w, 0, 0, h, x, y))
+        content = "q {} cm /Im0 Do Q".format(" ".join(f"{v:.4f}" for v in matrix))
+        
+        return pikepdf.Page(pikepdf.Dictionary(
+            Type=pikepdf.Name("/Page"),
+            MediaBox=[0, 0, page_width, page_height],
+            Resources=pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=xobject)),
+            Contents=pikepdf.Stream(pdf, content.encode()),
+        ))
+    
+    async def _image_to_pdf(self, image_path: Path, output_path: Path, 
+                           quality: str) -> Path:
+        """Convert image to PDF"""
+        return await self.images_to_pdf([image_path], output_path)
+    
     async def _text_to_pdf(self, text_path: Path, output_path: Path) -> Path:
         """Convert text file to PDF"""
         try:
-            from reportlab.lib.pagesizes import letter
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.units import inch
-            
-            with open(text_path, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-            
-            c = canvas.Canvas(str(output_path), pagesize=letter)
-            width, height = letter
+            from typesetter import PDFTypesetter
             
-            y = height - inch
-            line_height = 14
+            # Lines are read and typeset incrementally; pages are written as they fill
+            with stage("convert", "render"), \
+                    io.TextIOWrapper(documents.open_binary(text_path), encoding="utf-8", errors="replace") as f, \
+                    PDFTypesetter(output_path, font_name="Courier", font_size=9) as typesetter:
+                typesetter.write_lines(f)
             
-            for line in lines:
-                if y < inch:  # New page
-                    c.showPage()
-                    y = height - inch
-                
-                c.drawString(inch, y, line.rstrip())
-                y -= line_height
-            
-            c.save()
             return output_path
             
         except Exception as e:
@@ -467,7 +696,7 @@ class PDFConverter:
         """Create zip file of multiple images"""
         import zipfile
         
-        zip_path = Path("processed") / f"images_{len(image_paths)}.zip"
+        zip_path = processed.path_for(f"images_{uuid.uuid4()}.zip")
         
         with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
             for img_path in image_paths:
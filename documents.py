@@ -0,0 +1,248 @@
+import hashlib
+import io
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import logging
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+import aiofiles
+
+from storage import ShardedStorage, link_or_copy, uploads
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class DocumentPasswordError(Exception):
+    """An encrypted input was opened without its password, or with the wrong one"""
+
+
+class DocumentStore:
+    """Where uploaded inputs live: in memory when small, on disk when large
+
+    Inputs are still named by Path everywhere (tool signatures, jobs, cleanup),
+    but an upload of at most spool_limit bytes is only ever held in memory
+    under its path; nothing is written and the tools open it from the buffer.
+    When memory_budget is exceeded the oldest buffers are spilled to disk.
+    Inputs on disk are opened through a shared read-only mmap, so several
+    tools in one process reading the same file use the page cache directly.
+
+    A password given with an encrypted input is kept next to it, in memory
+    only, and every open below decrypts with it; no tool needs a decrypted
+    copy on disk.
+    """
+
+    def __init__(self, storage: ShardedStorage, spool_limit: int = MB,
+                 memory_budget: int = 256 * MB, max_mapped: int = 16):
+        self.storage = storage
+        self.spool_limit = spool_limit
+        self.memory_budget = memory_budget
+        self.max_mapped = max_mapped
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._mapped: "OrderedDict[Tuple[str, int, int], mmap.mmap]" = OrderedDict()
+        self._hashes: "OrderedDict[str, str]" = OrderedDict()
+        self._passwords: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    async def save(self, name: str, data: bytes) -> Path:
+        """Store an upload and return the path the tools should be given"""
+        if len(data) <= self.spool_limit:
+            # Flat path under the storage root; it only exists in memory
+            path = self.storage.root / name
+            with self._lock:
+                self._memory[str(path)] = data
+                self._memory_bytes += len(data)
+                spill = self._over_budget()
+            for key in spill:
+                self._spill(key)
+            return path
+
+        path = self.storage.path_for(name)
+        async with aiofiles.open(path, "wb") as out_file:
+            await out_file.write(data)
+        return path
+
+    def _over_budget(self) -> List[str]:
+        # Called with the lock held; the newest buffer always stays in memory
+        spill = []
+        excess = self._memory_bytes - self.memory_budget
+        for key, data in self._memory.items():
+            if excess <= 0 or len(spill) == len(self._memory) - 1:
+                break
+            spill.append(key)
+            excess -= len(data)
+        return spill
+
+    def _spill(self, key: str):
+        """Write a buffer to its path, then forget it; readers see one or the other throughout"""
+        data = self._memory.get(key)
+        if data is None:
+            return
+        path = Path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        self.storage.index.set([path], self.storage.default_ttl)
+        with self._lock:
+            if self._memory.pop(key, None) is not None:
+                self._memory_bytes -= len(data)
+
+    def _buffer(self, path) -> Optional[bytes]:
+        return self._memory.get(str(path))
+
+    def in_memory(self, path) -> bool:
+        return str(path) in self._memory
+
+    def exists(self, path) -> bool:
+        return self.in_memory(path) or os.path.exists(path)
+
+    def size(self, path) -> int:
+        data = self._buffer(path)
+        return len(data) if data is not None else os.path.getsize(path)
+
+    def read_bytes(self, path) -> bytes:
+        data = self._buffer(path)
+        return data if data is not None else Path(path).read_bytes()
+
+    def open_binary(self, path) -> BinaryIO:
+        """File-like object over the input (for python-docx, openpyxl, python-pptx, hashing)"""
+        data = self._buffer(path)
+        return io.BytesIO(data) if data is not None else open(path, "rb")
+
+    def passthrough(self, path, target: Path):
+        """Make target an output identical to the input, linking rather than copying on disk"""
+        data = self._buffer(path)
+        if data is not None:
+            Path(target).write_bytes(data)
+        else:
+            link_or_copy(Path(path), Path(target))
+
+    def sha256(self, path) -> str:
+        """Hex SHA-256 of the input's content, computed once per input"""
+        key = str(path)
+        digest = self._hashes.get(key)
+        if digest is None:
+            hasher = hashlib.sha256()
+            with self.open_binary(path) as f:
+                while True:
+                    block = f.read(MB)
+                    if not block:
+                        break
+                    hasher.update(block)
+            digest = hasher.hexdigest()
+            self.remember_sha256(path, digest)
+        return digest
+
+    def known_sha256(self, path) -> Optional[str]:
+        """The input's hash if it has already been computed, without reading anything"""
+        return self._hashes.get(str(path))
+
+    def remember_sha256(self, path, digest: str):
+        """Record a hash computed elsewhere (e.g. when a resumable upload was finalized)"""
+        with self._lock:
+            self._hashes[str(path)] = digest
+            while len(self._hashes) > 4096:
+                self._hashes.popitem(last=False)
+
+    def _view(self, path) -> memoryview:
+        """Zero-copy view of a file on disk through a cached read-only mapping"""
+        stat = os.stat(path)
+        key = (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            mapped = self._mapped.get(key)
+            if mapped is not None:
+                self._mapped.move_to_end(key)
+                return memoryview(mapped)
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with self._lock:
+            self._mapped[key] = mapped
+            while len(self._mapped) > self.max_mapped:
+                # Documents still holding a view keep the mapping alive
+                self._mapped.popitem(last=False)
+        return memoryview(mapped)
+
+    def set_password(self, path, password: str):
+        """Decrypt this input with password wherever it is opened"""
+        with self._lock:
+            self._passwords[str(path)] = password
+
+    def password(self, path) -> Optional[str]:
+        return self._passwords.get(str(path))
+
+    def authenticate(self, doc, path):
+        """Unlock an open PyMuPDF document with the input's password"""
+        if not doc.needs_pass:
+            return doc
+        password = self.password(path)
+        if password is None:
+            doc.close()
+            raise DocumentPasswordError("PDF is password protected; send its password")
+        if not doc.authenticate(password):
+            doc.close()
+            raise DocumentPasswordError("Incorrect PDF password")
+        return doc
+
+    def open_fitz(self, path, decrypt: bool = True):
+        """PyMuPDF document over the buffer or mapping, never a private copy
+
+        With decrypt=False an encrypted document is left locked (for reading
+        what is visible without the password).
+        """
+        import fitz
+
+        data = self._buffer(path)
+        if data is None:
+            if os.path.getsize(path) == 0:
+                return fitz.open(path)  # empty files can't be mapped; let MuPDF report it
+            data = self._view(path)
+        doc = fitz.open(stream=data, filetype=Path(path).suffix.lstrip(".") or "pdf")
+        return self.authenticate(doc, path) if decrypt else doc
+
+    def open_pikepdf(self, path, **kwargs):
+        """pikepdf.Pdf over the buffer, or mmap-backed for files on disk"""
+        import pikepdf
+
+        password = self.password(path)
+        if password is not None:
+            kwargs.setdefault("password", password)
+        data = self._buffer(path)
+        if data is not None:
+            # A buffer is never overwritten, and pikepdf only accepts the flag with a path
+            kwargs.pop("allow_overwriting_input", None)
+            return pikepdf.open(io.BytesIO(data), **kwargs)
+        if not kwargs.get("allow_overwriting_input"):
+            kwargs.setdefault("access_mode", pikepdf.AccessMode.mmap)
+        return pikepdf.open(path, **kwargs)
+
+    def open_image(self, path):
+        from PIL import Image
+
+        data = self._buffer(path)
+        return Image.open(io.BytesIO(data) if data is not None else path)
+
+    def local_path(self, path) -> Path:
+        """A real file for libraries and processes that need one; spills a buffer if needed"""
+        self._spill(str(path))
+        return Path(path)
+
+    def discard(self, paths: Iterable):
+        """Drop in-memory inputs (and passwords) once their job is done"""
+        with self._lock:
+            for path in paths:
+                self._hashes.pop(str(path), None)
+                self._passwords.pop(str(path), None)
+                data = self._memory.pop(str(path), None)
+                if data is not None:
+                    self._memory_bytes -= len(data)
+
+
+documents = DocumentStore(
+    uploads,
+    spool_limit=int(os.environ.get("FLIPFILE_SPOOL_LIMIT", MB)),
+    memory_budget=int(os.environ.get("FLIPFILE_SPOOL_BUDGET", 256 * MB)),
+)
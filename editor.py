@@ -1,9 +1,14 @@
 import asyncio
+import uuid
 from pathlib import Path
 import logging
 from typing import List, Dict, Any, Optional, Union
 import tempfile
 
+from stats import counted
+from storage import processed
+from documents import documents
+
 logger = logging.getLogger(__name__)
 
 class PDFEditor:
@@ -16,6 +21,7 @@ class PDFEditor:
             "resize", "add_blank", "extract_images"
         ]
     
+    @counted("edit")
     async def edit(self, input_path: Path, operation: str, 
                   parameters: Dict[str, Any] = None) -> Union[Path, List[Path]]:
         """Perform PDF editing operation"""
@@ -54,8 +60,7 @@ class PDFEditor:
     async def merge_pdfs(self, pdf_paths: List[Path], 
                         parameters: Dict[str, Any]) -> Path:
         """Merge multiple PDFs into one"""
-        output_dir = Path("processed")
-        output_path = output_dir / f"merged_{len(pdf_paths)}_files.pdf"
+        output_path = processed.path_for(f"merged_{uuid.uuid4()}.pdf")
         
         try:
             import pikepdf
@@ -63,10 +68,10 @@ class PDFEditor:
             merged = pikepdf.Pdf.new()
             
             for pdf_path in pdf_paths:
-                if not pdf_path.exists():
+                if not documents.exists(pdf_path):
                     continue
                 
-                src = pikepdf.open(pdf_path)
+                src = documents.open_pikepdf(pdf_path)
                 merged.pages.extend(src.pages)
                 src.close()
             
@@ -89,7 +94,7 @@ class PDFEditor:
         try:
             import pikepdf
             
-            pdf = pikepdf.open(input_path)
+            pdf = documents.open_pikepdf(input_path)
             total_pages = len(pdf.pages)
             
             split_type = parameters.get("type", "single_pages")
@@ -101,7 +106,7 @@ class PDFEditor:
                     output = pikepdf.Pdf.new()
                     output.pages.append(pdf.pages[page_num])
                     
-                    output_path = Path("processed") / f"{input_path.stem}_page_{page_num+1}.pdf"
+                    output_path = processed.path_for(f"{input_path.stem}_page_{page_num+1}.pdf")
                     output.save(output_path)
                     output.close()
                     
@@ -124,7 +129,7 @@ class PDFEditor:
                         if page_num < total_pages:
                             output.pages.append(pdf.pages[page_num])
                     
-                    output_path = Path("processed") / f"{input_path.stem}_pages_{start+1}-{end+1}.pdf"
+                    output_path = processed.path_for(f"{input_path.stem}_pages_{start+1}-{end+1}.pdf")
                     output.save(output_path)
                     output.close()
                     
@@ -141,7 +146,7 @@ class PDFEditor:
                     for page_num in range(i, end):
                         output.pages.append(pdf.pages[page_num])
                     
-                    output_path = Path("processed") / f"{input_path.stem}_part_{i//n + 1}.pdf"
+                    output_path = processed.path_for(f"{input_path.stem}_part_{i//n + 1}.pdf")
                     output.save(output_path)
                     output.close()
                     
@@ -157,13 +162,12 @@ class PDFEditor:
     async def rotate_pages(self, input_path: Path, 
                           parameters: Dict[str, Any]) -> Path:
         """Rotate PDF pages"""
-        output_dir = Path("processed")
-        output_path = output_dir / f"rotated_{input_path.name}"
+        output_path = processed.path_for(f"rotated_{input_path.name}")
         
         try:
             import pikepdf
             
-            pdf = pikepdf.open(input_path)
+            pdf = documents.open_pikepdf(input_path)
             
             # Get rotation parameters
             angle = parameters.get("angle", 90)
@@ -199,13 +203,12 @@ class PDFEditor:
     async def reorder_pages(self, input_path: Path, 
                            parameters: Dict[str, Any]) -> Path:
         """Reorder PDF pages"""
-        output_dir = Path("processed")
-        output_path = output_dir / f"reordered_{input_path.name}"
+        output_path = processed.path_for(f"reordered_{input_path.name}")
         
         try:
             import pikepdf
             
-            pdf = pikepdf.open(input_path)
+            pdf = documents.open_pikepdf(input_path)
             total_pages = len(pdf.pages)
             
             # Get new page order
@@ -236,13 +239,12 @@ class PDFEditor:
     async def extract_pages(self, input_path: Path, 
                            parameters: Dict[str, Any]) -> Path:
         """Extract specific pages to new PDF"""
-        output_dir = Path("processed")
-        output_path = output_dir / f"extracted_{input_path.name}"
+        output_path = processed.path_for(f"extracted_{input_path.name}")
         
         try:
             import pikepdf
             
-            pdf = pikepdf.open(input_path)
+            pdf = documents.open_pikepdf(input_path)
             
             # Get pages to extract
             pages = parameters.get("pages", [1])
@@ -268,13 +270,12 @@ class PDFEditor:
     async def delete_pages(self, input_path: Path, 
                           parameters: Dict[str, Any]) -> Path:
         """Delete specific pages from PDF"""
-        output_dir = Path("processed")
-        output_path = output_dir / f"deleted_{input_path.name}"
+        output_path = processed.path_for(f"deleted_{input_path.name}")
         
         try:
             import pikepdf
             
-            pdf = pikepdf.open(input_path)
+            pdf = documents.open_pikepdf(input_path)
             total_pages = len(pdf.pages)
             
             # Get pages to delete
@@ -304,24 +305,23 @@ class PDFEditor:
     async def insert_pages(self, input_path: Path, 
                           parameters: Dict[str, Any]) -> Path:
         """Insert pages from another PDF"""
-        output_dir = Path("processed")
-        output_path = output_dir / f"inserted_{input_path.name}"
+        output_path = processed.path_for(f"inserted_{input_path.name}")
         
         try:
             import pikepdf
             
-            pdf = pikepdf.open(input_path)
+            pdf = documents.open_pikepdf(input_path)
             
             # Get insertion parameters
             insert_file = Path(parameters.get("insert_file", ""))
             position = parameters.get("position", "end")
             pages = parameters.get("pages", "all")
             
-            if not insert_file.exists():
+            if not documents.exists(insert_file):
                 raise ValueError("Insert file not found")
             
             # Open PDF to insert
-            insert_pdf = pikepdf.open(insert_file)
+            insert_pdf = documents.open_pikepdf(insert_file)
             
             # Get pages to insert
             if pages == "all":
@@ -368,27 +368,18 @@ class PDFEditor:
     async def resize_pages(self, input_path: Path, 
                           parameters: Dict[str, Any]) -> Path:
         """Resize PDF pages"""
-        output_dir = Path("processed")
-        output_path = output_dir / f"resized_{input_path.name}"
+        output_path = processed.path_for(f"resized_{input_path.name}")
         
         try:
-            import pikepdf
             import fitz
             
-            pdf = pikepdf.open(input_path)
-            
             # Get resize parameters
             size = parameters.get("size", "A4")
             orientation = parameters.get("orientation", "portrait")
             
-            # Convert pikepdf to PyMuPDF for resizing
-            # Save temporary file
-            temp_path = Path("temp") / f"temp_{input_path.name}"
-            pdf.save(temp_path)
-            pdf.close()
-            
-            # Open with PyMuPDF for resizing
-            doc = fitz.open(temp_path)
+            # Open with PyMuPDF for resizing, straight from the input (decrypted
+            # in memory if it has a password) rather than through a temp copy
+            doc = documents.open_fitz(input_path)
             
             # Page sizes in points (1/72 inch)
             page_sizes = {
@@ -433,9 +424,6 @@ class PDFEditor:
             new_doc.close()
             doc.close()
             
-            # Cleanup temp file
-            temp_path.unlink(missing_ok=True)
-            
             return output_path
             
         except Exception as e:
@@ -445,27 +433,18 @@ class PDFEditor:
     async def add_blank_pages(self, input_path: Path, 
                              parameters: Dict[str, Any]) -> Path:
         """Add blank pages to PDF"""
-        output_dir = Path("processed")
-        output_path = output_dir / f"with_blanks_{input_path.name}"
+        output_path = processed.path_for(f"with_blanks_{input_path.name}")
         
         try:
-            import pikepdf
             import fitz
             
-            pdf = pikepdf.open(input_path)
-            
             # Get parameters
             count = parameters.get("count", 1)
             position = parameters.get("position", "end")
             page_size = parameters.get("page_size", "same")
             
-            # Save temporary file
-            temp_path = Path("temp") / f"temp_{input_path.name}"
-            pdf.save(temp_path)
-            pdf.close()
-            
-            # Open with PyMuPDF
-            doc = fitz.open(temp_path)
+            # Open with PyMuPDF, straight from the input
+            doc = documents.open_fitz(input_path)
             new_doc = fitz.open()
             
             # Get page size for blank pages
@@ -506,9 +485,6 @@ class PDFEditor:
             new_doc.close()
             doc.close()
             
-            # Cleanup temp file
-            temp_path.unlink(missing_ok=True)
-            
             return output_path
             
         except Exception as e:
@@ -523,7 +499,7 @@ class PDFEditor:
             from PIL import Image
             import io
             
-            doc = fitz.open(input_path)
+            doc = documents.open_fitz(input_path)
             image_paths = []
             
             # Get extraction parameters
@@ -569,8 +545,8 @@ class PDFEditor:
                                     img_pil = img_pil.resize(new_size, Image.Resampling.LANCZOS)
                             
                             # Save in desired format
-                            output_path = Path("processed") / \
-                                        f"{input_path.stem}_page{page_num+1}_img{img_index+1}.{format}"
+                            output_path = processed.path_for(
+                                        f"{input_path.stem}_page{page_num+1}_img{img_index+1}.{format}")
                             
                             if format.lower() == "jpg":
                                 img_pil = img_pil.convert("RGB")  # JPG doesn't support alpha
@@ -582,8 +558,8 @@ class PDFEditor:
                             image_count += 1
                         else:
                             # Save original
-                            output_path = Path("processed") / \
-                                        f"{input_path.stem}_page{page_num+1}_img{img_index+1}.{image_ext}"
+                            output_path = processed.path_for(
+                                        f"{input_path.stem}_page{page_num+1}_img{img_index+1}.{image_ext}")
                             
                             with open(output_path, "wb") as f:
                                 f.write(image_bytes)
@@ -611,7 +587,7 @@ class PDFEditor:
             
             current_page = 0
             for file_path in pdf_paths:
-                if not file_path.exists():
+                if not documents.exists(file_path):
                     continue
                 
                 # Add bookmark for this file
@@ -633,7 +609,7 @@ class PDFEditor:
                 pdf.Root.Outlines['/Last'] = bookmark
                 
                 # Update page count
-                src_pdf = pikepdf.open(file_path)
+                src_pdf = documents.open_pikepdf(file_path)
                 current_page += len(src_pdf.pages)
                 src_pdf.close()
                 
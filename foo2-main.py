@@ -1,8 +1,6 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request, BackgroundTasks
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from typing import List, Optional, Dict, Any
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request, BackgroundTasks, Depends
+from fastapi.responses import Response, HTMLResponse, JSONResponse, FileResponse, StreamingResponse, PlainTextResponse, RedirectResponse
+from typing import List, Optional, Dict, Any, Tuple
 import os
 import uuid
 import shutil
@@ -12,24 +10,45 @@ from datetime import datetime, timedelta
 import tempfile
 import json
 import asyncio
-import aiofiles
+import contextvars
 from pydantic import BaseModel
 
-# Import tool modules
-from tools.converter import PDFConverter
-from tools.compressor import PDFCompressor
-from tools.protector import PDFProtector
-from tools.unlocker import PDFUnlocker
-from tools.editor import PDFEditor
-from tools.color_extractor import ColorExtractor
+from instrumentation import instrument_app, mark_upload_complete, metrics
+from admission import AdmissionController, AdmissionRejected, QUALITY_DPI
+from ratelimit import RateLimitExceeded, client_buckets, create_rate_limiter
+from sessions import create_session_store, session_user
+from assets import StaticAssets
+from stats import stats
+import storage
+from storage import objects, processed, uploads
+from jobs import DONE, OPERATIONS, create_broker
+from singleflight import create_single_flight, request_key
+from registry import configured_preload, registry
+from documents import DocumentPasswordError, documents
+from inspection import inspections
+from resumable import UploadError, chunked_uploads, router as uploads_router
+
+# Set per request from its Prefer header (RFC 7240)
+respond_async: contextvars.ContextVar[bool] = contextvars.ContextVar("respond_async", default=False)
+
+async def read_preferences(request: Request):
+    """FastAPI dependency: note whether the client asked for Prefer: respond-async"""
+    prefer = request.headers.get("prefer", "")
+    respond_async.set("respond-async" in [token.split("=")[0].strip().lower()
+                                          for token in prefer.split(",")])
 
 app = FastAPI(
     title="FlipFile PDF Tools API",
     description="Free, Fast, Secure & Private PDF Tools Conversions",
     version="1.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    # Runs after the multipart body is parsed, so it marks the end of the upload
+    dependencies=[Depends(mark_upload_complete), Depends(read_preferences)]
 )
+instrument_app(app)
+# Resumable chunked uploads (/api/uploads); their ids work on every tool endpoint
+app.include_router(uploads_router)
 
 # Setup logging
 logging.basicConfig(
@@ -46,16 +65,28 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 PROCESSED_DIR.mkdir(exist_ok=True)
 TEMP_DIR.mkdir(exist_ok=True)
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Page, stylesheet and script are served from memory with gzip/brotli variants
+assets = StaticAssets(Path("."), ["index.html", "style.css", "main.js"])
+
+# Tools are imported on first use; FLIPFILE_PRELOAD_TOOLS=all loads them at startup
+registry.preload(configured_preload())
+
+# With FLIPFILE_BROKER set, heavy tool calls run on worker nodes (worker.py)
+broker = create_broker()
+single_flight = create_single_flight()
+
+# Caps concurrent heavy work per operation by estimated cost
+admission = AdmissionController()
 
-# Initialize tool instances
-converter = PDFConverter()
-compressor = PDFCompressor()
-protector = PDFProtector()
-unlocker = PDFUnlocker()
-editor = PDFEditor()
-color_extractor = ColorExtractor()
+# Per-client cost budget (token bucket + daily quota), keyed by the session's
+# user where there is one (FLIPFILE_SESSION_STORE shared with main.py) together
+# with a cap on the user's address, else by address alone
+rate_limiter = create_rate_limiter()
+user_sessions = create_session_store()
+
+def caller(request: Request) -> List[Tuple[str, str]]:
+    """Rate limit buckets for a request: its session user's and address's, or anonymous"""
+    return client_buckets(request, session_user(user_sessions, request))
 
 # Models
 class ConversionRequest(BaseModel):
@@ -89,16 +120,66 @@ class ColorExtractionRequest(BaseModel):
 # Store processing tasks
 processing_tasks = {}
 
+class JobAccepted(HTTPException):
+    """A tool call queued for the workers, answered at once rather than waited on"""
+    
+    def __init__(self, job_id: str):
+        super().__init__(202, f"Job {job_id} queued")
+        self.job_id = job_id
+
+@app.exception_handler(JobAccepted)
+async def job_accepted_handler(request: Request, exc: JobAccepted):
+    """202 with where to poll; the job id outlives this front end"""
+    progress_url = f"/api/progress/{exc.job_id}"
+    return JSONResponse(
+        status_code=202,
+        content={"success": True, "job_id": exc.job_id, "status": "queued", "progress_url": progress_url},
+        headers={"Location": progress_url, "Preference-Applied": "respond-async"}
+    )
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Shed load with 503 + Retry-After instead of queueing without bound"""
+    return JSONResponse(
+        status_code=503,
+        content={"success": False, "detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    """Tell over-budget clients when they may try again"""
+    return JSONResponse(
+        status_code=429,
+        content={"success": False, "detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """Serve the main HTML page"""
-    with open("index.html", "r", encoding="utf-8") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+    return assets.response("index.html", request)
+
+@app.get("/static/{name}")
+async def static_asset(name: str, request: Request):
+    """Serve a cached static asset"""
+    if name not in assets:
+        raise HTTPException(status_code=404, detail="File not found")
+    return assets.response(name, request)
+
+@app.get("/style.css")
+@app.get("/main.js")
+async def page_asset(request: Request):
+    """Serve the page's stylesheet and script at the relative paths index.html uses,
+    which is also where the GitHub Pages build has them"""
+    return assets.response(request.url.path.rsplit("/", 1)[-1], request)
 
 @app.post("/api/convert")
 async def convert_file(
-    file: UploadFile = File(...),
+    request: Request,
+    file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
+    document_password: Optional[str] = Form(None),
     format: str = Form(...),
     quality: str = Form("high"),
     pages: Optional[str] = Form(None)
@@ -111,14 +192,12 @@ async def convert_file(
         if format not in supported_formats:
             raise HTTPException(400, f"Unsupported format: {format}")
         
-        # Save uploaded file
-        file_ext = Path(file.filename).suffix.lower()
-        file_id = str(uuid.uuid4())
-        input_path = UPLOAD_DIR / f"{file_id}{file_ext}"
+        buckets = caller(request)
+        await rate_limiter.check(buckets)
+        admission.check("convert")
         
-        async with aiofiles.open(input_path, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
+        # Save uploaded file, or take a finished resumable upload
+        input_path, filename = await receive_input(file, upload_id, document_password)
         
         # Parse pages if provided
         page_list = None
@@ -126,55 +205,106 @@ async def convert_file(
             page_list = [int(p) for p in pages.split(",")]
         
         # Process conversion
-        output_path = await converter.convert(
-            input_path=input_path,
-            output_format=format,
-            quality=quality,
-            pages=page_list
-        )
+        cost = admission.estimate_cost([input_path], "convert", output_format=format,
+                                       dpi=QUALITY_DPI.get(quality, 150))
+        async with admission.admit("convert", cost), rate_limiter.limit(buckets, cost):
+            output_path = await run_tool(
+                "convert",
+                input_path=input_path,
+                output_format=format,
+                quality=quality,
+                pages=page_list
+            )
         
         # Schedule cleanup
         schedule_cleanup([input_path, output_path], hours=1)
         
         # Return download URL
-        filename = f"{Path(file.filename).stem}.{format}"
+        filename = f"{Path(filename).stem}.{format}"
         return JSONResponse({
             "success": True,
             "message": f"File converted to {format.upper()}",
-            "download_url": f"/api/download/{output_path.name}",
+            "download_url": await publish(output_path),
             "filename": filename
         })
         
+    except (AdmissionRejected, RateLimitExceeded, HTTPException):
+        raise
     except Exception as e:
         logger.error(f"Conversion error: {e}")
         raise HTTPException(500, f"Conversion failed: {str(e)}")
 
+@app.post("/api/images-to-pdf")
+async def images_to_pdf(
+    request: Request,
+    files: List[UploadFile] = File(None),
+    upload_ids: Optional[str] = Form(None),
+    page_size: str = Form("letter")
+):
+    """Assemble multiple images (e.g. scanned pages) into one PDF"""
+    try:
+        buckets = caller(request)
+        await rate_limiter.check(buckets)
+        admission.check("images-to-pdf")
+        
+        # Save all uploaded images, preserving upload order
+        inputs = await receive_inputs(files, upload_ids)
+        file_paths = [input_path for input_path, _ in inputs]
+        
+        cost = admission.estimate_cost(file_paths, "images-to-pdf")
+        async with admission.admit("images-to-pdf", cost), rate_limiter.limit(buckets, cost):
+            output_path = await registry.get("convert").images_to_pdf(
+                image_paths=file_paths,
+                output_path=processed.path_for(f"images_{uuid.uuid4()}.pdf"),
+                page_size=page_size
+            )
+        
+        # Schedule cleanup
+        schedule_cleanup(file_paths + [output_path], hours=1)
+        
+        return JSONResponse({
+            "success": True,
+            "message": f"Combined {len(inputs)} images into PDF",
+            "download_url": await publish(output_path),
+            "filename": f"{Path(inputs[0][1]).stem}.pdf"
+        })
+    
+    except (AdmissionRejected, RateLimitExceeded, HTTPException):
+        raise
+    except Exception as e:
+        logger.error(f"Images to PDF error: {e}")
+        raise HTTPException(500, f"Images to PDF failed: {str(e)}")
+
 @app.post("/api/compress")
 async def compress_pdf(
-    file: UploadFile = File(...),
+    request: Request,
+    file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
+    document_password: Optional[str] = Form(None),
     quality: str = Form("medium"),
     dpi: int = Form(150),
     remove_metadata: bool = Form(True)
 ):
     """Compress PDF file"""
     try:
-        # Save uploaded file
-        file_ext = Path(file.filename).suffix.lower()
-        file_id = str(uuid.uuid4())
-        input_path = UPLOAD_DIR / f"{file_id}{file_ext}"
+        buckets = caller(request)
+        await rate_limiter.check(buckets)
+        admission.check("compress")
         
-        async with aiofiles.open(input_path, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
+        # Save uploaded file
+        input_path, filename = await receive_input(file, upload_id, document_password)
         
         # Process compression
-        original_size = os.path.getsize(input_path)
-        output_path = await compressor.compress(
-            input_path=input_path,
-            quality=quality,
-            dpi=dpi,
-            remove_metadata=remove_metadata
-        )
+        original_size = documents.size(input_path)
+        cost = admission.estimate_cost([input_path], "compress", dpi=dpi)
+        async with admission.admit("compress", cost), rate_limiter.limit(buckets, cost):
+            output_path = await run_tool(
+                "compress",
+                input_path=input_path,
+                quality=quality,
+                dpi=dpi,
+                remove_metadata=remove_metadata
+            )
         compressed_size = os.path.getsize(output_path)
         
         # Calculate compression ratio
@@ -189,31 +319,34 @@ async def compress_pdf(
             "original_size": original_size,
             "compressed_size": compressed_size,
             "compression_ratio": compression_ratio,
-            "download_url": f"/api/download/{output_path.name}",
-            "filename": f"compressed_{Path(file.filename).name}"
+            "download_url": await publish(output_path),
+            "filename": f"compressed_{Path(filename).name}"
         })
         
+    except (AdmissionRejected, RateLimitExceeded, HTTPException):
+        raise
     except Exception as e:
         logger.error(f"Compression error: {e}")
         raise HTTPException(500, f"Compression failed: {str(e)}")
 
 @app.post("/api/protect")
 async def protect_pdf(
-    file: UploadFile = File(...),
+    request: Request,
+    file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
+    document_password: Optional[str] = Form(None),
     password: str = Form(...),
     encryption_level: str = Form("128bit"),
     permissions: str = Form('{"print": true, "modify": false, "copy": true, "annotations": true}')
 ):
     """Protect PDF with password"""
     try:
-        # Save uploaded file
-        file_ext = Path(file.filename).suffix.lower()
-        file_id = str(uuid.uuid4())
-        input_path = UPLOAD_DIR / f"{file_id}{file_ext}"
+        buckets = caller(request)
+        await rate_limiter.check(buckets)
+        admission.check("protect")
         
-        async with aiofiles.open(input_path, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
+        # Save uploaded file
+        input_path, filename = await receive_input(file, upload_id, document_password)
         
         # Parse permissions
         try:
@@ -227,12 +360,15 @@ async def protect_pdf(
             }
         
         # Process protection
-        output_path = await protector.protect(
-            input_path=input_path,
-            password=password,
-            encryption_level=encryption_level,
-            permissions=perm_dict
-        )
+        cost = admission.estimate_cost([input_path], "protect")
+        async with admission.admit("protect", cost), rate_limiter.limit(buckets, cost):
+            output_path = await run_tool(
+                "protect",
+                input_path=input_path,
+                password=password,
+                encryption_level=encryption_level,
+                permissions=perm_dict
+            )
         
         # Schedule cleanup
         schedule_cleanup([input_path, output_path], hours=1)
@@ -240,35 +376,39 @@ async def protect_pdf(
         return JSONResponse({
             "success": True,
             "message": "PDF protected successfully",
-            "download_url": f"/api/download/{output_path.name}",
-            "filename": f"protected_{Path(file.filename).name}"
+            "download_url": await publish(output_path),
+            "filename": f"protected_{Path(filename).name}"
         })
         
+    except (AdmissionRejected, RateLimitExceeded, HTTPException):
+        raise
     except Exception as e:
         logger.error(f"Protection error: {e}")
         raise HTTPException(500, f"Protection failed: {str(e)}")
 
 @app.post("/api/unlock")
 async def unlock_pdf(
-    file: UploadFile = File(...),
+    request: Request,
+    file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
     password: Optional[str] = Form(None)
 ):
     """Unlock/remove password from PDF"""
     try:
-        # Save uploaded file
-        file_ext = Path(file.filename).suffix.lower()
-        file_id = str(uuid.uuid4())
-        input_path = UPLOAD_DIR / f"{file_id}{file_ext}"
+        buckets = caller(request)
+        await rate_limiter.check(buckets)
+        admission.check("unlock")
         
-        async with aiofiles.open(input_path, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
+        # Save uploaded file (the password is this tool's own parameter)
+        input_path, filename = await receive_input(file, upload_id, require_password=False)
         
         # Process unlocking
-        output_path = await unlocker.unlock(
-            input_path=input_path,
-            password=password
-        )
+        cost = admission.estimate_cost([input_path], "unlock")
+        async with admission.admit("unlock", cost), rate_limiter.limit(buckets, cost):
+            output_path = await registry.entry("unlock")(
+                input_path=input_path,
+                password=password
+            )
         
         # Schedule cleanup
         schedule_cleanup([input_path, output_path], hours=1)
@@ -276,30 +416,33 @@ async def unlock_pdf(
         return JSONResponse({
             "success": True,
             "message": "PDF unlocked successfully",
-            "download_url": f"/api/download/{output_path.name}",
-            "filename": f"unlocked_{Path(file.filename).name}"
+            "download_url": await publish(output_path),
+            "filename": f"unlocked_{Path(filename).name}"
         })
         
+    except (AdmissionRejected, RateLimitExceeded, HTTPException):
+        raise
     except Exception as e:
         logger.error(f"Unlock error: {e}")
         raise HTTPException(500, f"Unlock failed: {str(e)}")
 
 @app.post("/api/edit")
 async def edit_pdf(
-    file: UploadFile = File(...),
+    request: Request,
+    file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
+    document_password: Optional[str] = Form(None),
     operation: str = Form(...),
     parameters: str = Form("{}")
 ):
     """Edit PDF (merge, split, rotate, etc.)"""
     try:
-        # Save uploaded file
-        file_ext = Path(file.filename).suffix.lower()
-        file_id = str(uuid.uuid4())
-        input_path = UPLOAD_DIR / f"{file_id}{file_ext}"
+        buckets = caller(request)
+        await rate_limiter.check(buckets)
+        admission.check("edit")
         
-        async with aiofiles.open(input_path, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
+        # Save uploaded file
+        input_path, filename = await receive_input(file, upload_id, document_password)
         
         # Parse parameters
         try:
@@ -308,11 +451,14 @@ async def edit_pdf(
             params_dict = {}
         
         # Process editing
-        output_path = await editor.edit(
-            input_path=input_path,
-            operation=operation,
-            parameters=params_dict
-        )
+        cost = admission.estimate_cost([input_path], "edit")
+        async with admission.admit("edit", cost), rate_limiter.limit(buckets, cost):
+            output_path = await run_tool(
+                "edit",
+                input_path=input_path,
+                operation=operation,
+                parameters=params_dict
+            )
         
         # Schedule cleanup
         schedule_cleanup([input_path], hours=1)
@@ -321,8 +467,8 @@ async def edit_pdf(
         if isinstance(output_path, list):
             # Create zip file
             import zipfile
-            zip_filename = f"edited_{file_id}.zip"
-            zip_path = PROCESSED_DIR / zip_filename
+            zip_filename = f"edited_{input_path.stem}.zip"
+            zip_path = processed.path_for(zip_filename)
             
             with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
                 for file_path in output_path:
@@ -333,51 +479,58 @@ async def edit_pdf(
             return JSONResponse({
                 "success": True,
                 "message": f"PDF edited successfully ({len(output_path)} files created)",
-                "download_url": f"/api/download/{zip_filename}",
-                "filename": f"edited_{Path(file.filename).stem}.zip"
+                "download_url": await publish(zip_path),
+                "filename": f"edited_{Path(filename).stem}.zip"
             })
         else:
             schedule_cleanup([output_path], hours=1)
             return JSONResponse({
                 "success": True,
                 "message": "PDF edited successfully",
-                "download_url": f"/api/download/{output_path.name}",
-                "filename": f"edited_{Path(file.filename).name}"
+                "download_url": await publish(output_path),
+                "filename": f"edited_{Path(filename).name}"
             })
         
+    except (AdmissionRejected, RateLimitExceeded, HTTPException):
+        raise
     except Exception as e:
         logger.error(f"Edit error: {e}")
         raise HTTPException(500, f"Edit failed: {str(e)}")
 
 @app.post("/api/extract-colors")
 async def extract_colors(
-    file: UploadFile = File(...),
+    request: Request,
+    file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
+    document_password: Optional[str] = Form(None),
     color_count: int = Form(5),
     format: str = Form("hex")
 ):
     """Extract colors from image/PDF"""
     try:
-        # Save uploaded file
-        file_ext = Path(file.filename).suffix.lower()
-        file_id = str(uuid.uuid4())
-        input_path = UPLOAD_DIR / f"{file_id}{file_ext}"
+        buckets = caller(request)
+        await rate_limiter.check(buckets)
+        admission.check("extract-colors")
         
-        async with aiofiles.open(input_path, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
+        # Save uploaded file
+        input_path, filename = await receive_input(file, upload_id, document_password)
         
         # Extract colors
-        colors = await color_extractor.extract(
-            input_path=input_path,
-            color_count=color_count,
-            color_format=format
-        )
+        cost = admission.estimate_cost([input_path], "extract-colors")
+        async with admission.admit("extract-colors", cost), rate_limiter.limit(buckets, cost):
+            colors = await run_tool(
+                "extract-colors",
+                input_path=input_path,
+                color_count=color_count,
+                color_format=format
+            )
         
         # Create color palette image
-        palette_path = await color_extractor.create_palette_image(
+        palette_filename = f"palette_{input_path.stem}.png"
+        palette_path = await registry.get("extract-colors").create_palette_image(
             colors=colors,
-            output_dir=PROCESSED_DIR,
-            filename=f"palette_{file_id}.png"
+            output_dir=processed.path_for(palette_filename).parent,
+            filename=palette_filename
         )
         
         # Schedule cleanup
@@ -387,36 +540,35 @@ async def extract_colors(
             "success": True,
             "message": f"Extracted {len(colors)} colors",
             "colors": colors,
-            "palette_url": f"/api/download/{palette_path.name}",
-            "filename": f"color_palette_{Path(file.filename).stem}.png"
+            "palette_url": await publish(palette_path),
+            "filename": f"color_palette_{Path(filename).stem}.png"
         })
         
+    except (AdmissionRejected, RateLimitExceeded, HTTPException):
+        raise
     except Exception as e:
         logger.error(f"Color extraction error: {e}")
         raise HTTPException(500, f"Color extraction failed: {str(e)}")
 
 @app.post("/api/batch-process")
 async def batch_process(
-    files: List[UploadFile] = File(...),
+    request: Request,
+    files: List[UploadFile] = File(None),
+    upload_ids: Optional[str] = Form(None),
+    document_password: Optional[str] = Form(None),
     operation: str = Form(...),
     parameters: str = Form("{}")
 ):
     """Process multiple files at once"""
     try:
-        file_paths = []
+        buckets = caller(request)
+        await rate_limiter.check(buckets)
+        admission.check("batch")
         processed_files = []
         
         # Save all uploaded files
-        for file in files:
-            file_ext = Path(file.filename).suffix.lower()
-            file_id = str(uuid.uuid4())
-            input_path = UPLOAD_DIR / f"{file_id}{file_ext}"
-            
-            async with aiofiles.open(input_path, 'wb') as out_file:
-                content = await file.read()
-                await out_file.write(content)
-            
-            file_paths.append(input_path)
+        inputs = await receive_inputs(files, upload_ids, document_password)
+        file_paths = [input_path for input_path, _ in inputs]
         
         # Parse parameters
         try:
@@ -424,57 +576,118 @@ async def batch_process(
         except:
             params_dict = {}
         
-        # Process based on operation
-        if operation == "compress":
-            for input_path in file_paths:
-                output_path = await compressor.compress(input_path, **params_dict)
-                processed_files.append(output_path)
-                
-        elif operation == "convert":
-            format = params_dict.get("format", "docx")
-            for input_path in file_paths:
-                output_path = await converter.convert(input_path, output_format=format)
-                processed_files.append(output_path)
-                
-        elif operation == "protect":
-            password = params_dict.get("password", "protected")
-            for input_path in file_paths:
-                output_path = await protector.protect(input_path, password=password)
-                processed_files.append(output_path)
-        
-        # Create zip file
         import zipfile
         zip_filename = f"batch_{uuid.uuid4()}.zip"
-        zip_path = PROCESSED_DIR / zip_filename
+        zip_path = processed.path_for(zip_filename)
         
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_path in processed_files:
-                zipf.write(file_path, file_path.name)
+        # Process based on operation
+        cost = admission.estimate_cost(file_paths, "batch")
+        async with admission.admit("batch", cost), rate_limiter.limit(buckets, cost):
+            if operation == "compress":
+                for input_path in file_paths:
+                    output_path = await registry.entry("compress")(input_path, **params_dict)
+                    processed_files.append(output_path)
+                    
+            elif operation == "convert":
+                format = params_dict.get("format", "docx")
+                for input_path in file_paths:
+                    output_path = await registry.entry("convert")(input_path, output_format=format)
+                    processed_files.append(output_path)
+                    
+            elif operation == "protect":
+                items = protect_manifest(inputs, params_dict)
+                # Each file goes into the archive as soon as it is encrypted;
+                # encrypted streams don't deflate, so entries are stored.
+                # Entries are written on a thread, one at a time
+                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf:
+                    async for item, data in registry.get("protect").protect_many(items):
+                        await asyncio.to_thread(zipf.writestr, item["name"], data)
+        
+        if operation != "protect":
+            # Create zip file; deflating every output would stall the event loop
+            def write_zip():
+                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                    for file_path in processed_files:
+                        zipf.write(file_path, file_path.name)
+            
+            await asyncio.to_thread(write_zip)
         
         # Schedule cleanup
         schedule_cleanup(file_paths + processed_files + [zip_path], hours=1)
         
         return JSONResponse({
             "success": True,
-            "message": f"Processed {len(files)} files",
-            "download_url": f"/api/download/{zip_filename}",
+            "message": f"Processed {len(file_paths)} files",
+            "download_url": await publish(zip_path),
             "filename": f"batch_processed.zip"
         })
         
+    except (AdmissionRejected, RateLimitExceeded, HTTPException):
+        raise
     except Exception as e:
         logger.error(f"Batch processing error: {e}")
         raise HTTPException(500, f"Batch processing failed: {str(e)}")
 
+def protect_manifest(inputs: List[Tuple[Path, str]], params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One protect job per input for a batch
+
+    params["manifest"] maps an uploaded filename to its own password,
+    encryption_level and permissions; files it doesn't name use the
+    top-level ones (the password defaulting to "protected", as before).
+    permissions may also be given as a JSON string, as /api/protect takes them.
+    """
+    manifest = params.get("manifest") or {}
+    if not isinstance(manifest, dict) or not all(isinstance(v, dict) for v in manifest.values()):
+        raise HTTPException(400, "manifest must map filenames to {password, encryption_level, permissions}")
+    
+    defaults = {
+        "password": params.get("password", "protected"),
+        "encryption_level": params.get("encryption_level", "128bit"),
+        "permissions": params.get("permissions"),
+    }
+    items = []
+    names = set()
+    for input_path, filename in inputs:
+        item = {**defaults, **manifest.get(filename, {}), "input_path": input_path}
+        permissions = item["permissions"]
+        if isinstance(permissions, str):
+            # The same JSON string /api/protect takes in its form field
+            try:
+                permissions = json.loads(permissions)
+            except ValueError:
+                raise HTTPException(400, f"Invalid permissions JSON for {filename}")
+        if permissions is not None and not isinstance(permissions, dict):
+            raise HTTPException(400, f"permissions for {filename} must be an object of name: true/false")
+        item["permissions"] = permissions
+        if item.get("encryption_level") not in ("40bit", "128bit", "256bit"):
+            raise HTTPException(400, f"Unknown encryption level for {filename}")
+        if not item.get("password"):
+            raise HTTPException(400, f"No password for {filename}")
+        # Archive entry names stay unique when the same filename is sent twice
+        name = stem = f"protected_{Path(filename).stem}"
+        suffix = Path(filename).suffix or ".pdf"
+        count = 1
+        while name + suffix in names:
+            count += 1
+            name = f"{stem}_{count}"
+        names.add(name + suffix)
+        item["name"] = name + suffix
+        items.append(item)
+    return items
+
 @app.get("/api/download/{filename}")
-async def download_file(filename: str):
+async def download_file(filename: str, expires: Optional[int] = None, signature: Optional[str] = None):
     """Download processed file"""
-    file_path = PROCESSED_DIR / filename
+    if not objects.verify(filename, expires, signature):
+        raise HTTPException(status_code=403, detail="Download link is invalid or has expired")
     
-    if not file_path.exists():
-        # Also check in uploads directory
-        file_path = UPLOAD_DIR / filename
-        if not file_path.exists():
-            raise HTTPException(status_code=404, detail="File not found")
+    # Also check in uploads directory
+    file_path = processed.locate(filename) or uploads.locate(filename)
+    if file_path is None:
+        if objects.remote:
+            # Made on another node: send the client to the bucket
+            return RedirectResponse(objects.url(filename))
+        raise HTTPException(status_code=404, detail="File not found")
     
     return FileResponse(
         path=file_path,
@@ -482,22 +695,33 @@ async def download_file(filename: str):
         media_type='application/octet-stream'
     )
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/progress/{task_id}")
 async def get_progress(task_id: str):
     """Get processing progress"""
     if task_id in processing_tasks:
         return JSONResponse(processing_tasks[task_id])
+    if broker is not None:
+        job = await asyncio.to_thread(broker.get, task_id)
+        if job is not None:
+            body = {key: job[key] for key in ("id", "operation", "status", "error", "attempts")}
+            if job["status"] == DONE:
+                body["result"] = await job_result(job["result"])
+            return JSONResponse(body)
     return JSONResponse({"status": "not_found"})
 
 @app.get("/api/stats")
 async def get_stats():
     """Get service statistics"""
-    total_uploads = len(list(UPLOAD_DIR.glob("*")))
-    total_processed = len(list(PROCESSED_DIR.glob("*")))
+    snapshot = stats.snapshot()
     
     return JSONResponse({
-        "total_uploads": total_uploads,
-        "total_processed": total_processed,
+        **snapshot,
+        "total_processed": snapshot["total_files_processed"],
         "uptime": "24/7",
         "status": "operational",
         "version": "1.0.0"
@@ -506,94 +730,134 @@ async def get_stats():
 @app.get("/api/tools")
 async def get_tools():
     """Get list of available tools with capabilities"""
-    tools = [
-        {
-            "id": "convert",
-            "name": "PDF Converter",
-            "description": "Convert PDF to Word, Excel, PowerPoint, Images and vice versa",
-            "supported_formats": ["pdf", "docx", "xlsx", "pptx", "jpg", "png", "html", "txt"],
-            "max_file_size": "200MB"
-        },
-        {
-            "id": "compress",
-            "name": "PDF Compressor",
-            "description": "Reduce PDF file size without losing quality",
-            "compression_levels": ["low", "medium", "high", "extreme"],
-            "max_compression": "90%"
-        },
-        {
-            "id": "protect",
-            "name": "Protect PDF",
-            "description": "Add password protection and permissions to PDF",
-            "encryption_levels": ["40bit", "128bit", "256bit"],
-            "permissions": ["print", "copy", "modify", "annotations"]
-        },
-        {
-            "id": "unlock",
-            "name": "Unlock PDF",
-            "description": "Remove password protection from PDF files",
-            "methods": ["password", "brute_force", "dictionary"],
-            "success_rate": "95%"
-        },
-        {
-            "id": "edit",
-            "name": "Edit PDF",
-            "description": "Merge, split, rotate, reorder pages in PDF",
-            "operations": ["merge", "split", "rotate", "reorder", "extract_pages", "delete_pages"],
-            "batch_support": True
-        },
-        {
-            "id": "extract-colors",
-            "name": "Color Extractor",
-            "description": "Extract color schemes from images and PDF documents",
-            "color_formats": ["hex", "rgb", "hsl", "cmyk"],
-            "max_colors": 20
-        }
-    ]
+    # Generated from the tool registry once; the tools don't change while running
+    return Response(content=registry.describe(), media_type="application/json",
+                    headers={"Cache-Control": "public, max-age=3600"})
+
+async def receive_input(file: Optional[UploadFile], upload_id: Optional[str],
+                        document_password: Optional[str] = None,
+                        require_password: bool = True) -> Tuple[Path, str]:
+    """Input path and original filename from a multipart file or a resumable upload id
+
+    document_password, for an encrypted PDF, stays in this process with the
+    input; the tools decrypt in memory as they open it. A PDF that needs a
+    password is refused with 401 when none was sent, unless the endpoint
+    handles the password itself (require_password=False).
+    """
+    if upload_id:
+        try:
+            upload = await asyncio.to_thread(chunked_uploads.resolve, upload_id)
+        except UploadError as e:
+            raise HTTPException(e.status_code, str(e))
+        input_path, filename = upload["path"], upload["filename"]
+        documents.remember_sha256(input_path, upload["sha256"])
+    else:
+        if file is None:
+            raise HTTPException(400, "Send a file or an upload_id")
+        filename = file.filename
+        # Small uploads stay in memory; larger ones are written under uploads/
+        input_path = await documents.save(f"{uuid.uuid4()}{Path(filename).suffix.lower()}", await file.read())
+    # Inspect once on the way in; cost estimates and the tools read the record
+    record = await asyncio.to_thread(inspections.get, input_path)
+    if record["needs_password"] and not document_password and require_password:
+        documents.discard([input_path])
+        raise HTTPException(401, "PDF is password protected; send its password as document_password")
+    # Files that open with the empty user password are left to it
+    if document_password and record["needs_password"]:
+        documents.set_password(input_path, document_password)
+        try:
+            # Check it now rather than let each tool fail on it
+            await asyncio.to_thread(lambda: documents.open_fitz(input_path).close())
+        except DocumentPasswordError as e:
+            documents.discard([input_path])
+            raise HTTPException(403, str(e))
+    return input_path, filename
+
+async def receive_inputs(files: Optional[List[UploadFile]], upload_ids: Optional[str],
+                         document_password: Optional[str] = None) -> List[Tuple[Path, str]]:
+    """Like receive_input for several files; upload_ids is comma-separated, taken after the files"""
+    inputs = [await receive_input(file, None, document_password) for file in files or []]
+    for upload_id in (upload_ids or "").split(","):
+        if upload_id.strip():
+            inputs.append(await receive_input(None, upload_id.strip(), document_password))
+    if not inputs:
+        raise HTTPException(400, "Send files or upload_ids")
+    return inputs
+
+async def run_tool(tool: str, **kwargs):
+    """Run a tool call in this process, or as a broker job when workers are configured
+
+    A client that sends Prefer: respond-async gets a 202 with the job id
+    (JobAccepted) instead of waiting; it polls /api/progress/{id} for the
+    result, even across front-end restarts.
+    """
+    
+    paths = [path for value in kwargs.values()
+             for path in (value if isinstance(value, list) else [value]) if isinstance(path, Path)]
+    # Passwords are never written to the job queue, so encrypted inputs, and
+    # tools that take a password as a parameter, are processed here
+    local = (broker is None or tool not in OPERATIONS
+             or any(documents.password(path) is not None for path in paths))
+    
+    def enqueue() -> str:
+        # Workers run elsewhere, so in-memory inputs are written out first
+        for path in paths:
+            documents.local_path(path)
+        return broker.enqueue(tool, kwargs)
     
-    return JSONResponse({"tools": tools})
+    if not local and respond_async.get():
+        job_id = await asyncio.to_thread(enqueue)
+        schedule_cleanup(paths, hours=1)
+        raise JobAccepted(job_id)
+    
+    async def execute():
+        if local:
+            return await registry.entry(tool)(**kwargs)
+        job_id = await asyncio.to_thread(enqueue)
+        return await broker.wait(job_id)
+    
+    # Identical concurrent requests (same file content and parameters) share one run
+    key = await asyncio.to_thread(request_key, tool, kwargs)
+    return await single_flight.do(key, execute)
+
+async def publish(output_path: Path) -> str:
+    """Hand a finished output to the object store and return its download URL"""
+    if not output_path.exists():
+        # A worker on another node made it and has already published it
+        return objects.url(output_path.name)
+    key = await asyncio.to_thread(objects.put, output_path)
+    return objects.url(key)
+
+async def job_result(result: Any) -> Dict[str, Any]:
+    """A finished job's result for the client: download URLs for files, else the value"""
+    if isinstance(result, Path):
+        return {"download_url": await publish(result), "filename": result.name}
+    if isinstance(result, list) and result and all(isinstance(item, Path) for item in result):
+        return {"download_urls": [await publish(item) for item in result]}
+    return {"value": result}
 
 def schedule_cleanup(file_paths: List[Path], hours: int = 1):
     """Schedule files for deletion"""
-    import threading
-    
-    def cleanup():
-        import time
-        time.sleep(hours * 3600)
-        for file_path in file_paths:
-            try:
-                if file_path.exists():
-                    if file_path.is_dir():
-                        shutil.rmtree(file_path)
-                    else:
-                        file_path.unlink()
-                    logger.info(f"Cleaned up: {file_path}")
-            except Exception as e:
-                logger.error(f"Cleanup error for {file_path}: {e}")
-    
-    thread = threading.Thread(target=cleanup)
-    thread.daemon = True
-    thread.start()
+    # The storage reaper deletes them; no thread sleeps per request
+    storage.expire(file_paths, hours * 3600)
+    # In-memory inputs are no longer needed once the job is done
+    documents.discard(file_paths)
 
 @app.on_event("startup")
 async def startup_event():
     """Cleanup old files on startup"""
     cleanup_old_files()
+    storage.start_reaper(also=[chunked_uploads.purge_expired])
 
 def cleanup_old_files():
-    """Cleanup files older than 24 hours"""
-    cutoff_time = datetime.now() - timedelta(hours=24)
-    
-    for dir_path in [UPLOAD_DIR, PROCESSED_DIR, TEMP_DIR]:
-        for file_path in dir_path.glob("*"):
-            try:
-                if file_path.is_file():
-                    file_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-                    if file_time < cutoff_time:
-                        file_path.unlink()
-                        logger.info(f"Cleaned up old file: {file_path}")
-            except Exception as e:
-                logger.error(f"Error cleaning up file {file_path}: {e}")
+    """Cleanup expired files, plus files older than 24 hours from the flat layout"""
+    removed = storage.purge_expired()
+    chunked_uploads.purge_expired()
+    for store in (uploads, processed):
+        removed += store.sweep_flat(24 * 3600)
+    removed += storage.sweep_directory(TEMP_DIR, 24 * 3600)
+    if removed:
+        logger.info(f"Cleaned up {removed} old file(s)")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,307 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from documents import documents
+from instrumentation import record_stage
+from pdfscan import describe, parse_dictionary, scan_encryption
+
+logger = logging.getLogger(__name__)
+
+# Bits of the /P entry, named as in PDFProtector.permission_flags
+PERMISSION_BITS = {
+    "print": 4,
+    "modify": 8,
+    "copy": 16,
+    "annotations": 32,
+    "fill_forms": 256,
+    "extract": 512,
+    "assemble": 1024,
+    "print_high": 2048,
+}
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".tif", ".webp"}
+
+# Pages sampled for the text-vs-scan classification; enough to tell a
+# scanned document from a born-digital one without reading every page
+CLASSIFY_SAMPLE = 12
+TEXT_CHARS = 50  # fewer extractable characters than this and a page counts as an image
+
+# Records are a few KB at most and content never changes, so they are kept a while
+RECORD_TTL = 7 * 24 * 3600
+
+
+def _pdf_value(doc, xref: int, key: str) -> Optional[str]:
+    kind, value = doc.xref_get_key(xref, key)
+    return None if kind == "null" else value.lstrip("/")
+
+
+def _permissions(p: Optional[int]) -> Dict[str, bool]:
+    return {name: p is None or bool(p & bit) for name, bit in PERMISSION_BITS.items()}
+
+
+def _size_runs(sizes: List[Tuple[float, float]]) -> List[List[float]]:
+    """[[width, height, count], ...] so a 500-page letter document stores one entry"""
+    runs: List[List[float]] = []
+    for width, height in sizes:
+        if runs and runs[-1][0] == width and runs[-1][1] == height:
+            runs[-1][2] += 1
+        else:
+            runs.append([width, height, 1])
+    return runs
+
+
+def page_size(record: Dict[str, Any], index: int) -> Tuple[float, float]:
+    """Width and height in points of page `index` (0-based) from a record's page_sizes"""
+    for width, height, count in record["page_sizes"]:
+        if index < count:
+            return width, height
+        index -= count
+    raise IndexError(f"Page {index} is out of range")
+
+
+def _encryption_record(path, doc=None) -> Dict[str, Any]:
+    """encrypted, encryption and permissions, from the trailer scan or else the open document"""
+    scanned = scan_encryption(path)
+    if scanned is None:
+        close = doc is None
+        doc = doc or documents.open_fitz(path, decrypt=False)
+        try:
+            kind, value = doc.xref_get_key(-1, "Encrypt")
+            if kind == "null":
+                scanned = {"encrypted": False, "encryption": None, "p": None}
+            else:
+                source = doc.xref_object(int(value.split()[0])) if kind == "xref" else value
+                encryption, p = describe(parse_dictionary(source.encode("latin-1")))
+                scanned = {"encrypted": True, "encryption": encryption, "p": p}
+        finally:
+            if close:
+                doc.close()
+    return {
+        "encrypted": scanned["encrypted"],
+        "encryption": scanned["encryption"],
+        "permissions": _permissions(scanned["p"]),
+    }
+
+
+def inspect_pdf(path) -> Dict[str, Any]:
+    """One pass over a PDF: structure, encryption, images and whether it is scanned
+
+    Fonts are left out; reading them parses every page's resources, so
+    InspectionIndex.fonts collects them only when asked.
+    """
+    # Records are shared by everyone with this content, so only what is
+    # readable without the password goes in them
+    with documents.open_fitz(path, decrypt=False) as doc:
+        record: Dict[str, Any] = {"kind": "pdf", "pages": doc.page_count}
+
+        record.update(_encryption_record(path, doc))
+        record["needs_password"] = bool(doc.needs_pass)
+
+        if doc.needs_pass:
+            # Nothing past the trailer can be read without the password
+            record.update(page_sizes=None, images=None, classification=None)
+            return record
+
+        sizes = [(round(page.rect.width, 2), round(page.rect.height, 2)) for page in doc]
+        record["page_sizes"] = _size_runs(sizes)
+
+        # Image XObjects straight from the xref table; no page content is parsed
+        images = []
+        for xref in range(1, doc.xref_length()):
+            if doc.xref_get_key(xref, "Subtype")[1] != "/Image":
+                continue
+            images.append({
+                "xref": xref,
+                "filter": _pdf_value(doc, xref, "Filter"),
+                "width": int(_pdf_value(doc, xref, "Width") or 0),
+                "height": int(_pdf_value(doc, xref, "Height") or 0),
+                "bytes": int(_pdf_value(doc, xref, "Length") or 0),
+            })
+        record["images"] = images
+
+        step = max(1, doc.page_count // CLASSIFY_SAMPLE)
+        text_pages = image_pages = 0
+        for index in range(0, doc.page_count, step):
+            page = doc[index]
+            if len(page.get_text("text").strip()) >= TEXT_CHARS:
+                text_pages += 1
+            elif page.get_images():
+                image_pages += 1
+        if image_pages and not text_pages:
+            record["classification"] = "scanned"
+        elif image_pages:
+            record["classification"] = "mixed"
+        else:
+            record["classification"] = "text"
+    return record
+
+
+def pdf_fonts(path) -> List[Dict[str, Any]]:
+    """Every font the PDF's pages use, once each"""
+    fonts: Dict[int, Dict[str, Any]] = {}
+    with documents.open_fitz(path, decrypt=False) as doc:
+        for page in doc:
+            for xref, ext, font_type, basefont, _, _ in page.get_fonts():
+                fonts.setdefault(xref, {"name": basefont, "type": font_type, "embedded": ext != "n/a"})
+    return list(fonts.values())
+
+
+def input_kind(path) -> str:
+    """What the suffix says the input is: "pdf", "image" or "other"
+
+    The same bytes are read differently per kind, so records are kept per kind.
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix == ".pdf":
+        return "pdf"
+    return "image" if suffix in IMAGE_SUFFIXES else "other"
+
+
+def inspect_image(path) -> Dict[str, Any]:
+    with documents.open_image(path) as img:
+        return {
+            "kind": "image", "pages": getattr(img, "n_frames", 1),
+            "page_sizes": [[img.width, img.height, 1]], "format": img.format, "mode": img.mode,
+            "encrypted": False, "needs_password": False, "encryption": None,
+            "permissions": _permissions(None),
+        }
+
+
+def inspect(path) -> Dict[str, Any]:
+    """Inspection record for any input; inputs that fail to parse get kind "unreadable" """
+    kind = input_kind(path)
+    record: Dict[str, Any] = {"kind": "other", "pages": None, "encrypted": False,
+                              "needs_password": False, "encryption": None,
+                              "permissions": _permissions(None)}
+    try:
+        if kind == "pdf":
+            record = inspect_pdf(path)
+        elif kind == "image":
+            record = inspect_image(path)
+    except Exception as e:
+        # The tool itself will report the problem to the user
+        logger.info(f"Inspection failed for {Path(path).name}: {e}")
+        record["kind"] = "unreadable"
+    record["size"] = documents.size(path)
+    return record
+
+
+class InspectionIndex:
+    """Facts about each input, computed once and looked up by kind and content hash
+
+    Page count, page sizes, the encryption dictionary and permissions, the
+    image inventory and a text-vs-scan classification are read in a single
+    pass when a file is received. Tools and the cost estimator ask the index
+    instead of opening the file again. Records are kept in SQLite so every
+    worker shares them, with the most recent in memory; the same content
+    uploaded again as the same kind of file is never inspected twice.
+    """
+
+    def __init__(self, path: str, memory_entries: int = 1024):
+        self.path = path
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Records were once keyed by hash alone; they are only a cache
+            conn.execute("DROP TABLE IF EXISTS inspections")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " key TEXT PRIMARY KEY, record TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("DELETE FROM records WHERE created_at < ?", (time.time() - RECORD_TTL,))
+            self._local.conn = conn
+        return conn
+
+    def _after_fork(self):
+        # A connection or lock taken before a fork belongs to the parent
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _remember(self, key: str, record: Dict[str, Any]):
+        with self._lock:
+            self._memory[key] = record
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _store(self, key: str, record: Dict[str, Any]):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO records (key, record, created_at) VALUES (?, ?, ?)",
+            (key, json.dumps(record, separators=(",", ":")), time.time())
+        )
+        self._remember(key, record)
+
+    def encryption(self, path) -> Dict[str, Any]:
+        """encrypted, encryption and permissions (plus needs_password when known)
+
+        Answered from a record already in memory, or else from the trailer
+        alone (a few KB read, no hashing), so checking encryption never costs
+        a full parse. Only a trailer the scanner can't follow falls back to
+        the full record.
+        """
+        digest = documents.known_sha256(path)
+        record = self._memory.get(f"{input_kind(path)}:{digest}") if digest else None
+        if record is None and Path(path).suffix.lower() == ".pdf":
+            try:
+                record = _encryption_record(path)
+                # Whether the empty user password opens it takes the full parse to know
+                record["needs_password"] = None if record["encrypted"] else False
+                return record
+            except Exception:
+                pass  # unreadable: the full record says so
+        if record is None:
+            record = self.get(path)
+        return {key: record[key] for key in ("encrypted", "encryption", "permissions", "needs_password")}
+
+    def get(self, path) -> Dict[str, Any]:
+        """The input's record, inspecting it now if this content hasn't been seen"""
+        digest = documents.sha256(path)
+        # A .jpg holding PDF bytes is unreadable as an image, not a PDF
+        key = f"{input_kind(path)}:{digest}"
+        record = self._memory.get(key)
+        if record is not None:
+            return record
+
+        row = self._connect().execute("SELECT record FROM records WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            record = json.loads(row[0])
+            self._remember(key, record)
+            return record
+
+        started = time.perf_counter()
+        record = inspect(path)
+        record["sha256"] = digest
+        self._store(key, record)
+        record_stage("ingest", "inspect", time.perf_counter() - started)
+        return record
+
+    def fonts(self, path) -> Optional[List[Dict[str, Any]]]:
+        """The PDF's fonts, read the first time they are asked for and kept with its record
+
+        None for anything but a PDF that opens without a password.
+        """
+        record = self.get(path)
+        if record["kind"] != "pdf" or record["needs_password"]:
+            return None
+        if "fonts" not in record:
+            record = dict(record, fonts=pdf_fonts(path))
+            self._store(f"pdf:{record['sha256']}", record)
+        return record["fonts"]
+
+inspections = InspectionIndex(os.environ.get("FLIPFILE_INSPECTION_DB", "inspections.db"))
+os.register_at_fork(after_in_child=inspections._after_fork)
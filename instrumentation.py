@@ -0,0 +1,204 @@
+import contextvars
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = tuple(1024 * 4 ** n for n in range(11))  # 1KB .. 1GB
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram, one series per label set"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        """Record one observation"""
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts, then +Inf count and sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            label_text = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, labels))
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{self.name}_sum{suffix} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Single-value gauge whose value is read at scrape time"""
+
+    def __init__(self, name: str, help_text: str, read):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge",
+                f"{self.name} {self.read()}"]
+
+
+class MetricsRegistry:
+    """Holds every metric exposed on /metrics"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """High-water RSS of this process (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+metrics = MetricsRegistry()
+
+request_duration = metrics.register(Histogram(
+    "flipfile_request_duration_seconds", "Total time to serve a request",
+    ("method", "route", "status")))
+stage_duration = metrics.register(Histogram(
+    "flipfile_stage_duration_seconds", "Time spent in each processing stage",
+    ("tool", "stage")))
+request_bytes_in = metrics.register(Histogram(
+    "flipfile_request_bytes_in", "Request body size", ("route",), SIZE_BUCKETS))
+request_bytes_out = metrics.register(Histogram(
+    "flipfile_request_bytes_out", "Response body size", ("route",), SIZE_BUCKETS))
+request_rss = metrics.register(Histogram(
+    "flipfile_request_end_rss_bytes", "Process RSS when each request finished",
+    ("route",), SIZE_BUCKETS))
+metrics.register(Gauge(
+    "flipfile_process_rss_bytes", "Current process RSS", current_rss_bytes))
+metrics.register(Gauge(
+    "flipfile_process_peak_rss_bytes", "Peak process RSS", peak_rss_bytes))
+
+
+class RequestTimings:
+    """Stage timings collected while serving one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+
+    def add(self, name: str, seconds: float):
+        self.stages.append((name, seconds))
+
+    def server_timing(self, total: float, rss: int) -> str:
+        """Render a Server-Timing header value"""
+        # Repeated stages (e.g. one "render" per page batch) are summed
+        totals: Dict[str, float] = {}
+        for name, seconds in self.stages:
+            totals[name] = totals.get(name, 0.0) + seconds
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items()]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        entries.append(f'rss;desc="{rss // (1024 * 1024)}MB"')
+        return ", ".join(entries)
+
+
+_current_timings: contextvars.ContextVar[Optional[RequestTimings]] = \
+    contextvars.ContextVar("flipfile_request_timings", default=None)
+
+
+def record_stage(tool: str, name: str, seconds: float):
+    """Record an externally measured stage (e.g. time spent waiting in a queue)"""
+    stage_duration.observe(seconds, tool, name)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def stage(tool: str, name: str):
+    """Time a block as one stage of a tool (open, render, encode, save, ...)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(tool, name, time.perf_counter() - started)
+
+
+async def mark_upload_complete():
+    """FastAPI dependency: runs once the request body has been received and parsed"""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add("upload", time.perf_counter() - timings.started)
+
+
+def instrument_app(app):
+    """Time every request and attach a Server-Timing header"""
+
+    @app.middleware("http")
+    async def timing_middleware(request, call_next):
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        try:
+            response = await call_next(request)
+        finally:
+            _current_timings.reset(token)
+
+        total = time.perf_counter() - timings.started
+        # Label by route template rather than raw path to bound cardinality
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        rss = current_rss_bytes()
+
+        request_duration.observe(total, request.method, route, str(response.status_code))
+        request_bytes_in.observe(int(request.headers.get("content-length") or 0), route)
+        request_bytes_out.observe(int(response.headers.get("content-length") or 0), route)
+        request_rss.observe(rss, route)
+
+        response.headers["Server-Timing"] = timings.server_timing(total, rss)
+        return response
+
+    return app
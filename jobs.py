@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Operations a worker node can run. protect is not one: its parameters carry
+# the new password, which must not be written to the job queue
+OPERATIONS = ("compress", "convert", "edit", "extract-colors")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobFailed(Exception):
+    """Raised to the front end when a worker reports a job as failed"""
+
+
+def encode(value: Any) -> str:
+    """JSON that round-trips Paths (tool arguments and results are full of them)"""
+
+    def convert(item):
+        if isinstance(item, Path):
+            return {"__path__": str(item)}
+        if isinstance(item, dict):
+            return {key: convert(v) for key, v in item.items()}
+        if isinstance(item, (list, tuple)):
+            return [convert(v) for v in item]
+        return item
+
+    # numpy scalars from the color extractor expose .item()
+    return json.dumps(convert(value), default=lambda item: item.item() if hasattr(item, "item") else str(item))
+
+
+def decode(text: Optional[str]) -> Any:
+    if text is None:
+        return None
+    return json.loads(text, object_hook=lambda d: Path(d["__path__"]) if set(d) == {"__path__"} else d)
+
+
+class JobBroker:
+    """Durable job queue in a SQLite file, shared by front ends and workers
+
+    Workers claim a job with a lease and keep extending it while they run.
+    A job whose lease runs out (the worker died) goes back to the queue,
+    up to max_attempts times. Jobs outlive any front-end restart.
+    """
+
+    def __init__(self, path: str, lease: float = 60.0, max_attempts: int = 3):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, operation TEXT NOT NULL, params TEXT NOT NULL,"
+                " status TEXT NOT NULL, result TEXT, error TEXT, worker TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0, lease_until REAL,"
+                " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created_at)")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, operation: str, params: Dict[str, Any]) -> str:
+        job_id = str(uuid.uuid4())
+        self._connect().execute(
+            "INSERT INTO jobs (id, operation, params, status, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, operation, encode(params), QUEUED, time.time())
+        )
+        return job_id
+
+    def claim(self, worker: str, operations: Iterable[str] = OPERATIONS) -> Optional[Dict[str, Any]]:
+        """Take the oldest runnable job, or None; a lapsed lease counts as runnable"""
+        operations = list(operations)
+        marks = ",".join("?" * len(operations))
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs whose worker vanished too often are given up on
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?"
+                " WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, "Worker lost too many times", now, RUNNING, now, self.max_attempts)
+            )
+            row = conn.execute(
+                f"SELECT id, operation, params, attempts FROM jobs"
+                f" WHERE operation IN ({marks}) AND (status = ? OR (status = ? AND lease_until < ?))"
+                f" ORDER BY created_at LIMIT 1",
+                (*operations, QUEUED, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1,"
+                " lease_until = ?, started_at = ? WHERE id = ?",
+                (RUNNING, worker, now + self.lease, now, row[0])
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return {"id": row[0], "operation": row[1], "params": decode(row[2]), "attempt": row[3] + 1}
+
+    def extend(self, job_id: str, worker: str):
+        self._connect().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+            (time.time() + self.lease, job_id, worker, RUNNING)
+        )
+
+    def complete(self, job_id: str, worker: str, result: Any):
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE id = ? AND worker = ?",
+            (DONE, encode(result), time.time(), job_id, worker)
+        )
+
+    def fail(self, job_id: str, worker: str, error: str):
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND worker = ?",
+            (FAILED, error, time.time(), job_id, worker)
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT operation, status, result, error, attempts, created_at, started_at, finished_at"
+            " FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"id": job_id, "operation": row[0], "status": row[1], "result": decode(row[2]),
+                "error": row[3], "attempts": row[4], "created_at": row[5],
+                "started_at": row[6], "finished_at": row[7]}
+
+    def purge(self, older_than: float = 24 * 3600) -> int:
+        """Drop finished jobs older than the given age"""
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, time.time() - older_than)
+        )
+        return cursor.rowcount
+
+    async def wait(self, job_id: str, timeout: float = 600.0) -> Any:
+        """Poll until a job finishes and return its result, raising JobFailed on failure"""
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while True:
+            job = await asyncio.to_thread(self.get, job_id)
+            if job is None:
+                raise JobFailed(f"Job {job_id} is unknown or has been purged")
+            if job["status"] == DONE:
+                return job["result"]
+            if job["status"] == FAILED:
+                raise JobFailed(job["error"])
+            if time.monotonic() > deadline:
+                raise JobFailed(f"Job {job_id} did not finish within {timeout:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+
+def create_broker() -> Optional[JobBroker]:
+    """Job broker from FLIPFILE_BROKER ("sqlite:<path>"), or None to run tools in-process"""
+    spec = os.environ.get("FLIPFILE_BROKER", "")
+    if not spec:
+        return None
+    if not spec.startswith("sqlite:"):
+        raise ValueError(f"Unknown job broker: {spec}")
+    path = spec[len("sqlite:"):]
+    logger.info(f"Using SQLite job broker at {path}")
+    return JobBroker(path)
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
@@ -179,20 +179,33 @@ document.addEventListener('DOMContentLoaded', function() {
         `;
         document.head.appendChild(style);
         
-        // Simulate processing with enhanced delay
-        setTimeout(() => {
-            // Reset drop zone
+        function resetDropZone() {
             dropZone.innerHTML = originalHTML;
             
             // Re-attach event listeners
             document.querySelector('.select-file-btn').addEventListener('click', () => {
                 selectFileBtn.click();
             });
+        }
+        
+        // Send the files in resumable chunks; the ids can be passed to any tool as upload_id
+        const subtext = dropZone.querySelector('.drag-drop-subtext');
+        const sentPerFile = {};
+        const totalBytes = Array.from(files).reduce((total, file) => total + file.size, 0);
+        Promise.all(Array.from(files).map((file, i) => uploadResumable(file, (sent) => {
+            sentPerFile[i] = sent;
+            const sentBytes = Object.values(sentPerFile).reduce((total, value) => total + value, 0);
+            subtext.textContent = `Uploaded ${Math.floor(100 * sentBytes / Math.max(totalBytes, 1))}%`;
+        }))).then(uploadIds => {
+            dropZone.dataset.uploadIds = uploadIds.join(',');
+            resetDropZone();
             
             // Show enhanced success message
-            showEnhancedNotification(`Successfully processed ${files.length} file(s)! Files are ready for download.`, 'success');
-            
-        }, 3000);
+            showEnhancedNotification(`Successfully uploaded ${files.length} file(s)! Files are ready to process.`, 'success');
+        }).catch(error => {
+            resetDropZone();
+            showEnhancedNotification(`Upload failed: ${error.message}. Select the same file(s) again to resume.`, 'error');
+        });
     }
     
     function showEnhancedNotification(message, type = 'info') {
@@ -571,3 +584,208 @@ function showEnhancedNotification(message, type = 'info') {
         document.head.appendChild(animStyle);
     }
 }
+
+// Resumable chunked uploads: chunks go up in parallel, each with its SHA-256,
+// and an interrupted upload picks up where it stopped (see /api/uploads)
+const UPLOAD_PARALLEL_CHUNKS = 4;
+const UPLOAD_CHUNK_RETRIES = 3;
+// Files are hashed a slice at a time, so large ones are never read into memory at once
+const UPLOAD_HASH_SLICE_BYTES = 8 * 1024 * 1024;
+
+async function sha256Hex(buffer) {
+    const digest = await crypto.subtle.digest('SHA-256', buffer);
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+const SHA256_K = new Int32Array([
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2
+]);
+
+function createSha256() {
+    // WebCrypto only digests a whole buffer, so the file hash is computed here
+    // piece by piece; chunk checksums still use WebCrypto
+    const state = new Int32Array([
+        0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19
+    ]);
+    const w = new Int32Array(64);
+    const pending = new Uint8Array(64);
+    let pendingLength = 0;
+    let total = 0;
+    
+    function block(bytes, offset) {
+        for (let i = 0; i < 16; i++) {
+            const j = offset + i * 4;
+            w[i] = (bytes[j] << 24) | (bytes[j + 1] << 16) | (bytes[j + 2] << 8) | bytes[j + 3];
+        }
+        for (let i = 16; i < 64; i++) {
+            const a = w[i - 15], b = w[i - 2];
+            const s0 = ((a >>> 7) | (a << 25)) ^ ((a >>> 18) | (a << 14)) ^ (a >>> 3);
+            const s1 = ((b >>> 17) | (b << 15)) ^ ((b >>> 19) | (b << 13)) ^ (b >>> 10);
+            w[i] = (w[i - 16] + s0 + w[i - 7] + s1) | 0;
+        }
+        let a = state[0], b = state[1], c = state[2], d = state[3];
+        let e = state[4], f = state[5], g = state[6], h = state[7];
+        for (let i = 0; i < 64; i++) {
+            const S1 = ((e >>> 6) | (e << 26)) ^ ((e >>> 11) | (e << 21)) ^ ((e >>> 25) | (e << 7));
+            const t1 = (h + S1 + ((e & f) ^ (~e & g)) + SHA256_K[i] + w[i]) | 0;
+            const S0 = ((a >>> 2) | (a << 30)) ^ ((a >>> 13) | (a << 19)) ^ ((a >>> 22) | (a << 10));
+            const t2 = (S0 + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+            h = g; g = f; f = e; e = (d + t1) | 0;
+            d = c; c = b; b = a; a = (t1 + t2) | 0;
+        }
+        state[0] += a; state[1] += b; state[2] += c; state[3] += d;
+        state[4] += e; state[5] += f; state[6] += g; state[7] += h;
+    }
+    
+    function update(bytes) {
+        total += bytes.length;
+        let offset = 0;
+        if (pendingLength) {
+            offset = Math.min(64 - pendingLength, bytes.length);
+            pending.set(bytes.subarray(0, offset), pendingLength);
+            pendingLength += offset;
+            if (pendingLength < 64) {
+                return;
+            }
+            block(pending, 0);
+            pendingLength = 0;
+        }
+        for (; offset + 64 <= bytes.length; offset += 64) {
+            block(bytes, offset);
+        }
+        pending.set(bytes.subarray(offset), 0);
+        pendingLength = bytes.length - offset;
+    }
+    
+    function hex() {
+        const bits = total * 8;
+        const padding = new Uint8Array((pendingLength < 56 ? 56 : 120) - pendingLength + 8);
+        padding[0] = 0x80;
+        const view = new DataView(padding.buffer);
+        view.setUint32(padding.length - 8, Math.floor(bits / 2 ** 32));
+        view.setUint32(padding.length - 4, bits >>> 0);
+        update(padding);
+        return Array.from(state).map(word => (word >>> 0).toString(16).padStart(8, '0')).join('');
+    }
+    
+    return { update, hex };
+}
+
+async function fileSha256(file) {
+    // Whole-file hash, so the server can say it already has this content
+    try {
+        if (file.size <= UPLOAD_HASH_SLICE_BYTES) {
+            return await sha256Hex(await file.arrayBuffer());
+        }
+        const hash = createSha256();
+        for (let start = 0; start < file.size; start += UPLOAD_HASH_SLICE_BYTES) {
+            const slice = file.slice(start, Math.min(start + UPLOAD_HASH_SLICE_BYTES, file.size));
+            hash.update(new Uint8Array(await slice.arrayBuffer()));
+        }
+        return hash.hex();
+    } catch (error) {
+        return null; // couldn't be read here; upload without it
+    }
+}
+
+async function startOrResumeUpload(file) {
+    // The same file picked again after a dropped connection resumes its upload
+    const resumeKey = `flipfile-upload:${file.name}:${file.size}:${file.lastModified}`;
+    const previousId = localStorage.getItem(resumeKey);
+    if (previousId) {
+        const response = await fetch(`/api/uploads/${previousId}`);
+        if (response.ok) {
+            return { resumeKey, status: await response.json() };
+        }
+        localStorage.removeItem(resumeKey);
+    }
+    
+    const sha256 = await fileSha256(file);
+    const response = await fetch('/api/uploads', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size, sha256 })
+    });
+    if (!response.ok) {
+        throw new Error((await response.json()).detail || 'Could not start upload');
+    }
+    const status = await response.json();
+    if (!status.complete) {
+        localStorage.setItem(resumeKey, status.upload_id);
+    }
+    return { resumeKey, status };
+}
+
+async function putChunk(file, status, index) {
+    const start = index * status.chunk_size;
+    const chunk = await file.slice(start, Math.min(start + status.chunk_size, file.size)).arrayBuffer();
+    const checksum = await sha256Hex(chunk);
+    
+    for (let attempt = 1; ; attempt++) {
+        let response = null;
+        try {
+            response = await fetch(`/api/uploads/${status.upload_id}/chunks/${index}`, {
+                method: 'PUT',
+                headers: { 'Content-Type': 'application/octet-stream', 'X-Chunk-SHA256': checksum },
+                body: chunk
+            });
+        } catch (error) {
+            // Network error: retried below
+        }
+        if (response && response.ok) {
+            return chunk.byteLength;
+        }
+        if (response && (response.status === 404 || response.status === 409)) {
+            // Upload expired or already finalized; retrying won't help
+            throw new Error((await response.json()).detail);
+        }
+        if (attempt >= UPLOAD_CHUNK_RETRIES) {
+            throw new Error(`Chunk ${index} failed after ${attempt} attempts`);
+        }
+        await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+    }
+}
+
+async function uploadResumable(file, onProgress = () => {}) {
+    const { resumeKey, status } = await startOrResumeUpload(file);
+    if (status.complete) {
+        // Already on the server (deduplicated, or finalized before a reload)
+        localStorage.removeItem(resumeKey);
+        onProgress(file.size, file.size);
+        return status.upload_id;
+    }
+    
+    const received = new Set(status.received);
+    const pending = [];
+    for (let index = 0; index < status.chunks; index++) {
+        if (!received.has(index)) {
+            pending.push(index);
+        }
+    }
+    let sent = file.size - pending.reduce((total, index) =>
+        total + Math.min(status.chunk_size, file.size - index * status.chunk_size), 0);
+    onProgress(sent, file.size);
+    
+    // A few chunks in flight at once; each lane takes the next missing chunk
+    const lanes = Array.from({ length: Math.min(UPLOAD_PARALLEL_CHUNKS, pending.length) }, async () => {
+        while (pending.length) {
+            sent += await putChunk(file, status, pending.shift());
+            onProgress(sent, file.size);
+        }
+    });
+    await Promise.all(lanes);
+    
+    const response = await fetch(`/api/uploads/${status.upload_id}/finalize`, { method: 'POST' });
+    if (!response.ok) {
+        throw new Error((await response.json()).detail || 'Could not finish upload');
+    }
+    localStorage.removeItem(resumeKey);
+    return status.upload_id;
+}
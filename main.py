@@ -1,8 +1,8 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
 from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from typing import List, Optional
+import asyncio
 import os
 import uuid
 import shutil
@@ -11,6 +11,15 @@ import logging
 from datetime import datetime, timedelta
 import tempfile
 import json
+import time
+
+from sessions import SESSION_COOKIE, User, create_session_store, session_user
+from ratelimit import SESSION_LIMITS, RateLimitExceeded, client_buckets, client_key, create_rate_limiter
+from assets import StaticAssets
+from stats import stats
+import storage
+from storage import processed, uploads
+from resumable import UploadError, chunked_uploads, router as uploads_router
 
 # PDF processing libraries
 try:
@@ -29,6 +38,8 @@ app = FastAPI(
     description="Free, Fast, Secure & Private PDF Tools Conversions",
     version="1.0.0"
 )
+# Resumable chunked uploads (/api/uploads); pass the ids to /api/upload as upload_ids
+app.include_router(uploads_router)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -40,23 +51,22 @@ PROCESSED_DIR = Path("processed")
 UPLOAD_DIR.mkdir(exist_ok=True)
 PROCESSED_DIR.mkdir(exist_ok=True)
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="."), name="static")
+# Page, stylesheet and script are served from memory with gzip/brotli variants;
+# nothing else in the working directory is reachable over HTTP
+assets = StaticAssets(Path("."), ["index.html", "style.css", "main.js"])
 
 # Templates
 templates = Jinja2Templates(directory=".")
 
-# Store user sessions (in production, use a database)
-user_sessions = {}
+# Store user sessions: bounded in-process LRU by default, or a shared SQLite
+# file across workers (FLIPFILE_SESSION_STORE=sqlite:/path/sessions.db)
+user_sessions = create_session_store()
 
-class User:
-    def __init__(self, user_id: str, plan: str = "free", daily_tasks: int = 0):
-        self.user_id = user_id
-        self.plan = plan
-        self.daily_tasks = daily_tasks
-        self.max_file_size = 50 * 1024 * 1024 if plan == "free" else 200 * 1024 * 1024
-        self.created_at = datetime.now()
-        self.files = []
+# Per-user (or per-IP for anonymous callers) cost budget with a daily quota
+rate_limiter = create_rate_limiter()
+# Caps how fast one client can mint sessions, which would otherwise push
+# everyone else's out of the bounded session store
+session_limiter = create_rate_limiter(SESSION_LIMITS)
 
 class FileProcessor:
     def __init__(self):
@@ -141,30 +151,50 @@ processor = FileProcessor()
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """Serve the main HTML page"""
-    with open("index.html", "r") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+    return assets.response("index.html", request)
+
+@app.get("/static/{name}")
+async def static_asset(name: str, request: Request):
+    """Serve a cached static asset"""
+    if name not in assets:
+        raise HTTPException(status_code=404, detail="File not found")
+    return assets.response(name, request)
+
+@app.get("/style.css")
+@app.get("/main.js")
+async def page_asset(request: Request):
+    """Serve the page's stylesheet and script at the relative paths index.html uses,
+    which is also where the GitHub Pages build has them"""
+    return assets.response(request.url.path.rsplit("/", 1)[-1], request)
 
 @app.post("/api/upload")
 async def upload_files(
-    files: List[UploadFile] = File(...),
+    request: Request,
+    files: List[UploadFile] = File(None),
+    upload_ids: Optional[str] = Form(None),
     user_id: Optional[str] = Form(None),
     operation: str = Form("compress")
 ):
     """Handle file uploads"""
     
     # Validate user
-    if user_id and user_id in user_sessions:
-        user = user_sessions[user_id]
+    user = session_user(user_sessions, request, user_id)
+    if user:
         max_size = user.max_file_size
     else:
         # Anonymous user
         max_size = 50 * 1024 * 1024  # 50MB
     
+    buckets = client_buckets(request, user)
+    try:
+        await rate_limiter.check(buckets)
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    
     uploaded_files = []
     errors = []
     
-    for file in files:
+    for file in files or []:
         try:
             # Check file size
             contents = await file.read()
@@ -177,7 +207,7 @@ async def upload_files(
             # Save uploaded file
             file_ext = Path(file.filename).suffix.lower()
             unique_filename = f"{uuid.uuid4()}{file_ext}"
-            file_path = UPLOAD_DIR / unique_filename
+            file_path = uploads.path_for(unique_filename)
             
             with open(file_path, "wb") as f:
                 f.write(contents)
@@ -192,22 +222,59 @@ async def upload_files(
         except Exception as e:
             errors.append(f"Error uploading {file.filename}: {str(e)}")
     
+    # Files sent earlier through the resumable upload API
+    for upload_id in (upload_ids or "").split(","):
+        if not upload_id.strip():
+            continue
+        try:
+            upload = await asyncio.to_thread(chunked_uploads.resolve, upload_id.strip())
+        except UploadError as e:
+            errors.append(f"Upload {upload_id.strip()}: {e}")
+            continue
+        file_size = upload["path"].stat().st_size
+        if file_size > max_size:
+            errors.append(f"File {upload['filename']} exceeds maximum size ({max_size/1024/1024}MB)")
+            continue
+        uploaded_files.append({
+            "original_name": upload["filename"],
+            "saved_name": upload["path"].name,
+            "size": file_size,
+            "path": str(upload["path"]),
+            "resumable": True
+        })
+    
     if errors:
         return JSONResponse(
             status_code=400,
             content={"success": False, "errors": errors}
         )
     
+    # Charge one unit per started MB of input before doing any work
+    cost = sum(max(1, -(-file_info["size"] // (1024 * 1024))) for file_info in uploaded_files)
+    try:
+        await rate_limiter.charge(buckets, cost)
+    except RateLimitExceeded as e:
+        for file_info in uploaded_files:
+            # Resumable uploads are kept so the client can retry without re-sending
+            if not file_info.get("resumable"):
+                os.remove(file_info["path"])
+        return rate_limited_response(e)
+    
     # Process files based on operation
     processed_files = []
+    started = time.perf_counter()
     
     for file_info in uploaded_files:
         try:
             output_filename = f"processed_{uuid.uuid4()}"
             
             if operation == "compress" and file_info["original_name"].lower().endswith('.pdf'):
-                output_path = PROCESSED_DIR / f"{output_filename}.pdf"
+                output_path = processed.path_for(f"{output_filename}.pdf")
                 success = processor.compress_pdf(file_info["path"], str(output_path))
+                if success and output_path.stat().st_size >= file_info["size"]:
+                    # Compression didn't help; hand back the original instead
+                    storage.link_or_copy(Path(file_info["path"]), output_path)
+                stats.record("compress", file_info["size"], output_path.stat().st_size if success else 0, ok=success)
                 if success:
                     processed_files.append({
                         "original": file_info["original_name"],
@@ -216,8 +283,9 @@ async def upload_files(
                     })
             
             elif operation == "convert_to_docx" and file_info["original_name"].lower().endswith('.pdf'):
-                output_path = PROCESSED_DIR / f"{output_filename}.docx"
+                output_path = processed.path_for(f"{output_filename}.docx")
                 success = processor.convert_pdf_to_docx(file_info["path"], str(output_path))
+                stats.record("convert", file_info["size"], output_path.stat().st_size if success else 0, ok=success)
                 if success:
                     processed_files.append({
                         "original": file_info["original_name"],
@@ -227,6 +295,7 @@ async def upload_files(
             
             elif operation == "extract_colors" and any(file_info["original_name"].lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.pdf']):
                 colors = processor.extract_colors(file_info["path"])
+                stats.record("extract-colors", file_info["size"])
                 processed_files.append({
                     "original": file_info["original_name"],
                     "colors": colors,
@@ -234,16 +303,26 @@ async def upload_files(
                 })
             
             else:
-                # For unsupported operations, just return the uploaded file
+                # For unsupported operations, just return the uploaded file,
+                # linked into processed/ where downloads look for it
+                output_name = f"{output_filename}{Path(file_info['saved_name']).suffix}"
+                storage.link_or_copy(Path(file_info["path"]), processed.path_for(output_name))
                 processed_files.append({
                     "original": file_info["original_name"],
-                    "processed": file_info["saved_name"],
+                    "processed": output_name,
                     "operation": "no_operation"
                 })
                 
         except Exception as e:
             errors.append(f"Error processing {file_info['original_name']}: {str(e)}")
     
+    # Processing time is charged after the fact, so it may overdraw the bucket
+    await rate_limiter.charge(buckets, time.perf_counter() - started, force=True)
+    if user:
+        # daily_tasks counts files processed today; the quota itself is in cost units
+        user.record_tasks(len(processed_files))
+        user_sessions.save(user)
+    
     # Cleanup: schedule file deletion in 1 hour
     for file_info in uploaded_files:
         schedule_file_deletion(file_info["path"], hours=1)
@@ -258,12 +337,20 @@ async def upload_files(
         }
     )
 
+def rate_limited_response(exc: RateLimitExceeded) -> JSONResponse:
+    """429 with Retry-After for callers that are over their budget"""
+    return JSONResponse(
+        status_code=429,
+        content={"success": False, "errors": [str(exc)]},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.get("/api/download/{filename}")
 async def download_file(filename: str):
     """Download processed file"""
-    file_path = PROCESSED_DIR / filename
+    file_path = processed.locate(filename)
     
-    if not file_path.exists():
+    if file_path is None:
         raise HTTPException(status_code=404, detail="File not found")
     
     return FileResponse(
@@ -272,18 +359,28 @@ async def download_file(filename: str):
         media_type='application/octet-stream'
     )
 
+async def charge_new_session(request: Request):
+    """Count a new session against the client's allowance; raises RateLimitExceeded"""
+    # Its own key, so a shared bucket store doesn't mix it with tool budgets
+    await session_limiter.charge([(f"sessions:{client_key(request)}", "anonymous")], 1)
+
 @app.post("/api/register")
 async def register_user(
+    request: Request,
     email: str = Form(...),
     password: str = Form(...),
     name: Optional[str] = Form(None)
 ):
     """Register a new user"""
+    try:
+        await charge_new_session(request)
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
     user_id = str(uuid.uuid4())
     user = User(user_id, plan="free", daily_tasks=0)
-    user_sessions[user_id] = user
+    user_sessions.save(user)
     
-    return JSONResponse(
+    response = JSONResponse(
         content={
             "success": True,
             "message": "User registered successfully",
@@ -291,26 +388,40 @@ async def register_user(
             "plan": "free"
         }
     )
+    # Other apps sharing the session store find the user (and plan) by this cookie
+    response.set_cookie(SESSION_COOKIE, user_id, httponly=True, samesite="lax")
+    return response
 
 @app.post("/api/login")
 async def login_user(
+    request: Request,
     email: str = Form(...),
     password: str = Form(...)
 ):
     """Login user"""
     # Simple demo login - in production, use proper authentication
-    user_id = str(uuid.uuid4())
-    user = User(user_id, plan="free", daily_tasks=0)
-    user_sessions[user_id] = user
+    user = session_user(user_sessions, request)
+    if user is None:
+        # Only callers without a live session get a new one
+        try:
+            await charge_new_session(request)
+        except RateLimitExceeded as e:
+            return rate_limited_response(e)
+        user = User(str(uuid.uuid4()), plan="free", daily_tasks=0)
+        user_sessions.save(user)
+    user_id = user.user_id
     
-    return JSONResponse(
+    response = JSONResponse(
         content={
             "success": True,
             "message": "Login successful",
             "user_id": user_id,
-            "plan": "free"
+            "plan": user.plan
         }
     )
+    # Same cookie as /api/register
+    response.set_cookie(SESSION_COOKIE, user_id, httponly=True, samesite="lax")
+    return response
 
 @app.get("/api/tools")
 async def get_tools():
@@ -331,12 +442,12 @@ async def get_tools():
 @app.get("/api/stats")
 async def get_stats():
     """Get service statistics"""
-    total_files = len(list(UPLOAD_DIR.glob("*"))) + len(list(PROCESSED_DIR.glob("*")))
+    snapshot = stats.snapshot()
     active_users = len(user_sessions)
     
     return JSONResponse(
         content={
-            "total_files_processed": total_files,
+            **snapshot,
             "active_users": active_users,
             "uptime": "24/7",
             "status": "operational"
@@ -345,40 +456,23 @@ async def get_stats():
 
 def schedule_file_deletion(file_path: str, hours: int = 1):
     """Schedule file for deletion after specified hours"""
-    import threading
-    import time
-    
-    def delete_file():
-        time.sleep(hours * 3600)  # Convert hours to seconds
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Deleted file: {file_path}")
-        except Exception as e:
-            logger.error(f"Error deleting file {file_path}: {e}")
-    
-    thread = threading.Thread(target=delete_file)
-    thread.daemon = True
-    thread.start()
+    # The storage reaper deletes it; no thread sleeps per file
+    storage.expire([file_path], hours * 3600)
 
 @app.on_event("startup")
 async def startup_event():
     """Cleanup old files on startup"""
     cleanup_old_files()
+    storage.start_reaper(also=[chunked_uploads.purge_expired])
 
 def cleanup_old_files():
-    """Cleanup files older than 24 hours"""
-    cutoff_time = datetime.now() - timedelta(hours=24)
-    
-    for dir_path in [UPLOAD_DIR, PROCESSED_DIR]:
-        for file_path in dir_path.glob("*"):
-            try:
-                file_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-                if file_time < cutoff_time:
-                    file_path.unlink()
-                    logger.info(f"Cleaned up old file: {file_path}")
-            except Exception as e:
-                logger.error(f"Error cleaning up file {file_path}: {e}")
+    """Cleanup expired files, plus files older than 24 hours from the flat layout"""
+    removed = storage.purge_expired()
+    chunked_uploads.purge_expired()
+    for store in (uploads, processed):
+        removed += store.sweep_flat(24 * 3600)
+    if removed:
+        logger.info(f"Cleaned up {removed} old file(s)")
 
 if __name__ == "__main__":
     import uvicorn
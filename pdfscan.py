@@ -0,0 +1,389 @@
+"""Encryption facts from a PDF's trailer without parsing the document
+
+Only the end of the file, the cross-reference section it points to and the
+/Encrypt dictionary are read: a few kilobytes whatever the size of the PDF.
+Anything unusual (a damaged tail, an /Encrypt dictionary inside an object
+stream, an xref-stream predictor other than None/Sub/Up) makes
+scan_encryption return None, and the caller opens the document instead.
+"""
+import re
+import zlib
+import logging
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from documents import documents
+
+logger = logging.getLogger(__name__)
+
+TAIL_BYTES = 2048  # the spec puts %%EOF within the last 1024 bytes
+READ_BYTES = 4096
+MAX_DICT_BYTES = 64 * 1024
+MAX_SECTIONS = 32  # /Prev hops followed before giving up
+
+WHITESPACE = b"\x00\t\n\x0c\r "
+DELIMITERS = b"()<>[]{}/%"
+
+OBJECT_HEADER = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj")
+REFERENCE_TAIL = re.compile(rb"\s+(\d+)\s+R(?![^\x00\t\n\x0c\r ()<>\[\]{}/%])")
+TABLE_ENTRY = re.compile(rb"(\d{10}) (\d{5}) ([nf])")
+
+# /CFM values of crypt filters, and what V < 4 implies
+CIPHERS = {"V2": "RC4", "AESV2": "AES-128", "AESV3": "AES-256", "None": "none"}
+
+
+class ScanError(Exception):
+    """The file doesn't have the layout the scanner understands"""
+
+
+class Ref:
+    __slots__ = ("num", "gen")
+
+    def __init__(self, num: int, gen: int):
+        self.num = num
+        self.gen = gen
+
+
+class _Parser:
+    """Just enough of the PDF object syntax to read dictionaries"""
+
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def _skip(self):
+        data = self.data
+        while self.pos < len(data):
+            if data[self.pos] in WHITESPACE:
+                self.pos += 1
+            elif data[self.pos] == 0x25:  # % comment runs to the end of the line
+                while self.pos < len(data) and data[self.pos] not in b"\r\n":
+                    self.pos += 1
+            else:
+                return
+
+    def _regular(self) -> bytes:
+        start = self.pos
+        while self.pos < len(self.data) and self.data[self.pos] not in WHITESPACE + DELIMITERS:
+            self.pos += 1
+        return self.data[start:self.pos]
+
+    def value(self) -> Any:
+        self._skip()
+        data = self.data
+        if self.pos >= len(data):
+            raise ScanError("Truncated object")
+        char = data[self.pos:self.pos + 1]
+        if data.startswith(b"<<", self.pos):
+            return self.dictionary()
+        if char == b"<":
+            end = data.find(b">", self.pos)
+            if end < 0:
+                raise ScanError("Truncated hex string")
+            digits = re.sub(rb"\s", b"", data[self.pos + 1:end])
+            self.pos = end + 1
+            return bytes.fromhex((digits + b"0" * (len(digits) % 2)).decode("ascii"))
+        if char == b"(":
+            return self._literal()
+        if char == b"/":
+            self.pos += 1
+            return "/" + self._regular().decode("latin-1")
+        if char == b"[":
+            self.pos += 1
+            items = []
+            while True:
+                self._skip()
+                if self.pos >= len(data):
+                    raise ScanError("Truncated array")
+                if data[self.pos:self.pos + 1] == b"]":
+                    self.pos += 1
+                    return items
+                items.append(self.value())
+
+        token = self._regular()
+        if token in (b"true", b"false"):
+            return token == b"true"
+        if token == b"null":
+            return None
+        try:
+            number = float(token) if b"." in token else int(token)
+        except ValueError:
+            raise ScanError(f"Unexpected token {token[:20]!r}")
+        match = REFERENCE_TAIL.match(data, self.pos) if isinstance(number, int) else None
+        if match:
+            self.pos = match.end()
+            return Ref(number, int(match.group(1)))
+        return number
+
+    def _literal(self) -> bytes:
+        data = self.data
+        depth = 0
+        out = bytearray()
+        self.pos += 1
+        while self.pos < len(data):
+            char = data[self.pos]
+            self.pos += 1
+            if char == 0x5C:
+                # Escapes are kept as the escaped byte; only flags and names matter here
+                if self.pos < len(data):
+                    out.append(data[self.pos])
+                    self.pos += 1
+                continue
+            if char == 0x28:
+                depth += 1
+            elif char == 0x29:
+                if depth == 0:
+                    return bytes(out)
+                depth -= 1
+            out.append(char)
+        raise ScanError("Truncated string")
+
+    def dictionary(self) -> Dict[str, Any]:
+        self._skip()
+        if not self.data.startswith(b"<<", self.pos):
+            raise ScanError("Expected a dictionary")
+        self.pos += 2
+        result = {}
+        while True:
+            self._skip()
+            if self.pos >= len(self.data):
+                raise ScanError("Truncated dictionary")
+            if self.data.startswith(b">>", self.pos):
+                self.pos += 2
+                return result
+            key = self.value()
+            if not isinstance(key, str):
+                raise ScanError("Dictionary key is not a name")
+            result[key[1:]] = self.value()
+
+
+def parse_dictionary(data: bytes) -> Dict[str, Any]:
+    """Parse PDF dictionary source such as b"<</Filter/Standard/V 2 ...>>" """
+    return _Parser(data).dictionary()
+
+
+class _Reader:
+    """Positioned reads over the input, counting the bytes touched"""
+
+    def __init__(self, f: BinaryIO, size: int):
+        self.f = f
+        self.size = size
+        self.bytes_read = 0
+
+    def read(self, offset: int, length: int) -> bytes:
+        if offset < 0 or offset >= self.size:
+            raise ScanError(f"Offset {offset} is outside the file")
+        self.f.seek(offset)
+        data = self.f.read(length)
+        self.bytes_read += len(data)
+        return data
+
+    def dictionary_at(self, offset: int, header: Optional[re.Pattern] = None) -> Tuple[Dict[str, Any], int]:
+        """Dictionary starting at offset (after header, if given) and the offset just past it"""
+        length = READ_BYTES
+        while True:
+            data = self.read(offset, length)
+            try:
+                parser = _Parser(data)
+                if header is not None:
+                    match = header.match(data)
+                    if not match:
+                        raise ScanError(f"No object at offset {offset}")
+                    parser.pos = match.end()
+                return parser.dictionary(), offset + parser.pos
+            except ScanError:
+                if length >= MAX_DICT_BYTES or offset + len(data) >= self.size:
+                    raise
+                length *= 4
+
+
+class _Section:
+    """One cross-reference section: its trailer, and where it says objects are"""
+
+    def __init__(self, reader: _Reader, offset: int):
+        self.reader = reader
+        self.subsections: List[Tuple[int, int, int]] = []  # (first object, count, entries offset)
+        self.entries: Optional[Dict[int, Tuple[int, int]]] = None  # from an xref stream
+        head = reader.read(offset, 32)
+        if head.lstrip(WHITESPACE).startswith(b"xref"):
+            self._read_table(offset + head.index(b"xref") + 4)
+        else:
+            self._read_stream(offset)
+
+    def _read_table(self, pos: int):
+        header = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*\r?\n?")
+        while True:
+            data = self.reader.read(pos, 64)
+            stripped = data.lstrip(WHITESPACE)
+            if stripped.startswith(b"trailer"):
+                start = pos + len(data) - len(stripped) + len(b"trailer")
+                self.trailer = self.reader.dictionary_at(start)[0]
+                return
+            match = header.match(data)
+            if not match:
+                raise ScanError("Malformed xref table")
+            first, count = int(match.group(1)), int(match.group(2))
+            # Entries are exactly 20 bytes, so the next header can be found without reading them
+            self.subsections.append((first, count, pos + match.end()))
+            pos += match.end() + count * 20
+
+    def _read_stream(self, offset: int):
+        self.trailer, end = self.reader.dictionary_at(offset, OBJECT_HEADER)
+        if self.trailer.get("Type") != "/XRef":
+            raise ScanError("startxref points at neither a table nor an xref stream")
+        self._stream_end = end
+
+    def _decode_stream(self):
+        """Object offsets from the xref stream; only read if /Encrypt is a reference"""
+        trailer = self.trailer
+        length = trailer.get("Length")
+        widths = trailer.get("W")
+        if not isinstance(length, int) or not isinstance(widths, list) or len(widths) != 3:
+            raise ScanError("Unsupported xref stream dictionary")
+        data = self.reader.read(self._stream_end, 32)
+        match = re.compile(rb"\s*stream\r?\n").match(data)
+        if not match:
+            raise ScanError("No stream data after the xref stream dictionary")
+        body = self.reader.read(self._stream_end + match.end(), length)
+
+        filters = trailer.get("Filter")
+        filters = filters if isinstance(filters, list) else [filters] if filters else []
+        if filters not in ([], ["/FlateDecode"]):
+            raise ScanError(f"Unsupported xref stream filter {filters}")
+        if filters:
+            body = zlib.decompress(body)
+        row_width = sum(widths)
+        params = trailer.get("DecodeParms") or {}
+        predictor = params.get("Predictor", 1) if isinstance(params, dict) else 1
+        if predictor >= 10:
+            body = _png_unpredict(body, params.get("Columns", 1))
+        elif predictor != 1:
+            raise ScanError(f"Unsupported predictor {predictor}")
+
+        index = trailer.get("Index") or [0, trailer.get("Size", 0)]
+        self.entries = {}
+        row = 0
+        for first, count in zip(index[0::2], index[1::2]):
+            for num in range(first, first + count):
+                fields = []
+                pos = row * row_width
+                for width in widths:
+                    fields.append(int.from_bytes(body[pos:pos + width], "big") if width else None)
+                    pos += width
+                row += 1
+                kind = 1 if fields[0] is None else fields[0]
+                self.entries[num] = (kind, fields[1])
+
+    def offset_of(self, ref: Ref) -> Optional[int]:
+        """File offset of the object, None if this section doesn't list it"""
+        if self.entries is None and not self.subsections:
+            self._decode_stream()
+        if self.entries is not None:
+            entry = self.entries.get(ref.num)
+            if entry is None or entry[0] == 0:
+                return None
+            if entry[0] != 1:
+                raise ScanError("/Encrypt is inside an object stream")
+            return entry[1]
+        for first, count, entries_offset in self.subsections:
+            if first <= ref.num < first + count:
+                match = TABLE_ENTRY.match(self.reader.read(entries_offset + (ref.num - first) * 20, 20))
+                if not match:
+                    raise ScanError("Malformed xref entry")
+                return int(match.group(1)) if match.group(3) == b"n" else None
+        return None
+
+
+def _png_unpredict(body: bytes, columns: int) -> bytes:
+    """Undo PNG row filters None, Sub and Up (the ones xref streams use)"""
+    out = bytearray()
+    previous = bytearray(columns)
+    for start in range(0, len(body), columns + 1):
+        kind = body[start]
+        row = bytearray(body[start + 1:start + 1 + columns])
+        if kind == 1:
+            for i in range(1, len(row)):
+                row[i] = (row[i] + row[i - 1]) & 0xFF
+        elif kind == 2:
+            for i in range(len(row)):
+                row[i] = (row[i] + previous[i]) & 0xFF
+        elif kind != 0:
+            raise ScanError(f"Unsupported PNG row filter {kind}")
+        out += row
+        previous = row
+    return bytes(out)
+
+
+def describe(encrypt: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[int]]:
+    """Summary of an /Encrypt dictionary, and its /P permission bits"""
+    version = encrypt.get("V", 0)
+    if version >= 4:
+        stream_filter = str(encrypt.get("StmF", "/Identity")).lstrip("/")
+        crypt_filter = (encrypt.get("CF") or {}).get(stream_filter) or {}
+        cipher = CIPHERS.get(str(crypt_filter.get("CFM", "/None")).lstrip("/"), "unknown")
+    else:
+        cipher = "RC4"
+    if cipher == "AES-256":
+        length = 256
+    elif cipher == "AES-128":
+        length = 128
+    else:
+        length = encrypt.get("Length", 40)
+        length = length * 8 if isinstance(length, int) and length <= 32 else length  # bytes in some writers
+
+    encryption = {
+        "filter": str(encrypt.get("Filter", "")).lstrip("/") or None,
+        "version": version,
+        "revision": encrypt.get("R"),
+        "length": length,
+        "cipher": cipher,
+        "metadata_encrypted": encrypt.get("EncryptMetadata", True) is not False,
+    }
+    p = encrypt.get("P")
+    return encryption, p if isinstance(p, int) else None
+
+
+def _scan(reader: _Reader) -> Dict[str, Any]:
+    tail_start = max(0, reader.size - TAIL_BYTES)
+    tail = reader.read(tail_start, TAIL_BYTES)
+    match = None
+    for match in re.finditer(rb"startxref\s+(\d+)", tail):
+        pass
+    if match is None:
+        raise ScanError("No startxref near the end of the file")
+
+    section = _Section(reader, int(match.group(1)))
+    encrypt = section.trailer.get("Encrypt")
+    if encrypt is None:
+        # Every trailer after an incremental update repeats /Encrypt, so the newest one decides
+        return {"encrypted": False, "encryption": None, "p": None}
+
+    if isinstance(encrypt, Ref):
+        offset = None
+        for _ in range(MAX_SECTIONS):
+            offset = section.offset_of(encrypt)
+            prev = section.trailer.get("Prev")
+            if offset is not None or not isinstance(prev, int):
+                break
+            section = _Section(reader, prev)
+        if offset is None:
+            raise ScanError("/Encrypt object not found in the xref")
+        encrypt = reader.dictionary_at(offset, OBJECT_HEADER)[0]
+    if not isinstance(encrypt, dict):
+        raise ScanError("/Encrypt is not a dictionary")
+
+    encryption, p = describe(encrypt)
+    return {"encrypted": True, "encryption": encryption, "p": p}
+
+
+def scan_encryption(path) -> Optional[Dict[str, Any]]:
+    """{"encrypted", "encryption", "p"} read from the trailer, or None if it can't be decided"""
+    try:
+        size = documents.size(path)
+        with documents.open_binary(path) as f:
+            reader = _Reader(f, size)
+            result = _scan(reader)
+    except (ScanError, OSError, ValueError, zlib.error, TypeError, AttributeError) as e:
+        logger.debug(f"Trailer scan of {path} gave up: {e}")
+        return None
+    logger.debug(f"Trailer scan of {path} read {reader.bytes_read} of {size} bytes")
+    return result
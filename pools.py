@@ -0,0 +1,55 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def process_pool() -> ProcessPoolExecutor:
+    """Worker processes shared by every tool for CPU-bound work
+
+    Started on first use and kept for the life of the process, so a request
+    never pays worker start-up. FLIPFILE_POOL_WORKERS sets its size
+    (default: one per CPU). Workers come from a forkserver: this process
+    already runs threads (reaper, stats flusher, SQLite stores), and a plain
+    fork could copy a lock one of them holds.
+    """
+    global _pool
+    with _lock:
+        if _pool is None:
+            workers = int(os.environ.get("FLIPFILE_POOL_WORKERS", 0)) or os.cpu_count() or 1
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context("forkserver"))
+            logger.info(f"Started a pool of {workers} worker process(es)")
+        return _pool
+
+
+async def run_in_pool(fn: Callable, *args) -> Any:
+    """fn(*args) in a pool worker; a pool broken by a dead worker is replaced"""
+    global _pool
+    pool = process_pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        with _lock:
+            if _pool is pool:
+                _pool = None
+        raise
+
+
+def _after_fork():
+    # A forked child can't use its parent's workers; it starts its own when needed
+    global _pool, _lock
+    _pool = None
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,169 @@
+"""Pre-forking server: heavy libraries are imported once, then workers are forked
+
+    python prefork.py --app foo2-main.py --workers 4 --max-requests 500
+
+The parent imports PyMuPDF, pikepdf, Pillow, NumPy, scikit-learn, pdf2docx and
+friends before forking, so every worker starts with them already loaded and
+shares their pages copy-on-write. The application module itself is imported
+in each child, after the fork. Module-level stores that may already have
+been used in the parent (stats, the storage expiry index, the inspection
+index, chunked uploads) drop their SQLite handles in an after-fork hook;
+anything else that opens a connection must be created after the fork.
+Workers exit after --max-requests requests (MuPDF's heap only grows) and the
+parent forks a fresh one from the same warm image.
+"""
+import argparse
+import importlib
+import importlib.util
+import os
+import random
+import signal
+import socket
+import sys
+import time
+import logging
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+def preload() -> Dict[str, float]:
+    """Import and initialise the heavy libraries; returns seconds spent per module"""
+    from registry import registry
+
+    timings = {}
+    # Libraries the tools import inside their methods; the cost of a cold first request
+    for name in registry.footprint():
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Not preloading {name}: {e}")
+            continue
+        timings[name] = time.perf_counter() - started
+
+    # One-time initialisation that would otherwise land on the first request
+    if "PIL.Image" in sys.modules:
+        sys.modules["PIL.Image"].init()  # registers every image plugin
+    if "fitz" in sys.modules:
+        fitz = sys.modules["fitz"]
+        doc = fitz.open()
+        doc.new_page().get_pixmap()  # builds MuPDF's context, fonts and colorspaces
+        doc.close()
+    return timings
+
+
+class Supervisor:
+    """Keep `workers` forked children running `target`, replacing any that exit"""
+
+    def __init__(self, target: Callable[[int], None], workers: int):
+        self.target = target
+        self.workers = workers
+        self.children: Dict[int, int] = {}  # pid -> slot
+        self.stopping = False
+
+    def _spawn(self, slot: int):
+        pid = os.fork()
+        if pid == 0:
+            # Child: default signal handling, then run until done or recycled
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                self.target(slot)
+            except BaseException as e:
+                logger.error(f"Worker {os.getpid()} crashed: {e}")
+                code = 1
+            finally:
+                # os._exit skips atexit (the parent's handlers must not run
+                # here anyway), so the stats get their last flush explicitly
+                try:
+                    from stats import stats
+                    stats.flush()
+                except Exception as e:
+                    logger.error(f"Worker {os.getpid()} failed to flush stats: {e}")
+                os._exit(code)
+        self.children[pid] = slot
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for slot in range(self.workers):
+            self._spawn(slot)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = self.children.pop(pid, None)
+            if slot is None or self.stopping:
+                continue
+            if os.waitstatus_to_exitcode(status) != 0:
+                # Don't spin if a worker dies at startup
+                time.sleep(1)
+            logger.info(f"Worker {pid} exited, forking a replacement")
+            self._spawn(slot)
+
+
+def load_app(app_file: str):
+    """Import the FastAPI app from a file (the app modules have hyphenated names)"""
+    spec = importlib.util.spec_from_file_location("app", app_file)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["app"] = module
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def serve(app_file: str, host: str, port: int, workers: int, max_requests: int):
+    import uvicorn
+
+    timings = preload()
+    logger.info(f"Preloaded {len(timings)} modules in {sum(timings.values()):.2f}s")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    def run_worker(slot: int):
+        app = load_app(app_file)
+        # Jitter so the workers don't all recycle at the same moment
+        limit = max_requests + random.randint(0, max_requests // 10) if max_requests else None
+        config = uvicorn.Config(app, log_level="info", limit_max_requests=limit)
+        uvicorn.Server(config).run(sockets=[sock])
+
+    logger.info(f"Serving {app_file} on {host}:{port} with {workers} workers")
+    Supervisor(run_worker, workers).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the FlipFile app from warm pre-forked workers")
+    parser.add_argument("--app", default="foo2-main.py", help="File defining the FastAPI `app`")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-requests", type=int, default=1000,
+                        help="Recycle a worker after this many requests (0 = never)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    serve(args.app, args.host, args.port, args.workers, args.max_requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,180 @@
 import asyncio
+import functools
+import io
 from pathlib import Path
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+
+from instrumentation import stage
+from stats import counted
+from storage import processed
+from documents import documents
+from inspection import inspections
+from pools import run_in_pool
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_PERMISSIONS = {
+    "print": True,
+    "modify": False,
+    "copy": True,
+    "annotations": True
+}
+
+# PDFProtector.permission_flags names as pikepdf.Permissions fields
+PIKEPDF_PERMISSIONS = {
+    "print": "print_lowres",
+    "modify": "modify_other",
+    "copy": "extract",
+    "annotations": "modify_annotation",
+    "fill_forms": "modify_form",
+    "extract": "accessibility",
+    "assemble": "modify_assembly",
+    "print_high": "print_highres"
+}
+
+
+def _encrypt_with_pikepdf(pdf, output, password: str, encryption_level: str,
+                          permissions: Dict[str, bool]):
+    """Save an open pikepdf.Pdf to output (a path or file) encrypted"""
+    import pikepdf
+    
+    # Anything not granted is denied
+    allow = pikepdf.Permissions(**{
+        field: bool(permissions.get(name)) for name, field in PIKEPDF_PERMISSIONS.items()
+    })
+    
+    # Set encryption level
+    if encryption_level == "256bit":
+        # AES-256 encryption
+        encryption = pikepdf.Encryption(
+            user=password,
+            owner=password,  # Use same password for owner
+            aes=True,
+            allow=allow
+        )
+    elif encryption_level == "128bit":
+        # AES-128 is revision 4, the cipher PyMuPDF has always written for this
+        # level; pikepdf would otherwise default to R=6, which is AES-256
+        encryption = pikepdf.Encryption(
+            user=password,
+            owner=password,
+            R=4,
+            aes=True,
+            allow=allow
+        )
+    else:
+        # 40-bit RC4 is revision 2. pikepdf only encrypts metadata with AES
+        encryption = pikepdf.Encryption(
+            user=password,
+            owner=password,
+            R=2,
+            aes=False,
+            metadata=False,
+            allow=allow
+        )
+    
+    # Save with encryption
+    with stage("protect", "save"):
+        pdf.save(output, encryption=encryption)
+
+
+def _encrypt_with_pymupdf(doc, output, password: str, encryption_level: str,
+                          permissions: Dict[str, bool]):
+    """Save an open PyMuPDF document to output (a path or file) encrypted"""
+    import fitz
+    
+    # Calculate permission bits for PyMuPDF
+    permission_bits = 0
+    perm_map = {
+        "print": fitz.PDF_PERM_PRINT,
+        "modify": fitz.PDF_PERM_MODIFY,
+        "copy": fitz.PDF_PERM_COPY,
+        "annotations": fitz.PDF_PERM_ANNOTATE
+    }
+    
+    for perm_name, allowed in permissions.items():
+        if allowed and perm_name in perm_map:
+            permission_bits |= perm_map[perm_name]
+    
+    # Set encryption method
+    if encryption_level == "256bit":
+        encrypt_meth = fitz.PDF_ENCRYPT_AES_256
+    elif encryption_level == "128bit":
+        encrypt_meth = fitz.PDF_ENCRYPT_AES_128
+    else:  # 40bit
+        encrypt_meth = fitz.PDF_ENCRYPT_RC4_40
+    
+    with stage("protect", "save"):
+        doc.save(output,
+                 encryption=encrypt_meth,
+                 owner_pw=password,
+                 user_pw=password,
+                 permissions=permission_bits)
+
+
+def _open_pikepdf(input_path):
+    with stage("protect", "open"):
+        return documents.open_pikepdf(input_path)
+
+
+def _open_pymupdf(input_path):
+    with stage("protect", "open"):
+        return documents.open_fitz(input_path)
+
+
+# backend name -> (open an input, encrypt the open document)
+BACKENDS = {
+    "pikepdf": (_open_pikepdf, _encrypt_with_pikepdf),
+    "pymupdf": (_open_pymupdf, _encrypt_with_pymupdf),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def encryption_backend(encryption_level: str) -> str:
+    """The backend that writes this encryption level, probed once per process
+
+    pikepdf is preferred; a level it can't write (or a missing library) goes
+    to PyMuPDF for every file rather than failing over file by file.
+    """
+    for name in ("pikepdf", "pymupdf"):
+        _, encrypt = BACKENDS[name]
+        try:
+            if name == "pikepdf":
+                import pikepdf
+                doc = pikepdf.new()
+                doc.add_blank_page()
+            else:
+                import fitz
+                doc = fitz.open()
+                doc.new_page()
+            encrypt(doc, io.BytesIO(), "probe", encryption_level, DEFAULT_PERMISSIONS)
+            doc.close()
+        except Exception as e:
+            logger.info(f"{name} can't write {encryption_level} encryption: {e}")
+            continue
+        logger.info(f"Protecting with {name} for {encryption_level} encryption")
+        return name
+    raise RuntimeError(f"No PDF library here can write {encryption_level} encryption")
+
+
+def _protect_to_bytes(input_path: str, backend: str, password: str, encryption_level: str,
+                      permissions: Dict[str, bool], document_password: Optional[str] = None) -> bytes:
+    """Encrypt one PDF and return its bytes (runs inside a worker process)"""
+    if document_password is not None:
+        # Worker processes don't share the parent's passwords; this one is passed in
+        documents.set_password(input_path, document_password)
+    open_input, encrypt = BACKENDS[backend]
+    doc = open_input(input_path)
+    try:
+        output = io.BytesIO()
+        encrypt(doc, output, password, encryption_level, permissions)
+        return output.getvalue()
+    finally:
+        doc.close()
+        if document_password is not None:
+            documents.discard([input_path])
+
 class PDFProtector:
     """Protect PDF files with passwords and permissions"""
     
@@ -26,124 +196,74 @@ class PDFProtector:
             "print_high": 2048    # Print high quality
         }
     
+    @counted("protect")
     async def protect(self, input_path: Path, password: str, 
                      encryption_level: str = "128bit", 
                      permissions: Dict[str, bool] = None) -> Path:
         """Protect PDF with password and permissions"""
         
         if permissions is None:
-            permissions = {
-                "print": True,
-                "modify": False,
-                "copy": True,
-                "annotations": True
-            }
+            permissions = dict(DEFAULT_PERMISSIONS)
         
-        output_dir = Path("processed")
-        output_path = output_dir / f"protected_{input_path.name}"
+        output_path = processed.path_for(f"protected_{input_path.name}")
         
+        # pikepdf or PyMuPDF, chosen once for this encryption level
+        open_input, encrypt = BACKENDS[encryption_backend(encryption_level)]
+        doc = open_input(input_path)
         try:
-            # Try using pikepdf first
-            return await self._protect_with_pikepdf(input_path, output_path, 
-                                                   password, encryption_level, permissions)
+            encrypt(doc, output_path, password, encryption_level, permissions)
         except Exception as e:
-            logger.error(f"Protection error with pikepdf: {e}")
-            # Fallback to PyMuPDF
-            return await self._protect_with_pymupdf(input_path, output_path, 
-                                                   password, encryption_level, permissions)
-    
-    async def _protect_with_pikepdf(self, input_path: Path, output_path: Path,
-                                   password: str, encryption_level: str,
-                                   permissions: Dict[str, bool]) -> Path:
-        """Protect PDF using pikepdf"""
-        try:
-            import pikepdf
-            
-            # Calculate permission bits
-            permission_bits = 0
-            for perm_name, allowed in permissions.items():
-                if allowed and perm_name in self.permission_flags:
-                    permission_bits |= self.permission_flags[perm_name]
-            
-            # Open PDF
-            pdf = pikepdf.open(input_path)
-            
-            # Set encryption level
-            if encryption_level == "256bit":
-                # AES-256 encryption
-                encryption = pikepdf.Encryption(
-                    user=password,
-                    owner=password,  # Use same password for owner
-                    aes=True,
-                    allow=permission_bits
-                )
-            else:
-                # RC4 encryption (128-bit or 40-bit)
-                encryption = pikepdf.Encryption(
-                    user=password,
-                    owner=password,
-                    aes=False,
-                    allow=permission_bits
-                )
-            
-            # Save with encryption
-            pdf.save(output_path, encryption=encryption)
-            pdf.close()
-            
-            return output_path
-            
-        except Exception as e:
-            logger.error(f"Pikepdf protection error: {e}")
+            logger.error(f"Protection error: {e}")
             raise
+        finally:
+            doc.close()
+        
+        return output_path
     
-    async def _protect_with_pymupdf(self, input_path: Path, output_path: Path,
-                                   password: str, encryption_level: str,
-                                   permissions: Dict[str, bool]) -> Path:
-        """Protect PDF using PyMuPDF"""
+    async def protect_many(self, items: List[Dict[str, Any]]) -> AsyncIterator[Tuple[Dict[str, Any], bytes]]:
+        """Protect many PDFs, each with its own password and permissions
+        
+        items are dicts with input_path, password and optionally
+        encryption_level and permissions. Files are encrypted in parallel
+        worker processes and yielded as (item, encrypted bytes) in the order
+        they finish, so the caller can write each one out as it lands.
+        """
+        jobs = []
+        for item in items:
+            encryption_level = item.get("encryption_level") or "128bit"
+            permissions = item.get("permissions")
+            if permissions is None:
+                permissions = dict(DEFAULT_PERMISSIONS)
+            jobs.append((encryption_backend(encryption_level), item["password"],
+                         encryption_level, permissions, documents.password(item["input_path"])))
+        
+        if len(items) == 1:
+            # One file is not worth the worker start-up cost; in this process
+            # the input and its password are already at hand. A thread keeps
+            # the event loop free while it is encrypted
+            item = items[0]
+            yield item, await asyncio.to_thread(_protect_to_bytes, item["input_path"], *jobs[0][:4])
+            return
+        
+        pending = {}
+        for item, job in zip(items, jobs):
+            # Worker processes can't see this process's in-memory uploads
+            shared_path = str(documents.local_path(item["input_path"]))
+            pending[asyncio.ensure_future(run_in_pool(_protect_to_bytes, shared_path, *job))] = item
         try:
-            import fitz
-            
-            # Calculate permission bits for PyMuPDF
-            permission_bits = 0
-            perm_map = {
-                "print": fitz.PDF_PERM_PRINT,
-                "modify": fitz.PDF_PERM_MODIFY,
-                "copy": fitz.PDF_PERM_COPY,
-                "annotations": fitz.PDF_PERM_ANNOTATE
-            }
-            
-            for perm_name, allowed in permissions.items():
-                if allowed and perm_name in perm_map:
-                    permission_bits |= perm_map[perm_name]
-            
-            # Set encryption method
-            if encryption_level == "256bit":
-                encrypt_meth = fitz.PDF_ENCRYPT_AES_256
-            elif encryption_level == "128bit":
-                encrypt_meth = fitz.PDF_ENCRYPT_AES_128
-            else:  # 40bit
-                encrypt_meth = fitz.PDF_ENCRYPT_RC4_40
-            
-            # Open and save with encryption
-            pdf = fitz.open(input_path)
-            pdf.save(output_path, 
-                    encryption=encrypt_meth,
-                    owner_pw=password,
-                    user_pw=password,
-                    permissions=permission_bits)
-            pdf.close()
-            
-            return output_path
-            
-        except Exception as e:
-            logger.error(f"PyMuPDF protection error: {e}")
-            raise
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        finally:
+            # A caller that stops early (or a failed file) leaves no work queued in the pool
+            for future in pending:
+                future.cancel()
     
     async def add_watermark(self, input_path: Path, watermark_text: str,
                           position: str = "center", opacity: float = 0.3) -> Path:
         """Add watermark to PDF"""
-        output_dir = Path("processed")
-        output_path = output_dir / f"watermarked_{input_path.name}"
+        output_path = processed.path_for(f"watermarked_{input_path.name}")
         
         try:
             import fitz
@@ -151,7 +271,7 @@ class PDFProtector:
             from reportlab.lib.pagesizes import letter
             import io
             
-            pdf = fitz.open(input_path)
+            pdf = documents.open_fitz(input_path)
             
             # Create watermark PDF
             packet = io.BytesIO()
@@ -214,13 +334,13 @@ class PDFProtector:
         # Note: This is a simplified implementation
         # In production, use proper cryptographic libraries
         
-        output_dir = Path("processed")
-        output_path = output_dir / f"signed_{input_path.name}"
+        output_path = processed.path_for(f"signed_{input_path.name}")
         
         try:
             import fitz
             
-            pdf = fitz.open(input_path)
+            # Incremental saves append to the original file, so it must be a real one
+            pdf = documents.authenticate(fitz.open(documents.local_path(input_path)), input_path)
             
             # Create signature appearance
             rect = fitz.Rect(50, 50, 250, 100)  # Signature position
@@ -253,39 +373,11 @@ class PDFProtector:
     
     def get_permission_info(self, input_path: Path) -> Dict[str, Any]:
         """Get PDF permission information"""
-        try:
-            import pikepdf
-            
-            pdf = pikepdf.open(input_path)
-            
-            # Check if encrypted
-            is_encrypted = pdf.is_encrypted
-            
-            permissions = {}
-            if is_encrypted:
-                # Try to get permissions (requires password)
-                try:
-                    # This will fail if password needed
-                    perm_bits = pdf._get_permissions()
-                    
-                    # Decode permission bits
-                    permissions = {
-                        "print": bool(perm_bits & 4),
-                        "modify": bool(perm_bits & 8),
-                        "copy": bool(perm_bits & 16),
-                        "annotations": bool(perm_bits & 32)
-                    }
-                except:
-                    pass
-            
-            pdf.close()
-            
-            return {
-                "is_encrypted": is_encrypted,
-                "permissions": permissions,
-                "has_owner_password": is_encrypted
-            }
-            
-        except Exception as e:
-            logger.error(f"Permission info error: {e}")
-            return {"is_encrypted": False, "permissions": {}}
+        record = inspections.encryption(input_path)
+        is_encrypted = record["encrypted"]
+        return {
+            "is_encrypted": is_encrypted,
+            # Read from the /P entry, which doesn't need the password
+            "permissions": record["permissions"] if is_encrypted else {},
+            "has_owner_password": is_encrypted
+        }
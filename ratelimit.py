@@ -0,0 +1,232 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+import logging
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Limits in cost units (see admission.estimate_cost: ~1 MB of input or one page
+# rendered at 150 DPI), plus one unit per second of processing time.
+# burst: bucket size; refill: units per second; daily: units per UTC day
+PLAN_LIMITS: Dict[str, Dict[str, float]] = {
+    "anonymous": {"burst": 200, "refill": 2, "daily": 2000},
+    "free": {"burst": 300, "refill": 3, "daily": 5000},
+    "pro": {"burst": 1000, "refill": 10, "daily": 50000},
+    # Everything session users do from one address; room for a few busy
+    # accounts behind a shared NAT, but a stream of new accounts can't each
+    # start from a fresh budget
+    "address": {"burst": 2000, "refill": 20, "daily": 100000},
+}
+
+UNITS_PER_SECOND = 1.0
+
+# New sessions (login, register) per client address, one unit each
+SESSION_LIMITS: Dict[str, Dict[str, float]] = {
+    "anonymous": {"burst": 10, "refill": 1 / 60, "daily": 100},
+}
+
+# (tokens, updated_at, day, used_today)
+BucketState = Tuple[float, float, str, float]
+
+# (key, plan) pairs; a request is admitted only if every one of them can pay
+Buckets = Sequence[Tuple[str, str]]
+
+BucketUpdate = Callable[[Optional[BucketState]], BucketState]
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a caller's bucket or daily quota can't cover a request"""
+
+    def __init__(self, key: str, reason: str, retry_after: int):
+        super().__init__(f"Rate limit exceeded ({reason}), retry in {retry_after}s")
+        self.key = key
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _today(now: float) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(now))
+
+
+def _seconds_to_midnight(now: float) -> int:
+    return int(86400 - now % 86400) + 1
+
+
+def _apply(key: str, state: Optional[BucketState], limits: Dict[str, float], units: float,
+           now: float, force: bool) -> BucketState:
+    """Refill the bucket, reset the day if needed, then take units or raise"""
+    if state is None:
+        state = (limits["burst"], now, _today(now), 0.0)
+    tokens, updated_at, day, used = state
+
+    tokens = min(limits["burst"], tokens + (now - updated_at) * limits["refill"])
+    today = _today(now)
+    if day != today:
+        day, used = today, 0.0
+
+    if not force:
+        if used + units > limits["daily"] and used > 0:
+            raise RateLimitExceeded(key, "daily quota", _seconds_to_midnight(now))
+        # A job bigger than the bucket may run once the bucket is full; the
+        # debt it leaves behind is paid off before the next one is admitted
+        needed = min(units, limits["burst"])
+        if tokens < needed:
+            raise RateLimitExceeded(key, "rate", max(1, int((needed - tokens) / limits["refill"]) + 1))
+
+    return tokens - units, now, day, used + units
+
+
+class MemoryBucketStore:
+    """Per-process bucket state, bounded so that many distinct clients can't grow it"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, BucketState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, updates: Dict[str, BucketUpdate]) -> Dict[str, BucketState]:
+        """Apply every update or, if one raises, none of them"""
+        with self._lock:
+            states = {key: fn(self._buckets.get(key)) for key, fn in updates.items()}
+            for key, state in states.items():
+                self._buckets[key] = state
+                self._buckets.move_to_end(key)
+            # An evicted idle bucket would have refilled to full anyway; only
+            # its daily usage is forgotten
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return states
+
+    def get(self, key: str) -> Optional[BucketState]:
+        with self._lock:
+            return self._buckets.get(key)
+
+
+class SQLiteBucketStore:
+    """Bucket state in a SQLite file shared by every worker on the host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL,"
+            " day TEXT NOT NULL, used REAL NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def update(self, updates: Dict[str, BucketUpdate]) -> Dict[str, BucketState]:
+        """Apply every update in one transaction or, if one raises, none of them"""
+        conn = self._connect()
+        # IMMEDIATE takes the write lock up front so two workers can't both
+        # read the same balance and spend it twice
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            states = {}
+            for key, fn in updates.items():
+                row = conn.execute(
+                    "SELECT tokens, updated_at, day, used FROM buckets WHERE key = ?", (key,)
+                ).fetchone()
+                states[key] = fn(tuple(row) if row else None)
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated_at, day, used)"
+                " VALUES (?, ?, ?, ?, ?)", [(key, *state) for key, state in states.items()]
+            )
+            conn.execute("COMMIT")
+            return states
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, key: str) -> Optional[BucketState]:
+        row = self._connect().execute(
+            "SELECT tokens, updated_at, day, used FROM buckets WHERE key = ?", (key,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+
+class RateLimiter:
+    """Cost-weighted token buckets plus daily quotas, one per (key, plan) a request is charged to"""
+
+    def __init__(self, store=None, limits: Optional[Dict[str, Dict[str, float]]] = None):
+        self.store = store or MemoryBucketStore()
+        self.limits = limits or PLAN_LIMITS
+
+    def _limits(self, plan: str) -> Dict[str, float]:
+        return self.limits.get(plan, self.limits["anonymous"])
+
+    # The store may wait on another worker's SQLite write lock, so every call
+    # to it runs in a thread rather than on the event loop
+
+    async def check(self, buckets: Buckets):
+        """Fail fast, before any upload is written, if any of the caller's buckets is out of budget"""
+        states = await asyncio.to_thread(lambda: [self.store.get(key) for key, _ in buckets])
+        now = time.time()
+        for (key, plan), state in zip(buckets, states):
+            if state is not None:
+                # Probe with a single unit without storing the result
+                _apply(key, state, self._limits(plan), 1, now, force=False)
+
+    async def charge(self, buckets: Buckets, units: float, force: bool = False) -> float:
+        """Take units from every bucket, or from none if one can't pay; returns
+        units used today in the first (the caller's own) bucket"""
+        now = time.time()
+
+        def update(key, limits):
+            return lambda state: _apply(key, state, limits, units, now, force)
+
+        updates = {key: update(key, self._limits(plan)) for key, plan in buckets}
+        states = await asyncio.to_thread(self.store.update, updates)
+        return states[buckets[0][0]][3]
+
+    @asynccontextmanager
+    async def limit(self, buckets: Buckets, cost: float):
+        """Charge cost up front and the block's processing time on the way out"""
+        await self.charge(buckets, cost)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            await self.charge(buckets, (time.perf_counter() - started) * UNITS_PER_SECOND, force=True)
+
+
+def create_rate_limiter(limits: Optional[Dict[str, Dict[str, float]]] = None) -> RateLimiter:
+    """Pick the backend from FLIPFILE_RATELIMIT_STORE: "memory" (default) or "sqlite:<path>" """
+    spec = os.environ.get("FLIPFILE_RATELIMIT_STORE", "memory")
+    if spec.startswith("sqlite:"):
+        path = spec[len("sqlite:"):]
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        logger.info(f"Using SQLite rate limit store at {path}")
+        return RateLimiter(SQLiteBucketStore(path), limits)
+    if spec != "memory":
+        raise ValueError(f"Unknown rate limit store: {spec}")
+    return RateLimiter(limits=limits)
+
+
+def client_key(request) -> str:
+    """Bucket key for the client address"""
+    host = request.client.host if request.client else "unknown"
+    return f"ip:{host}"
+
+
+def client_buckets(request, user=None) -> List[Tuple[str, str]]:
+    """Buckets a request is charged to: the address alone for anonymous callers;
+    for a session user, the user's plan budget and a shared per-address cap"""
+    if user is None:
+        return [(client_key(request), "anonymous")]
+    # A separate key from anonymous traffic, which has much lower limits
+    return [(f"user:{user.user_id}", user.plan), (f"address:{client_key(request)}", "address")]
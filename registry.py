@@ -0,0 +1,178 @@
+import importlib
+import json
+import os
+import threading
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ToolSpec:
+    """What the registry knows about a tool before loading it
+
+    module/class_name/entry say where the tool lives and which method runs a
+    job. capabilities builds the public description from the loaded instance,
+    so it cannot drift from what the class actually supports. cost names what
+    a cost unit scales with (see admission.py) and footprint lists the heavy
+    libraries the tool imports on first real use.
+    """
+
+    __slots__ = ("id", "name", "description", "module", "class_name", "entry",
+                 "capabilities", "cost", "footprint")
+
+    def __init__(self, id: str, name: str, description: str, module: str, class_name: str,
+                 entry: str, capabilities: Callable[[Any], Dict[str, Any]], cost: str,
+                 footprint: Tuple[str, ...]):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.module = module
+        self.class_name = class_name
+        self.entry = entry
+        self.capabilities = capabilities
+        self.cost = cost
+        self.footprint = footprint
+
+
+def _extensions(groups: Dict[str, List[str]]) -> List[str]:
+    return sorted({ext.lstrip(".") for exts in groups.values() for ext in exts})
+
+
+TOOLS = (
+    ToolSpec(
+        "convert", "PDF Converter",
+        "Convert PDF to Word, Excel, PowerPoint, Images and vice versa",
+        "tools.converter", "PDFConverter", "convert",
+        lambda tool: {
+            "supported_formats": _extensions(tool.supported_formats),
+            "quality_levels": list(tool.slide_render_dpi),
+        },
+        cost="pages x DPI for image/slide output, else input MB",
+        footprint=("fitz", "pikepdf", "pdf2docx", "docx", "openpyxl", "pptx", "pptx.parts.image",
+                   "reportlab.pdfgen.canvas", "PIL.Image", "PIL.ImageOps"),
+    ),
+    ToolSpec(
+        "compress", "PDF Compressor",
+        "Reduce PDF file size without losing quality",
+        "tools.compressor", "PDFCompressor", "compress",
+        lambda tool: {"compression_levels": list(tool.compression_levels)},
+        cost="input MB x (DPI / 150)^2",
+        footprint=("fitz", "pikepdf", "PIL.Image"),
+    ),
+    ToolSpec(
+        "protect", "Protect PDF",
+        "Add password protection and permissions to PDF",
+        "tools.protector", "PDFProtector", "protect",
+        lambda tool: {
+            "encryption_levels": list(tool.encryption_levels),
+            "permissions": list(tool.permission_flags),
+        },
+        cost="input MB",
+        footprint=("fitz", "pikepdf", "reportlab.pdfgen.canvas"),
+    ),
+    ToolSpec(
+        "unlock", "Unlock PDF",
+        "Remove password protection from PDF files",
+        "tools.unlocker", "PDFUnlocker", "unlock",
+        lambda tool: {
+            "methods": ["password", "dictionary", "brute_force"],
+            "dictionary_size": len(tool.wordlist),
+        },
+        cost="input MB",
+        footprint=("pikepdf",),
+    ),
+    ToolSpec(
+        "edit", "Edit PDF",
+        "Merge, split, rotate, reorder pages in PDF",
+        "tools.editor", "PDFEditor", "edit",
+        lambda tool: {"operations": list(tool.supported_operations), "batch_support": True},
+        cost="input MB",
+        footprint=("fitz", "pikepdf", "PIL.Image"),
+    ),
+    ToolSpec(
+        "extract-colors", "Color Extractor",
+        "Extract color schemes from images and PDF documents",
+        "tools.color_extractor", "ColorExtractor", "extract",
+        lambda tool: {"color_formats": list(tool.color_formats), "max_colors": tool.max_colors},
+        cost="input MB",
+        footprint=("fitz", "PIL.Image", "PIL.ImageDraw", "numpy", "sklearn.cluster"),
+    ),
+)
+
+
+class ToolRegistry:
+    """Tool instances created on first use, plus the /api/tools description
+
+    Nothing is imported until a tool is asked for, so a front end that only
+    hands jobs to worker nodes never loads the tools at all.
+    """
+
+    def __init__(self, specs: Iterable[ToolSpec]):
+        self.specs: Dict[str, ToolSpec] = {spec.id: spec for spec in specs}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._description: Optional[bytes] = None
+
+    def get(self, tool_id: str) -> Any:
+        """The tool's instance, importing and constructing it the first time"""
+        instance = self._instances.get(tool_id)
+        if instance is None:
+            spec = self.specs[tool_id]
+            with self._lock:
+                instance = self._instances.get(tool_id)
+                if instance is None:
+                    module = importlib.import_module(spec.module)
+                    instance = getattr(module, spec.class_name)()
+                    self._instances[tool_id] = instance
+        return instance
+
+    def entry(self, tool_id: str) -> Callable:
+        """The bound method that runs a job for this tool"""
+        return getattr(self.get(tool_id), self.specs[tool_id].entry)
+
+    def footprint(self, tool_ids: Optional[Iterable[str]] = None) -> List[str]:
+        """Heavy libraries used by the given tools (all by default), without duplicates"""
+        ids = self.specs if tool_ids is None else tool_ids
+        return list(dict.fromkeys(lib for tool_id in ids for lib in self.specs[tool_id].footprint))
+
+    def preload(self, tool_ids: Iterable[str]):
+        """Load tools and their libraries now instead of on the first request"""
+        tool_ids = list(tool_ids)
+        for tool_id in tool_ids:
+            self.get(tool_id)
+        for name in self.footprint(tool_ids):
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                logger.warning(f"Not preloading {name}: {e}")
+
+    def describe(self) -> bytes:
+        """JSON body for /api/tools, built once"""
+        if self._description is None:
+            tools = []
+            for spec in self.specs.values():
+                tools.append({
+                    "id": spec.id,
+                    "name": spec.name,
+                    "description": spec.description,
+                    **spec.capabilities(self.get(spec.id)),
+                    "cost": spec.cost,
+                })
+            self._description = json.dumps({"tools": tools}).encode("utf-8")
+        return self._description
+
+
+def configured_preload() -> List[str]:
+    """Tools to load at startup from FLIPFILE_PRELOAD_TOOLS ("all", or comma-separated ids)"""
+    value = os.environ.get("FLIPFILE_PRELOAD_TOOLS", "").strip()
+    if value == "all":
+        return list(registry.specs)
+    tool_ids = [tool_id.strip() for tool_id in value.split(",") if tool_id.strip()]
+    for tool_id in tool_ids:
+        if tool_id not in registry.specs:
+            raise ValueError(f"Unknown tool in FLIPFILE_PRELOAD_TOOLS: {tool_id}")
+    return tool_ids
+
+
+registry = ToolRegistry(TOOLS)
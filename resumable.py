@@ -0,0 +1,335 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+
+from documents import documents
+from ratelimit import client_key
+from storage import DEFAULT_TTL, ShardedStorage, uploads
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+DEFAULT_CHUNK_SIZE = 8 * MB
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * MB
+
+# Largest file accepted through the resumable protocol; per-plan limits are
+# checked again where the upload is used
+MAX_UPLOAD_SIZE = int(os.environ.get("FLIPFILE_MAX_UPLOAD", 200 * MB))
+
+CREATED = "created"
+COMPLETE = "complete"
+
+SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadError(Exception):
+    """A chunk or finalize request the upload can't accept; carries the HTTP status"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ChunkedUploads:
+    """Resumable uploads: create, PUT chunks in any order, check progress, finalize
+
+    The target file is allocated at its full size when the upload is created
+    and every chunk is streamed straight to its offset, so nothing is
+    buffered and finalizing moves no data. Chunk records live in SQLite so
+    any worker process can take any chunk. The file is registered for expiry
+    at creation, so abandoned uploads are reaped like any other.
+
+    Finalized files are recorded by SHA-256 and size under the client that
+    sent them. A create from the same client carrying a known hash gets a
+    hard link to the stored file and a complete upload, with no transfer.
+    Scoping by client keeps a hash from working as a key to someone else's
+    document.
+    """
+
+    def __init__(self, path: str, storage: ShardedStorage, ttl: float = DEFAULT_TTL):
+        self.path = path
+        self.storage = storage
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                " id TEXT PRIMARY KEY, filename TEXT NOT NULL, path TEXT NOT NULL,"
+                " size INTEGER NOT NULL, chunk_size INTEGER NOT NULL, status TEXT NOT NULL,"
+                " owner TEXT, sha256 TEXT, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS uploads_created_at ON uploads (created_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " upload_id TEXT NOT NULL, idx INTEGER NOT NULL, sha256 TEXT NOT NULL,"
+                " PRIMARY KEY (upload_id, idx))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS contents ("
+                " owner TEXT NOT NULL, sha256 TEXT NOT NULL, size INTEGER NOT NULL,"
+                " path TEXT NOT NULL, PRIMARY KEY (owner, sha256, size))"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _after_fork(self):
+        # A connection opened before a fork belongs to the parent
+        self._local = threading.local()
+
+    def create(self, filename: str, size: int, chunk_size: int = DEFAULT_CHUNK_SIZE,
+               sha256: Optional[str] = None, owner: Optional[str] = None) -> Dict[str, Any]:
+        if size <= 0 or size > MAX_UPLOAD_SIZE:
+            raise UploadError(413 if size > 0 else 400,
+                              f"Upload size must be between 1 byte and {MAX_UPLOAD_SIZE // MB}MB")
+        if sha256 is not None:
+            sha256 = sha256.lower()
+            if not SHA256_HEX.match(sha256):
+                raise UploadError(400, "sha256 must be 64 hex digits")
+        chunk_size = min(max(chunk_size, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+
+        upload_id = str(uuid.uuid4())
+        path = self.storage.path_for(f"{upload_id}{Path(filename).suffix.lower()}", ttl=self.ttl)
+        status = CREATED
+        if sha256 and owner and self._link_known(owner, sha256, size, path):
+            status = COMPLETE
+        else:
+            with open(path, "wb") as f:
+                f.truncate(size)  # sparse until the chunks arrive
+
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO uploads (id, filename, path, size, chunk_size, status, owner, sha256, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (upload_id, filename, str(path), size, chunk_size, status, owner, sha256, time.time())
+        )
+        if status == COMPLETE:
+            logger.info(f"Upload {upload_id} deduplicated ({size} bytes not sent)")
+        return self.status(upload_id)
+
+    def purge_expired(self) -> int:
+        """Drop the rows of uploads whose files the reaper has taken; returns how many"""
+        cutoff = time.time() - self.ttl
+        conn = self._connect()
+        conn.execute("DELETE FROM chunks WHERE upload_id IN (SELECT id FROM uploads WHERE created_at < ?)",
+                     (cutoff,))
+        return conn.execute("DELETE FROM uploads WHERE created_at < ?", (cutoff,)).rowcount
+
+    def _link_known(self, owner: str, sha256: str, size: int, path: Path) -> bool:
+        """Hard-link stored content with this hash to path; False if there is none left"""
+        row = self._connect().execute(
+            "SELECT path FROM contents WHERE owner = ? AND sha256 = ? AND size = ?", (owner, sha256, size)
+        ).fetchone()
+        if row is None:
+            return False
+        try:
+            # Each upload gets its own link, so the reaper expiring one leaves the others
+            os.link(row[0], path)
+        except OSError:
+            self._connect().execute(
+                "DELETE FROM contents WHERE owner = ? AND sha256 = ? AND size = ?", (owner, sha256, size)
+            )
+            return False
+        return True
+
+    def _get(self, upload_id: str) -> Dict[str, Any]:
+        row = self._connect().execute(
+            "SELECT filename, path, size, chunk_size, status, owner, sha256 FROM uploads WHERE id = ?",
+            (upload_id,)
+        ).fetchone()
+        if row is None:
+            raise UploadError(404, "Upload not found or expired")
+        return {"filename": row[0], "path": Path(row[1]), "size": row[2],
+                "chunk_size": row[3], "status": row[4], "owner": row[5], "sha256": row[6]}
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        """Progress of an upload; offset is how far it is complete without gaps"""
+        upload = self._get(upload_id)
+        chunks = -(-upload["size"] // upload["chunk_size"])
+        received = [row[0] for row in self._connect().execute(
+            "SELECT idx FROM chunks WHERE upload_id = ? ORDER BY idx", (upload_id,)
+        )]
+        contiguous = 0
+        while contiguous < len(received) and received[contiguous] == contiguous:
+            contiguous += 1
+        complete = upload["status"] == COMPLETE
+        return {
+            "upload_id": upload_id,
+            "filename": upload["filename"],
+            "size": upload["size"],
+            "chunk_size": upload["chunk_size"],
+            "chunks": chunks,
+            "received": received,
+            # A deduplicated upload is complete without any chunks
+            "offset": upload["size"] if complete else min(contiguous * upload["chunk_size"], upload["size"]),
+            "complete": complete,
+        }
+
+    async def write_chunk(self, upload_id: str, index: int, body: AsyncIterator[bytes],
+                          checksum: str) -> Dict[str, Any]:
+        """Stream one chunk to its place in the file, then record it if its SHA-256 matches"""
+        upload = await asyncio.to_thread(self._get, upload_id)
+        if upload["status"] == COMPLETE:
+            raise UploadError(409, "Upload already finalized")
+        offset = index * upload["chunk_size"]
+        if index < 0 or offset >= upload["size"]:
+            raise UploadError(416, f"Chunk {index} is out of range")
+        expected = min(upload["chunk_size"], upload["size"] - offset)
+
+        digest = hashlib.sha256()
+        written = 0
+        fd = os.open(upload["path"], os.O_WRONLY)
+        try:
+            async for piece in body:
+                if written + len(piece) > expected:
+                    raise UploadError(400, f"Chunk {index} is longer than {expected} bytes")
+                await asyncio.to_thread(os.pwrite, fd, piece, offset + written)
+                digest.update(piece)
+                written += len(piece)
+        finally:
+            os.close(fd)
+
+        if written != expected:
+            raise UploadError(400, f"Chunk {index} has {written} bytes, expected {expected}")
+        if digest.hexdigest() != checksum.lower():
+            # The bytes stay in place but unrecorded; a retry overwrites them
+            raise UploadError(422, f"Checksum mismatch for chunk {index}")
+        await asyncio.to_thread(
+            lambda: self._connect().execute(
+                "INSERT OR REPLACE INTO chunks (upload_id, idx, sha256) VALUES (?, ?, ?)",
+                (upload_id, index, checksum.lower())
+            )
+        )
+        return {"upload_id": upload_id, "index": index, "size": written}
+
+    def finalize(self, upload_id: str) -> Dict[str, Any]:
+        """Check every chunk is in, then record the file's hash for later deduplication"""
+        status = self.status(upload_id)
+        if not status["complete"]:
+            missing = sorted(set(range(status["chunks"])) - set(status["received"]))
+            if missing:
+                raise UploadError(409, f"Missing chunks: {missing[:20]}")
+            upload = self._get(upload_id)
+            sha256 = documents.sha256(upload["path"])
+            if upload["sha256"] and upload["sha256"] != sha256:
+                raise UploadError(422, "File checksum does not match the sha256 given at create")
+            conn = self._connect()
+            conn.execute("UPDATE uploads SET status = ?, sha256 = ? WHERE id = ?",
+                         (COMPLETE, sha256, upload_id))
+            if upload["owner"]:
+                conn.execute(
+                    "INSERT OR REPLACE INTO contents (owner, sha256, size, path) VALUES (?, ?, ?, ?)",
+                    (upload["owner"], sha256, upload["size"], str(upload["path"]))
+                )
+            status["complete"] = True
+        return status
+
+    def resolve(self, upload_id: str) -> Dict[str, Any]:
+        """Path and original name of a finalized upload, for the tool endpoints"""
+        upload = self._get(upload_id)
+        if upload["status"] != COMPLETE:
+            raise UploadError(409, "Upload is not finalized")
+        if not upload["path"].exists():
+            raise UploadError(404, "Upload not found or expired")
+        return upload
+
+    def abort(self, upload_id: str):
+        upload = self._get(upload_id)
+        conn = self._connect()
+        conn.execute("DELETE FROM chunks WHERE upload_id = ?", (upload_id,))
+        conn.execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
+        try:
+            os.unlink(upload["path"])
+        except FileNotFoundError:
+            pass
+
+
+chunked_uploads = ChunkedUploads(os.environ.get("FLIPFILE_UPLOADS_DB", "uploads.db"), uploads)
+os.register_at_fork(after_in_child=chunked_uploads._after_fork)
+
+
+class CreateUploadRequest(BaseModel):
+    filename: str
+    size: int
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    sha256: Optional[str] = None  # lets the server skip the transfer if it has the content
+
+
+router = APIRouter()
+
+
+def _http_error(exc: UploadError) -> HTTPException:
+    return HTTPException(exc.status_code, str(exc))
+
+
+@router.post("/api/uploads")
+async def create_upload(body: CreateUploadRequest, request: Request):
+    """Start a resumable upload; returns its id and the chunk size to use
+
+    With sha256, a response that is already complete means the server holds
+    the content and the id can go straight to a tool endpoint.
+    """
+    try:
+        # SQLite writes, a hard link or allocating the file; none of it on the event loop
+        return await asyncio.to_thread(chunked_uploads.create, body.filename, body.size, body.chunk_size,
+                                       sha256=body.sha256, owner=client_key(request))
+    except UploadError as e:
+        raise _http_error(e)
+
+
+@router.get("/api/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    """Which chunks have arrived, for resuming after a dropped connection"""
+    try:
+        return await asyncio.to_thread(chunked_uploads.status, upload_id)
+    except UploadError as e:
+        raise _http_error(e)
+
+
+@router.put("/api/uploads/{upload_id}/chunks/{index}")
+async def put_chunk(upload_id: str, index: int, request: Request):
+    """Upload chunk `index` as the raw request body with its hex SHA-256 in X-Chunk-SHA256"""
+    checksum = request.headers.get("x-chunk-sha256")
+    if not checksum:
+        raise HTTPException(400, "X-Chunk-SHA256 header is required")
+    try:
+        return await chunked_uploads.write_chunk(upload_id, index, request.stream(), checksum)
+    except UploadError as e:
+        raise _http_error(e)
+
+
+@router.post("/api/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str):
+    """Mark an upload complete once every chunk is in; its id then works on the tool endpoints"""
+    try:
+        # Hashing the whole file would stall the event loop
+        return await asyncio.to_thread(chunked_uploads.finalize, upload_id)
+    except UploadError as e:
+        raise _http_error(e)
+
+
+@router.delete("/api/uploads/{upload_id}")
+async def abort_upload(upload_id: str):
+    try:
+        await asyncio.to_thread(chunked_uploads.abort, upload_id)
+    except UploadError as e:
+        raise _http_error(e)
+    return {"success": True}
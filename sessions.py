@@ -0,0 +1,221 @@
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Sessions idle for longer than this are dropped
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_SESSIONS = 10000
+
+# Set at login and register; every app sharing the session store reads it
+SESSION_COOKIE = "flipfile_session"
+
+
+class User:
+    """Compact per-session user record"""
+
+    __slots__ = ("user_id", "plan", "daily_tasks", "tasks_day", "created_at", "files")
+
+    def __init__(self, user_id: str, plan: str = "free", daily_tasks: int = 0,
+                 created_at: Optional[datetime] = None, tasks_day: str = ""):
+        self.user_id = user_id
+        self.plan = plan
+        self.daily_tasks = daily_tasks
+        self.tasks_day = tasks_day  # UTC day daily_tasks counts for
+        self.created_at = created_at or datetime.now()
+        self.files = []
+
+    def record_tasks(self, count: int):
+        """Add count tasks to today's total, starting over on a new UTC day"""
+        today = time.strftime("%Y-%m-%d", time.gmtime())
+        if self.tasks_day != today:
+            self.tasks_day, self.daily_tasks = today, 0
+        self.daily_tasks += count
+
+    @property
+    def max_file_size(self) -> int:
+        return 50 * MB if self.plan == "free" else 200 * MB
+
+
+class SessionStore(ABC):
+    """Interface shared by the session backends"""
+
+    @abstractmethod
+    def get(self, user_id: str) -> Optional[User]:
+        """The live session for user_id (extending its TTL), or None"""
+
+    @abstractmethod
+    def save(self, user: User):
+        """Create or update a session and restart its TTL"""
+
+    @abstractmethod
+    def delete(self, user_id: str):
+        """Drop a session if it exists"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of live sessions"""
+
+    def __contains__(self, user_id: str) -> bool:
+        return self.get(user_id) is not None
+
+
+class MemorySessionStore(SessionStore):
+    """In-process LRU with a sliding TTL; the default for a single worker"""
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS, ttl: float = DEFAULT_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        # user_id -> (expires_at, user), least recently used first
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[User]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < now:
+                del self._sessions[user_id]
+                return None
+            self._sessions[user_id] = (now + self.ttl, entry[1])
+            self._sessions.move_to_end(user_id)
+            return entry[1]
+
+    def save(self, user: User):
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[user.user_id] = (now + self.ttl, user)
+            self._sessions.move_to_end(user.user_id)
+            self._evict(now)
+
+    def _evict(self, now: float):
+        # Expired entries cluster at the LRU end, so stop at the first live one
+        while self._sessions:
+            user_id, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at >= now and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[user_id]
+
+    def delete(self, user_id: str):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict(time.monotonic())
+            return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite file so every worker on the host sees the same users"""
+
+    def __init__(self, path: str, ttl: float = DEFAULT_TTL, max_sessions: int = DEFAULT_MAX_SESSIONS):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " user_id TEXT PRIMARY KEY, plan TEXT NOT NULL,"
+                " daily_tasks INTEGER NOT NULL, created_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL, tasks_day TEXT NOT NULL DEFAULT '')"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(sessions)")]
+            if "tasks_day" not in columns:
+                # Files written before daily_tasks was reset per day
+                conn.execute("ALTER TABLE sessions ADD COLUMN tasks_day TEXT NOT NULL DEFAULT ''")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (expires_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, user_id: str) -> Optional[User]:
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT plan, daily_tasks, created_at, tasks_day FROM sessions"
+            " WHERE user_id = ? AND expires_at >= ?",
+            (user_id, now)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE sessions SET expires_at = ? WHERE user_id = ?", (now + self.ttl, user_id))
+        return User(user_id, plan=row[0], daily_tasks=row[1],
+                    created_at=datetime.fromtimestamp(row[2]), tasks_day=row[3])
+
+    def save(self, user: User):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO sessions (user_id, plan, daily_tasks, tasks_day, created_at, expires_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(user_id) DO UPDATE SET plan = excluded.plan,"
+            " daily_tasks = excluded.daily_tasks, tasks_day = excluded.tasks_day,"
+            " expires_at = excluded.expires_at",
+            (user.user_id, user.plan, user.daily_tasks, user.tasks_day,
+             user.created_at.timestamp(), now + self.ttl)
+        )
+        # Purging on every write would serialize workers on the table; amortize it
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._evict(now)
+
+    def _evict(self, now: float):
+        conn = self._connect()
+        conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+        conn.execute(
+            "DELETE FROM sessions WHERE user_id IN ("
+            " SELECT user_id FROM sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+    def delete(self, user_id: str):
+        self._connect().execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def __len__(self) -> int:
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires_at >= ?", (time.time(),)
+        ).fetchone()
+        return row[0]
+
+
+def session_user(store: SessionStore, request, user_id: Optional[str] = None) -> Optional[User]:
+    """The caller's live session: from user_id when given, else the session cookie"""
+    user_id = user_id or request.cookies.get(SESSION_COOKIE)
+    return store.get(user_id) if user_id else None
+
+
+def create_session_store() -> SessionStore:
+    """Pick the backend from FLIPFILE_SESSION_STORE: "memory" (default) or "sqlite:<path>" """
+    spec = os.environ.get("FLIPFILE_SESSION_STORE", "memory")
+    ttl = float(os.environ.get("FLIPFILE_SESSION_TTL", DEFAULT_TTL))
+    max_sessions = int(os.environ.get("FLIPFILE_MAX_SESSIONS", DEFAULT_MAX_SESSIONS))
+
+    if spec.startswith("sqlite:"):
+        path = spec[len("sqlite:"):]
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        logger.info(f"Using SQLite session store at {path}")
+        return SQLiteSessionStore(path, ttl=ttl, max_sessions=max_sessions)
+    if spec != "memory":
+        raise ValueError(f"Unknown session store: {spec}")
+    return MemorySessionStore(max_sessions=max_sessions, ttl=ttl)
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from documents import documents
+from jobs import decode, encode
+from stats import stats
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_file(digest, path: Path):
+    # The content hash is shared with the inspection index, so it's read once per input
+    digest.update(documents.sha256(path).encode("ascii"))
+    password = documents.password(path)
+    if password is not None:
+        # A wrong password must not join (or reuse) a call made with the right one
+        digest.update(b"\0password=" + hashlib.sha256(password.encode("utf-8")).digest())
+
+
+def request_key(tool: str, kwargs: Dict[str, Any]) -> str:
+    """Content hash of the input file(s) plus the call's other parameters
+
+    Upload paths are random per request, so files are keyed by what is in
+    them rather than where they are.
+    """
+    digest = hashlib.sha256(tool.encode("utf-8"))
+    for name, value in sorted(kwargs.items()):
+        digest.update(f"\0{name}=".encode("utf-8"))
+        paths = value if isinstance(value, (list, tuple)) and value and isinstance(value[0], Path) else None
+        if isinstance(value, Path):
+            _hash_file(digest, value)
+        elif paths:
+            for path in paths:
+                _hash_file(digest, path)
+                digest.update(b"\0")
+        else:
+            digest.update(json.dumps(value, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _outputs_exist(result: Any) -> bool:
+    """A remembered result is only reusable while its output files are still there"""
+    if isinstance(result, Path):
+        return result.exists()
+    if isinstance(result, list):
+        return all(_outputs_exist(item) for item in result)
+    return True
+
+
+class SQLiteFlightStore:
+    """Shared record of in-flight and just-finished calls, so workers join each other's work"""
+
+    def __init__(self, path: str, lease: float = 60.0):
+        self.path = path
+        self.lease = lease
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS flights ("
+                " key TEXT PRIMARY KEY, owner TEXT NOT NULL, status TEXT NOT NULL,"
+                " result TEXT, error TEXT, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, key: str, owner: str) -> Tuple[str, Any]:
+        """("lead", None) to do the work, ("done", result), ("failed", error) or ("wait", None)"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT status, result, error, expires_at FROM flights WHERE key = ?",
+                               (key,)).fetchone()
+            if row is not None and row[3] > now:
+                conn.execute("COMMIT")
+                if row[0] == "done":
+                    return "done", decode(row[1])
+                if row[0] == "failed":
+                    return "failed", row[2]
+                return "wait", None
+            # Nothing recorded, or the leader's lease / the result's linger ran out
+            conn.execute(
+                "INSERT OR REPLACE INTO flights (key, owner, status, expires_at) VALUES (?, ?, 'running', ?)",
+                (key, owner, now + self.lease)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return "lead", None
+
+    def extend(self, key: str, owner: str):
+        self._connect().execute(
+            "UPDATE flights SET expires_at = ? WHERE key = ? AND owner = ? AND status = 'running'",
+            (time.time() + self.lease, key, owner)
+        )
+
+    def finish(self, key: str, owner: str, linger: float, result: Any = None, error: Optional[str] = None):
+        self._connect().execute(
+            "UPDATE flights SET status = ?, result = ?, error = ?, expires_at = ? WHERE key = ? AND owner = ?",
+            ("failed" if error is not None else "done", None if error is not None else encode(result),
+             error, time.time() + linger, key, owner)
+        )
+
+    def forget(self, key: str):
+        self._connect().execute("DELETE FROM flights WHERE key = ?", (key,))
+
+
+class SingleFlight:
+    """Collapse concurrent identical calls into one computation
+
+    Callers with the same key attach to the call already in progress and get
+    its result (or its exception). Results are also reused for `linger`
+    seconds afterwards while their output files exist, since bursts on a hot
+    document arrive over a few seconds rather than all at once. With a shared
+    store the same holds across worker processes.
+    """
+
+    def __init__(self, store: Optional[SQLiteFlightStore] = None, linger: float = 30.0,
+                 poll: float = 0.1):
+        self.store = store
+        self.linger = linger
+        self.poll = poll
+        self.owner = f"{os.getpid()}"
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._recent: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        recent = self._recent.get(key)
+        if recent is not None and recent[0] > time.monotonic() and _outputs_exist(recent[1]):
+            stats.cache("singleflight", hit=True)
+            return recent[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            stats.cache("singleflight", hit=True)
+        else:
+            # The work runs as its own task so that the first caller going
+            # away (client disconnect) doesn't cancel it for everyone else
+            task = asyncio.ensure_future(self._run(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self.store is None:
+            stats.cache("singleflight", hit=False)
+            return await fn()
+        return await self._do_shared(key, fn)
+
+    def _finished(self, key: str, task: asyncio.Future):
+        del self._inflight[key]
+        if task.cancelled():
+            return
+        # Retrieving the exception keeps asyncio from logging it when every caller left
+        if task.exception() is None:
+            self._remember(key, task.result())
+
+    def _remember(self, key: str, result: Any):
+        now = time.monotonic()
+        self._recent[key] = (now + self.linger, result)
+        self._recent.move_to_end(key)
+        while self._recent and next(iter(self._recent.values()))[0] <= now:
+            self._recent.popitem(last=False)
+
+    async def _do_shared(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        joined = False
+        while True:
+            state, value = await asyncio.to_thread(self.store.acquire, key, self.owner)
+            if state == "done" and _outputs_exist(value):
+                stats.cache("singleflight", hit=True)
+                return value
+            if state == "failed" and joined:
+                raise RuntimeError(value)
+            if state == "wait":
+                joined = True
+                await asyncio.sleep(self.poll)
+                continue
+            if state != "lead":
+                # Stale result whose files are gone, or an old failure: start over
+                await asyncio.to_thread(self.store.forget, key)
+                continue
+            break
+
+        if not joined:
+            stats.cache("singleflight", hit=False)
+        # Tools block the event loop, so the lease is renewed from a thread
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(self.store.lease / 3):
+                self.store.extend(key, self.owner)
+
+        threading.Thread(target=heartbeat, daemon=True).start()
+        try:
+            result = await fn()
+        except BaseException as e:
+            # Followers on other workers see the failure rather than waiting out the lease
+            self.store.finish(key, self.owner, 5.0, error=str(e) or type(e).__name__)
+            raise
+        finally:
+            done.set()
+        await asyncio.to_thread(self.store.finish, key, self.owner, self.linger, result=result)
+        return result
+
+
+def create_single_flight() -> SingleFlight:
+    """In-process only by default; FLIPFILE_SINGLEFLIGHT=sqlite:<path> shares it across workers"""
+    spec = os.environ.get("FLIPFILE_SINGLEFLIGHT", "")
+    if not spec:
+        return SingleFlight()
+    if not spec.startswith("sqlite:"):
+        raise ValueError(f"Unknown single-flight store: {spec}")
+    return SingleFlight(SQLiteFlightStore(spec[len("sqlite:"):]))
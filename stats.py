@@ -0,0 +1,243 @@
+import atexit
+import contextvars
+import functools
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from documents import documents
+
+logger = logging.getLogger(__name__)
+
+# Counter names; each is kept per label (tool name or cache name)
+FILES_PROCESSED = "files_processed"
+FAILURES = "failures"
+BYTES_IN = "bytes_in"
+BYTES_OUT = "bytes_out"
+CACHE_HITS = "cache_hits"
+CACHE_MISSES = "cache_misses"
+
+_in_job = contextvars.ContextVar("stats_in_job", default=False)
+
+
+def _size(value) -> int:
+    """Total size of a path or a list of paths (in-memory inputs included); anything else counts as 0"""
+    if isinstance(value, (list, tuple)):
+        return sum(_size(item) for item in value)
+    if isinstance(value, (str, Path)):
+        try:
+            return documents.size(value)
+        except OSError:
+            return 0
+    return 0
+
+
+class ServiceStats:
+    """Service-wide counters that stay O(1) to read
+
+    Each worker accumulates deltas in memory and a background thread adds them
+    to a shared SQLite file every flush_interval seconds, then reads back the
+    totals of all workers. Reads combine those totals with the local deltas
+    not yet flushed, so they never touch the disk.
+    """
+
+    def __init__(self, path: Optional[str] = None, flush_interval: float = 10.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], float] = defaultdict(float)
+        self._totals: Dict[Tuple[str, str], float] = {}
+        self._active = 0
+        self._other_active = 0
+        self._flusher = None
+        self._conn = None
+
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._connect()
+            self._read_totals()
+            atexit.register(self.flush)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Only the flusher thread (and atexit) touch the connection after setup
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                " name TEXT NOT NULL, label TEXT NOT NULL, value REAL NOT NULL,"
+                " PRIMARY KEY (name, label))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS workers ("
+                " pid INTEGER PRIMARY KEY, active INTEGER NOT NULL, heartbeat REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def add(self, name: str, label: str, value: float = 1):
+        with self._lock:
+            self._pending[(name, label)] += value
+        self._ensure_flusher()
+
+    def record(self, tool: str, bytes_in: int = 0, bytes_out: int = 0, ok: bool = True):
+        """Count one finished job of a tool"""
+        with self._lock:
+            if ok:
+                self._pending[(FILES_PROCESSED, tool)] += 1
+                self._pending[(BYTES_IN, tool)] += bytes_in
+                self._pending[(BYTES_OUT, tool)] += bytes_out
+            else:
+                self._pending[(FAILURES, tool)] += 1
+        self._ensure_flusher()
+
+    def cache(self, name: str, hit: bool):
+        self.add(CACHE_HITS if hit else CACHE_MISSES, name)
+
+    def job_started(self):
+        with self._lock:
+            self._active += 1
+
+    def job_finished(self):
+        with self._lock:
+            self._active -= 1
+
+    def _after_fork(self):
+        # The parent's deltas, lock, SQLite handle and flusher thread are not ours
+        self._lock = threading.Lock()
+        self._pending = defaultdict(float)
+        self._active = 0
+        self._flusher = None
+        self._conn = None
+
+    def _ensure_flusher(self):
+        if self.path and self._flusher is None:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name="stats-flush", daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing stats: {e}")
+
+    def flush(self):
+        """Add local deltas to the shared totals and refresh the cached totals"""
+        if not self.path:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+            active = self._active
+
+        conn = self._connect()
+        now = time.time()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO counters (name, label, value) VALUES (?, ?, ?)"
+                " ON CONFLICT(name, label) DO UPDATE SET value = value + excluded.value",
+                [(name, label, value) for (name, label), value in pending.items()]
+            )
+            conn.execute("INSERT OR REPLACE INTO workers (pid, active, heartbeat) VALUES (?, ?, ?)",
+                         (os.getpid(), active, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            # Put the deltas back so they go out with the next flush
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending[key] += value
+            raise
+        self._read_totals(now)
+
+    def _read_totals(self, now: Optional[float] = None):
+        conn = self._connect()
+        now = now or time.time()
+        totals = {(name, label): value for name, label, value in
+                  conn.execute("SELECT name, label, value FROM counters")}
+        # Workers that missed a few heartbeats are gone; ignore their active jobs
+        other_active = conn.execute(
+            "SELECT COALESCE(SUM(active), 0) FROM workers WHERE pid != ? AND heartbeat > ?",
+            (os.getpid(), now - 3 * self.flush_interval)
+        ).fetchone()[0]
+        with self._lock:
+            self._totals = totals
+            self._other_active = other_active
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current totals across all workers"""
+        with self._lock:
+            combined = dict(self._totals)
+            for key, value in self._pending.items():
+                combined[key] = combined.get(key, 0) + value
+            active = self._active + self._other_active
+
+        grouped: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for (name, label), value in combined.items():
+            grouped[name][label] = int(value)
+
+        caches = {}
+        for name in set(grouped[CACHE_HITS]) | set(grouped[CACHE_MISSES]):
+            hits = grouped[CACHE_HITS].get(name, 0)
+            misses = grouped[CACHE_MISSES].get(name, 0)
+            caches[name] = {"hits": hits, "misses": misses,
+                            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0}
+
+        return {
+            "total_files_processed": sum(grouped[FILES_PROCESSED].values()),
+            "files_processed": dict(grouped[FILES_PROCESSED]),
+            "failures": dict(grouped[FAILURES]),
+            "bytes_in": dict(grouped[BYTES_IN]),
+            "bytes_out": dict(grouped[BYTES_OUT]),
+            "active_jobs": active,
+            "caches": caches,
+            "uptime_seconds": int(time.time() - self.started_at),
+        }
+
+
+def counted(tool: str):
+    """Decorator for a tool's async entry point: counts the job, its bytes and failures
+
+    The first argument after self is taken as the input path(s) and the return
+    value as the output path(s). A counted call made from inside another one
+    (convert delegating to images_to_pdf) is not counted again.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            if _in_job.get():
+                return await func(self, *args, **kwargs)
+
+            inputs = args[0] if args else kwargs.get("input_path", kwargs.get("image_paths"))
+            token = _in_job.set(True)
+            stats.job_started()
+            try:
+                result = await func(self, *args, **kwargs)
+            except Exception:
+                stats.record(tool, ok=False)
+                raise
+            finally:
+                stats.job_finished()
+                _in_job.reset(token)
+            stats.record(tool, _size(inputs), _size(result))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+# Process-wide stats; FLIPFILE_STATS_DB="" keeps them in memory only
+stats = ServiceStats(os.environ.get("FLIPFILE_STATS_DB", "stats.db") or None)
+os.register_at_fork(after_in_child=stats._after_fork)
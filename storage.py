@@ -0,0 +1,355 @@
+import fcntl
+import hashlib
+import hmac
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+import logging
+from typing import Callable, Iterable, List, Optional
+from urllib.parse import quote, urlencode
+
+logger = logging.getLogger(__name__)
+
+# Files nobody scheduled for earlier deletion are removed after this long
+DEFAULT_TTL = 24 * 3600
+
+
+class ExpiryIndex:
+    """SQLite table of stored paths and when they expire
+
+    Cleanup asks the index for what is due instead of walking and stat()ing
+    every file, so its cost follows the number of expired files rather than
+    the number stored. The file is shared by every worker on the host.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS expiry ("
+                " path TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS expiry_due ON expiry (expires_at)")
+            self._local.conn = conn
+        return conn
+
+    def _after_fork(self):
+        # A connection opened before a fork belongs to the parent
+        self._local = threading.local()
+
+    def set(self, paths: Iterable[Path], seconds: float):
+        """(Re)schedule paths to expire the given number of seconds from now"""
+        expires_at = time.time() + seconds
+        self._connect().executemany(
+            "INSERT OR REPLACE INTO expiry (path, expires_at) VALUES (?, ?)",
+            [(str(path), expires_at) for path in paths]
+        )
+
+    def pop_due(self, limit: int = 1000) -> List[str]:
+        """Remove and return up to limit paths whose time has come"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT path FROM expiry WHERE expires_at <= ? ORDER BY expires_at LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+            conn.executemany("DELETE FROM expiry WHERE path = ?", rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return [row[0] for row in rows]
+
+
+class ShardedStorage:
+    """A directory whose files are spread over hashed subdirectories
+
+    A name always maps to the same shard (root/ab/name for a 2-character
+    shard), so lookups need no listing and no directory grows past a few
+    thousand entries.
+    """
+
+    def __init__(self, root: str, index: ExpiryIndex, shard_chars: int = 2,
+                 default_ttl: float = DEFAULT_TTL):
+        self.root = Path(root)
+        self.index = index
+        self.shard_chars = shard_chars
+        self.default_ttl = default_ttl
+
+    def _shard(self, name: str) -> Path:
+        digest = hashlib.md5(name.encode("utf-8")).hexdigest()
+        return self.root / digest[:self.shard_chars]
+
+    def path_for(self, name: str, ttl: Optional[float] = None) -> Path:
+        """Where to write a new file called name; the path is indexed for expiry"""
+        shard = self._shard(name)
+        shard.mkdir(parents=True, exist_ok=True)
+        path = shard / name
+        try:
+            # Writers get a fresh file; an older one by this name may share
+            # its data with an input (see link_or_copy)
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        self.index.set([path], self.default_ttl if ttl is None else ttl)
+        return path
+
+    def locate(self, name: str) -> Optional[Path]:
+        """Existing file called name, or None; also finds files from the flat layout"""
+        if not name or name != os.path.basename(name) or name.startswith("."):
+            return None
+        for path in (self._shard(name) / name, self.root / name):
+            if path.is_file():
+                return path
+        return None
+
+    def sweep_flat(self, max_age: float) -> int:
+        """Delete top-level files older than max_age left over from the flat layout
+
+        Only the root itself is listed (one scandir), not the shards, so this
+        costs nothing once the old files are gone.
+        """
+        return sweep_directory(self.root, max_age)
+
+
+def sweep_directory(directory: Path, max_age: float) -> int:
+    """Delete files directly inside directory that are older than max_age"""
+    cutoff = time.time() - max_age
+    removed = 0
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return 0
+    with entries:
+        for entry in entries:
+            try:
+                if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+            except OSError as e:
+                logger.error(f"Error cleaning up file {entry.path}: {e}")
+    return removed
+
+
+FICLONE = 0x40049409  # from linux/fs.h
+
+
+def link_or_copy(source: Path, target: Path) -> str:
+    """Give target the same content as source, sharing the data when the filesystem allows
+
+    A hard link first (uploads and processed normally share a filesystem),
+    then a copy-on-write clone, and a plain copy only if neither works.
+    Stored files are never modified in place, so sharing them is safe; each
+    name still expires on its own. Returns "link", "reflink" or "copy".
+    """
+    try:
+        os.unlink(target)  # a failed tool may have left a partial output
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(source, target)
+        return "link"
+    except OSError:
+        pass
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return "reflink"
+        except OSError:
+            shutil.copyfileobj(src, dst)
+            return "copy"
+
+
+def expire(paths: Iterable[Path], seconds: float):
+    """Schedule paths (files or directories) for deletion"""
+    index.set(paths, seconds)
+
+
+def purge_expired() -> int:
+    """Delete everything the index says is due; returns the number of paths removed"""
+    removed = 0
+    while True:
+        due = index.pop_due()
+        for path in due:
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Cleanup error for {path}: {e}")
+        if len(due) < 1000:
+            return removed
+
+
+def start_reaper(interval: float = 60.0, also: Iterable[Callable[[], int]] = ()) -> threading.Thread:
+    """Run purge_expired, then each of also (e.g. the rows that pointed at
+    the files), every interval seconds on a daemon thread"""
+    also = list(also)
+
+    def reap():
+        while True:
+            time.sleep(interval)
+            try:
+                removed = purge_expired()
+                if removed:
+                    logger.info(f"Cleaned up {removed} expired file(s)")
+            except Exception as e:
+                logger.error(f"Error purging expired files: {e}")
+            for purge in also:
+                try:
+                    purge()
+                except Exception as e:
+                    logger.error(f"Error purging expired records: {e}")
+
+    thread = threading.Thread(target=reap, name="storage-reaper", daemon=True)
+    thread.start()
+    return thread
+
+
+class LocalObjectStore:
+    """Outputs stay in this node's processed/ storage and download through the API
+
+    With a secret configured, URLs are signed and expire, and unsigned
+    downloads are refused; without one they are plain /api/download links.
+    """
+
+    def __init__(self, storage: ShardedStorage, secret: Optional[str] = None):
+        self.storage = storage
+        self.secret = secret.encode("utf-8") if secret else None
+
+    @property
+    def remote(self) -> bool:
+        return False
+
+    def put(self, path: Path, key: Optional[str] = None) -> str:
+        """Publish a finished output; returns its key"""
+        key = key or path.name
+        if self.storage.locate(key) != path:
+            # Outputs written elsewhere are moved under processed/ so they can be found
+            target = self.storage.path_for(key)
+            shutil.move(str(path), target)
+        return key
+
+    def _signature(self, key: str, expires: int) -> str:
+        return hmac.new(self.secret, f"{key}:{expires}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def url(self, key: str, expires_in: int = 3600) -> str:
+        base = f"/api/download/{quote(key)}"
+        if not self.secret:
+            return base
+        expires = int(time.time()) + expires_in
+        return f"{base}?{urlencode({'expires': expires, 'signature': self._signature(key, expires)})}"
+
+    def verify(self, key: str, expires: Optional[int], signature: Optional[str]) -> bool:
+        """Check a download URL's signature; always true when signing is off"""
+        if not self.secret:
+            return True
+        if expires is None or signature is None or expires < time.time():
+            return False
+        return hmac.compare_digest(signature, self._signature(key, expires))
+
+
+class S3ObjectStore:
+    """Outputs uploaded to an S3-compatible bucket and downloaded by presigned URL
+
+    Works against AWS S3 or a local stand-in (MinIO, moto server) through
+    endpoint_url. Credentials come from the usual AWS environment variables.
+    Objects are not deleted by the reaper; give the prefix a lifecycle rule.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, part_size: int = 8 * 1024 * 1024, client=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_size = part_size
+        if client is None:
+            import boto3
+
+            client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.client = client
+
+    @property
+    def remote(self) -> bool:
+        return True
+
+    def put(self, path: Path, key: Optional[str] = None) -> str:
+        """Upload a finished output, in parts when it is large; returns its key"""
+        key = key or path.name
+        object_key = self.prefix + key
+        size = os.path.getsize(path)
+
+        if size <= self.part_size:
+            with open(path, "rb") as f:
+                self.client.put_object(Bucket=self.bucket, Key=object_key, Body=f)
+            return key
+
+        # Stream part by part so memory use is one part, whatever the file size
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=object_key)["UploadId"]
+        try:
+            parts = []
+            with open(path, "rb") as f:
+                number = 1
+                while True:
+                    chunk = f.read(self.part_size)
+                    if not chunk:
+                        break
+                    response = self.client.upload_part(Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                                                       PartNumber=number, Body=chunk)
+                    parts.append({"PartNumber": number, "ETag": response["ETag"]})
+                    number += 1
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                                                  MultipartUpload={"Parts": parts})
+        except Exception:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=object_key, UploadId=upload_id)
+            raise
+        return key
+
+    def url(self, key: str, expires_in: int = 3600) -> str:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self.prefix + key,
+                    "ResponseContentDisposition": f'attachment; filename="{key}"'},
+            ExpiresIn=expires_in
+        )
+
+    def verify(self, key: str, expires: Optional[int], signature: Optional[str]) -> bool:
+        # Downloads go straight to the bucket; the API only redirects
+        return True
+
+
+def create_object_store():
+    """Pick the output backend from FLIPFILE_OBJECT_STORE: "local" (default) or "s3://bucket/prefix" """
+    spec = os.environ.get("FLIPFILE_OBJECT_STORE", "local")
+    if spec.startswith("s3://"):
+        bucket, _, prefix = spec[len("s3://"):].partition("/")
+        if prefix and not prefix.endswith("/"):
+            prefix += "/"
+        logger.info(f"Publishing outputs to s3://{bucket}/{prefix}")
+        return S3ObjectStore(bucket, prefix=prefix,
+                             endpoint_url=os.environ.get("FLIPFILE_S3_ENDPOINT") or None,
+                             region=os.environ.get("AWS_REGION") or None)
+    if spec != "local":
+        raise ValueError(f"Unknown object store: {spec}")
+    return LocalObjectStore(processed, secret=os.environ.get("FLIPFILE_URL_SECRET") or None)
+
+
+index = ExpiryIndex(os.environ.get("FLIPFILE_STORAGE_INDEX", "storage-index.db"))
+os.register_at_fork(after_in_child=index._after_fork)
+uploads = ShardedStorage("uploads", index)
+processed = ShardedStorage("processed", index)
+objects = create_object_store()
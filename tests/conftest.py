@@ -0,0 +1,69 @@
+import importlib.util
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+# The stores open their databases and directories in the working directory
+os.chdir(tempfile.mkdtemp(prefix="flipfile-tests-"))
+
+from bench.layout import write_layout  # noqa: E402  (needs REPO_ROOT on sys.path)
+
+# The app imports tools.<name>; set up before any test starts the shared
+# process pool, whose workers must be able to import them too
+sys.path.insert(0, str(write_layout(Path(tempfile.mkdtemp(prefix="flipfile-layout-")))))
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    """foo2-main.py loaded as it is deployed, with its tools/ package"""
+    spec = importlib.util.spec_from_file_location("flipfile_app", REPO_ROOT / "foo2-main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def main_module():
+    """main.py, the account and bulk-upload app"""
+    spec = importlib.util.spec_from_file_location("flipfile_main", REPO_ROOT / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def client(app_module, monkeypatch):
+    from fastapi.testclient import TestClient
+    from ratelimit import RateLimiter
+
+    # Each test gets a fresh budget
+    monkeypatch.setattr(app_module, "rate_limiter", RateLimiter())
+    return TestClient(app_module.app)
+
+
+DATA = Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def encrypted_pdf(tmp_path):
+    """Make an encrypted copy of data/plain.pdf: make(R, user="", aes=..., save={...}) -> path"""
+    import pikepdf
+
+    def make(revision, user="", owner="owner", name=None, save=None, **options):
+        if revision < 4:
+            options.setdefault("aes", False)
+        if not options.get("aes", True):
+            options.setdefault("metadata", False)  # pikepdf only encrypts metadata with AES
+        path = tmp_path / (name or f"r{revision}.pdf")
+        with pikepdf.open(DATA / "plain.pdf") as pdf:
+            pdf.save(path, encryption=pikepdf.Encryption(R=revision, user=user, owner=owner, **options),
+                     **(save or {}))
+        return path
+
+    return make
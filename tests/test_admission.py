@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, WeightedSemaphore
+
+
+def test_semaphore_is_fifo_so_large_jobs_are_not_starved():
+    async def scenario():
+        semaphore = WeightedSemaphore(10)
+        await semaphore.acquire(6)
+        order = []
+
+        async def job(name, weight):
+            await semaphore.acquire(weight)
+            order.append(name)
+
+        large = asyncio.create_task(job("large", 10))
+        await asyncio.sleep(0)
+        small = asyncio.create_task(job("small", 1))
+        await asyncio.sleep(0)
+        # 4 units are free, but the small job waits behind the large one
+        assert order == []
+
+        semaphore.release(6)
+        await large
+        assert order == ["large"]
+        semaphore.release(10)
+        await small
+        return order
+
+    assert asyncio.run(scenario()) == ["large", "small"]
+
+
+def test_cancelled_waiter_does_not_leak_units():
+    async def scenario():
+        semaphore = WeightedSemaphore(4)
+        await semaphore.acquire(4)
+        waiter = asyncio.create_task(semaphore.acquire(2))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        semaphore.release(4)
+        return semaphore.available, semaphore.waiting
+
+    assert asyncio.run(scenario()) == (4, 0)
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        controller = AdmissionController({"compress": 2}, max_waiting=1, max_wait=5)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit("compress", 2):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as rejected:
+            controller.check("compress")
+        release.set()
+        await asyncio.gather(holder, queued)
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.operation == "compress"
+    assert 1 <= rejected.retry_after <= 60
+
+
+def test_wait_timeout_is_a_rejection():
+    async def scenario():
+        controller = AdmissionController({"edit": 1}, max_wait=0.05)
+        async with controller.admit("edit", 1):
+            with pytest.raises(AdmissionRejected):
+                async with controller.admit("edit", 1):
+                    pass
+
+    asyncio.run(scenario())
+
+
+def test_job_larger_than_capacity_runs_alone():
+    async def scenario():
+        controller = AdmissionController({"protect": 3})
+        async with controller.admit("protect", 50):
+            return controller._semaphores["protect"].available
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_render_cost_scales_with_pages_and_dpi(tmp_path):
+    import fitz
+
+    path = tmp_path / "pages.pdf"
+    with fitz.open() as doc:
+        for _ in range(20):
+            doc.new_page()
+        doc.save(path)
+
+    controller = AdmissionController()
+    assert controller.estimate_cost([path], "compress") == 1
+    assert controller.estimate_cost([path], "convert", "docx") == 1
+    assert controller.estimate_cost([path], "convert", "png", dpi=150) == 20
+    assert controller.estimate_cost([path], "convert", "png", dpi=300) == 80
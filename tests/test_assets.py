@@ -0,0 +1,56 @@
+import os
+import time
+
+from assets import StaticAssets
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_changed_file_is_rebuilt_off_the_request_path(tmp_path):
+    path = tmp_path / "style.css"
+    path.write_text("body { color: red; }\n" * 100)
+    assets = StaticAssets(tmp_path, ["style.css"], reload_interval=0.01)
+    old = assets._assets["style.css"]
+    _wait_for(lambda: "gzip" in old.variants)
+
+    path.write_text("body { color: blue; }\n" * 100)
+    os.utime(path, ns=(old.mtime_ns + 10**9, old.mtime_ns + 10**9))
+    time.sleep(0.02)
+    assets._maybe_reload()
+    # The request that noticed the change is served the complete old version
+    assert assets._assets["style.css"] is old
+
+    _wait_for(lambda: assets._assets["style.css"] is not old)
+    new = assets._assets["style.css"]
+    assert new.etag != old.etag
+    assert {"identity", "gzip"} <= set(new.variants)
+    assert b"blue" in new.variants["identity"][0]
+    _wait_for(lambda: not assets._reloading)
+
+
+def test_page_loads_its_stylesheet_and_script_from_the_cached_route(app_module, client, monkeypatch):
+    import re
+    from pathlib import Path
+
+    root = Path(__file__).resolve().parent.parent
+    assets = StaticAssets(root, ["index.html", "style.css", "main.js"], reload_interval=0)
+    _wait_for(lambda: all("gzip" in asset.variants for asset in assets._assets.values()))
+    monkeypatch.setattr(app_module, "assets", assets)
+
+    page = client.get("/")
+    assert page.headers["cache-control"] == "no-cache"
+    # Relative, so the same page works from the app and from the GitHub Pages root
+    linked = re.findall(r'(?:href|src)="([^":]+\.(?:css|js))"', page.text)
+    assert sorted(linked) == ["main.js", "style.css"]
+    for url in ["/" + name for name in linked] + ["/static/" + name for name in linked]:
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["cache-control"] == "public, max-age=3600"
+        revalidated = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]})
+        assert revalidated.status_code == 304
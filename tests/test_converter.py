@@ -0,0 +1,123 @@
+import asyncio
+
+import fitz
+import pytest
+from pptx import Presentation
+
+from converter import PDFConverter
+
+
+def _pdf(path, pages):
+    """A PDF whose pages are blank (identical) except where text is given"""
+    with fitz.open() as doc:
+        for text in pages:
+            page = doc.new_page(width=400, height=300)
+            if text:
+                page.insert_text((50, 150), text, fontsize=24)
+        doc.save(path)
+    return path
+
+
+@pytest.mark.parametrize("chunk", [16, 2])  # one thread render, and several pool chunks
+def test_slides_follow_pages_and_identical_pages_share_an_image(tmp_path, chunk):
+    pdf = _pdf(tmp_path / "deck.pdf", ["", "cover", "", "", "end"])
+    converter = PDFConverter()
+    converter.slide_render_chunk = chunk
+
+    output = asyncio.run(converter._pdf_to_powerpoint(pdf, tmp_path / "deck.pptx", None, "low"))
+
+    prs = Presentation(output)
+    assert len(prs.slides) == 5
+    images = [slide.shapes[0].image for slide in prs.slides]
+    assert len({image.sha1 for image in images}) == 3
+    parts = {part.partname for part in prs.part.package.iter_parts() if part.partname.startswith("/ppt/media/")}
+    assert len(parts) == 3
+
+
+def test_a_failed_chunk_cancels_the_others(tmp_path, monkeypatch):
+    import converter as converter_module
+
+    pdf = _pdf(tmp_path / "deck.pdf", ["one", "two", "three", "four", "five", "six"])
+    started = []
+
+    async def run_in_pool(fn, path, chunk, *args):
+        started.append(asyncio.current_task())
+        if chunk[0] == 0:
+            raise RuntimeError("render failed")
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(converter_module, "run_in_pool", run_in_pool)
+    converter = PDFConverter()
+    converter.slide_render_chunk = 2
+
+    async def convert():
+        with pytest.raises(RuntimeError):
+            await converter._pdf_to_powerpoint(pdf, tmp_path / "deck.pptx", None, "low")
+        await asyncio.sleep(0)
+        return started
+
+    tasks = asyncio.run(convert())
+    assert len(tasks) == 3
+    assert all(task.done() for task in tasks)
+    assert [task.cancelled() for task in tasks] == [False, True, True]
+
+
+def test_selected_pages_only(tmp_path):
+    pdf = _pdf(tmp_path / "deck.pdf", ["one", "two", "three"])
+
+    output = asyncio.run(PDFConverter()._pdf_to_powerpoint(pdf, tmp_path / "deck.pptx", [1, 3], "low"))
+
+    assert len(Presentation(output).slides) == 2
+
+
+def _jpeg(path, size=(60, 40), orientation=None):
+    from PIL import Image
+
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    Image.new("RGB", size, (200, 30, 30)).save(path, "JPEG", exif=exif)
+    return path
+
+
+def _images_pdf(tmp_path, images, page_size="image"):
+    import pikepdf
+
+    output = asyncio.run(PDFConverter().images_to_pdf(images, tmp_path / "out.pdf", page_size))
+    return pikepdf.open(output)
+
+
+def test_jpegs_are_embedded_byte_for_byte(tmp_path):
+    jpeg = _jpeg(tmp_path / "a.jpg")
+
+    with _images_pdf(tmp_path, [jpeg]) as pdf:
+        image = pdf.pages[0].Resources.XObject.Im0
+        assert image.Filter == "/DCTDecode"
+        assert image.read_raw_bytes() == jpeg.read_bytes()
+
+
+@pytest.mark.parametrize("orientation, box", [(1, [0, 0, 60, 40]), (3, [0, 0, 60, 40]),
+                                              (6, [0, 0, 40, 60]), (8, [0, 0, 40, 60])])
+def test_exif_rotation_is_applied_by_the_page_not_the_pixels(tmp_path, orientation, box):
+    jpeg = _jpeg(tmp_path / "a.jpg", orientation=orientation)
+
+    with _images_pdf(tmp_path, [jpeg]) as pdf:
+        page = pdf.pages[0]
+        assert [float(v) for v in page.MediaBox] == box
+        assert page.Resources.XObject.Im0.read_raw_bytes() == jpeg.read_bytes()
+
+
+def test_other_formats_and_tiff_frames_become_flate_pages(tmp_path):
+    from PIL import Image
+
+    png = tmp_path / "b.png"
+    Image.new("RGBA", (30, 30), (0, 0, 255, 128)).save(png)
+    tiff = tmp_path / "c.tiff"
+    frames = [Image.new("L", (20, 10), shade) for shade in (0, 128, 255)]
+    frames[0].save(tiff, save_all=True, append_images=frames[1:])
+
+    with _images_pdf(tmp_path, [_jpeg(tmp_path / "a.jpg"), png, tiff], page_size="letter") as pdf:
+        assert len(pdf.pages) == 5
+        filters = [str(page.Resources.XObject.Im0.Filter) for page in pdf.pages]
+        assert filters == ["/DCTDecode"] + ["/FlateDecode"] * 4
+        assert all([float(v) for v in page.MediaBox] == [0, 0, 612, 792] for page in pdf.pages)
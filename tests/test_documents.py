@@ -0,0 +1,72 @@
+import asyncio
+from pathlib import Path
+
+from documents import DocumentStore
+from storage import ExpiryIndex, ShardedStorage
+
+DATA = Path(__file__).parent / "data"
+
+
+def _documents(tmp_path, **kwargs):
+    store = ShardedStorage(str(tmp_path / "uploads"), ExpiryIndex(str(tmp_path / "index.db")))
+    return DocumentStore(store, **kwargs)
+
+
+def test_small_uploads_stay_in_memory_and_large_ones_go_to_disk(tmp_path):
+    documents = _documents(tmp_path, spool_limit=100)
+    small = asyncio.run(documents.save("small.bin", b"s" * 100))
+    large = asyncio.run(documents.save("large.bin", b"l" * 101))
+
+    assert documents.in_memory(small) and not small.exists()
+    assert not documents.in_memory(large) and large.read_bytes() == b"l" * 101
+    for path, size in ((small, 100), (large, 101)):
+        assert documents.exists(path) and documents.size(path) == size
+        with documents.open_binary(path) as f:
+            assert len(f.read()) == size
+
+
+def test_oldest_buffers_spill_to_disk_over_the_budget(tmp_path):
+    documents = _documents(tmp_path, spool_limit=100, memory_budget=250)
+    paths = [asyncio.run(documents.save(f"{n}.bin", bytes([n]) * 100)) for n in range(4)]
+
+    assert [documents.in_memory(path) for path in paths] == [False, False, True, True]
+    assert documents._memory_bytes == 200
+    # Spilled inputs read the same from disk
+    assert paths[0].read_bytes() == documents.read_bytes(paths[0]) == b"\0" * 100
+
+
+def test_the_newest_buffer_stays_even_when_it_alone_is_over_budget(tmp_path):
+    documents = _documents(tmp_path, spool_limit=100, memory_budget=50)
+    path = asyncio.run(documents.save("a.bin", b"a" * 100))
+    assert documents.in_memory(path)
+
+
+def test_local_path_spills_and_discard_forgets(tmp_path):
+    documents = _documents(tmp_path)
+    path = asyncio.run(documents.save("a.pdf", (DATA / "plain.pdf").read_bytes()))
+    documents.set_password(path, "pw")
+    digest = documents.sha256(path)
+
+    assert documents.local_path(path).read_bytes() == (DATA / "plain.pdf").read_bytes()
+    assert not documents.in_memory(path)
+    assert documents.sha256(path) == digest
+
+    documents.discard([path])
+    assert documents.password(path) is None
+    assert documents.known_sha256(path) is None
+
+
+def test_buffers_and_mapped_files_open_with_pymupdf_and_pikepdf(tmp_path):
+    documents = _documents(tmp_path, spool_limit=10)
+    on_disk = asyncio.run(documents.save("disk.pdf", (DATA / "plain.pdf").read_bytes()))
+    documents.spool_limit = 10 * 1024 * 1024
+    in_memory = asyncio.run(documents.save("memory.pdf", (DATA / "plain.pdf").read_bytes()))
+
+    for path in (on_disk, in_memory):
+        with documents.open_fitz(path) as doc:
+            assert doc.page_count >= 1
+        with documents.open_pikepdf(path) as pdf:
+            assert len(pdf.pages) >= 1
+    # Repeated opens of a file share one mapping
+    documents.open_fitz(on_disk).close()
+    assert len(documents._mapped) == 1
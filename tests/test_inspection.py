@@ -0,0 +1,96 @@
+import shutil
+from pathlib import Path
+
+import inspection
+from documents import documents
+from inspection import InspectionIndex, inspect, page_size
+
+DATA = Path(__file__).parent / "data"
+
+
+def test_plain_pdf_record():
+    record = inspect(DATA / "plain.pdf")
+    assert record["kind"] == "pdf" and record["pages"] == 3
+    assert record["page_sizes"] == [[595.0, 842.0, 3]]  # A4
+    assert page_size(record, 2) == (595.0, 842.0)
+    assert record["classification"] == "text"
+    assert not record["encrypted"] and not record["needs_password"]
+    assert all(record["permissions"].values())
+    assert record["images"] == [] and "fonts" not in record
+
+
+def test_encrypted_records_hold_only_what_opens_without_the_password(encrypted_pdf):
+    import pikepdf
+
+    # The empty user password opens it, so everything is read, permissions included
+    open_copy = inspect(encrypted_pdf(4, aes=True, allow=pikepdf.Permissions(extract=False)))
+    assert open_copy["encrypted"] and not open_copy["needs_password"]
+    assert open_copy["pages"] == 3 and open_copy["classification"] == "text"
+    assert open_copy["encryption"]["cipher"] == "AES-128"
+    assert not open_copy["permissions"]["copy"] and open_copy["permissions"]["print"]
+
+    locked = inspect(encrypted_pdf(6, user="u"))
+    assert locked["needs_password"] and locked["encryption"]["cipher"] == "AES-256"
+    assert locked["page_sizes"] is None and locked["classification"] is None
+
+
+def test_unreadable_input(tmp_path):
+    path = tmp_path / "broken.pdf"
+    path.write_bytes(b"not a pdf at all")
+    record = inspect(path)
+    assert record["kind"] == "unreadable" and record["size"] == 16
+
+
+def test_same_content_is_inspected_once_and_shared(tmp_path, monkeypatch):
+    calls = []
+    real_inspect = inspection.inspect
+    monkeypatch.setattr(inspection, "inspect", lambda path: calls.append(path) or real_inspect(path))
+    first, second = tmp_path / "a.pdf", tmp_path / "b.pdf"
+    shutil.copy(DATA / "plain.pdf", first)
+    shutil.copy(DATA / "plain.pdf", second)
+
+    index = InspectionIndex(str(tmp_path / "inspections.db"))
+    assert index.get(first)["pages"] == 3
+    assert index.get(second)["sha256"] == documents.sha256(first)
+    # Another worker finds the record in the shared database
+    assert InspectionIndex(str(tmp_path / "inspections.db")).get(first)["pages"] == 3
+    assert calls == [first]
+
+
+def test_encryption_check_reads_the_trailer_without_hashing(encrypted_pdf, tmp_path):
+    path = encrypted_pdf(6, user="u")
+    index = InspectionIndex(str(tmp_path / "inspections.db"))
+    encryption = index.encryption(path)
+    assert encryption["encrypted"] and encryption["needs_password"] is None
+    assert documents.known_sha256(path) is None
+
+    index.get(path)
+    assert index.encryption(path)["needs_password"] is True
+
+
+def test_fonts_are_read_on_first_request_and_kept(tmp_path, monkeypatch):
+    calls = []
+    real_fonts = inspection.pdf_fonts
+    monkeypatch.setattr(inspection, "pdf_fonts", lambda path: calls.append(path) or real_fonts(path))
+    path = tmp_path / "a.pdf"
+    shutil.copy(DATA / "plain.pdf", path)
+
+    index = InspectionIndex(str(tmp_path / "inspections.db"))
+    index.get(path)
+    assert calls == []
+    fonts = index.fonts(path)
+    assert fonts and all(font["name"] for font in fonts)
+    assert index.fonts(path) == fonts
+    assert InspectionIndex(str(tmp_path / "inspections.db")).fonts(path) == fonts
+    assert calls == [path]
+
+
+def test_records_are_kept_per_kind_of_input(tmp_path):
+    as_pdf, as_jpg = tmp_path / "a.pdf", tmp_path / "a.jpg"
+    shutil.copy(DATA / "plain.pdf", as_pdf)
+    shutil.copy(DATA / "plain.pdf", as_jpg)
+
+    index = InspectionIndex(str(tmp_path / "inspections.db"))
+    assert index.get(as_pdf)["kind"] == "pdf"
+    assert index.get(as_jpg)["kind"] == "unreadable"
+    assert index.fonts(as_jpg) is None
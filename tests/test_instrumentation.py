@@ -0,0 +1,58 @@
+import asyncio
+from pathlib import Path
+
+from instrumentation import Histogram, RequestTimings, _current_timings, stage
+
+
+def test_histogram_renders_cumulative_buckets_per_label_set():
+    histogram = Histogram("t_seconds", "Test", ("tool",), buckets=(0.1, 1))
+    histogram.observe(0.05, "a")
+    histogram.observe(0.5, "a")
+    histogram.observe(5, "a")
+    histogram.observe(0.5, "b")
+
+    lines = histogram.render()
+    assert 't_seconds_bucket{tool="a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{tool="a",le="1"} 2' in lines
+    assert 't_seconds_bucket{tool="a",le="+Inf"} 3' in lines
+    assert 't_seconds_sum{tool="a"} 5.550000' in lines
+    assert 't_seconds_count{tool="a"} 3' in lines
+    assert 't_seconds_count{tool="b"} 1' in lines
+
+
+def test_stages_are_summed_into_server_timing():
+    timings = RequestTimings()
+
+    def save():
+        with stage("convert", "save"):
+            pass
+
+    async def tool():
+        token = _current_timings.set(timings)
+        try:
+            for _ in range(2):
+                with stage("convert", "render"):
+                    await asyncio.sleep(0.01)
+            # Threads started with to_thread see the request's timings too
+            await asyncio.to_thread(save)
+        finally:
+            _current_timings.reset(token)
+
+    asyncio.run(tool())
+    header = timings.server_timing(0.5, 64 * 1024 * 1024)
+    names = [entry.split(";")[0] for entry in header.split(", ")]
+    assert names == ["render", "save", "total", "rss"]
+    assert float(header.split(", ")[0].split("dur=")[1]) >= 20
+    assert header.endswith('total;dur=500.0, rss;desc="64MB"')
+
+
+def test_responses_carry_server_timing_and_feed_metrics(app_module, client):
+    with open(Path(__file__).parent / "data" / "plain.pdf", "rb") as f:
+        response = client.post("/api/compress", files={"file": ("a.pdf", f)}, data={"quality": "low"})
+    assert response.status_code == 200, response.text
+    timing = response.headers["server-timing"]
+    assert "upload;dur=" in timing and "total;dur=" in timing
+
+    body = client.get("/metrics").text
+    assert 'flipfile_request_duration_seconds_count{method="POST",route="/api/compress",status="200"}' in body
+    assert 'flipfile_stage_duration_seconds_count{tool="compress"' in body
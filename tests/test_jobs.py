@@ -0,0 +1,101 @@
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+
+from jobs import DONE, FAILED, QUEUED, RUNNING, JobBroker, JobFailed, decode, encode
+
+
+@pytest.fixture
+def broker(tmp_path):
+    return JobBroker(str(tmp_path / "jobs.db"), lease=0.05, max_attempts=2)
+
+
+def test_paths_round_trip():
+    value = {"input_path": Path("uploads/ab/x.pdf"), "pages": [1, 2], "paths": [Path("a"), "b"]}
+    assert decode(encode(value)) == value
+
+
+def test_jobs_are_claimed_oldest_first_and_completed(broker):
+    first = broker.enqueue("compress", {"input_path": Path("a.pdf")})
+    second = broker.enqueue("compress", {"input_path": Path("b.pdf")})
+
+    job = broker.claim("w1")
+    assert job["id"] == first and job["params"] == {"input_path": Path("a.pdf")}
+    assert broker.get(first)["status"] == RUNNING
+    assert broker.claim("w1", ["convert"]) is None
+
+    broker.complete(first, "w1", Path("out.pdf"))
+    assert broker.get(first)["status"] == DONE
+    assert broker.get(first)["result"] == Path("out.pdf")
+    assert broker.get(second)["status"] == QUEUED
+
+
+def test_lapsed_lease_goes_back_to_the_queue_until_attempts_run_out(broker):
+    job_id = broker.enqueue("edit", {})
+    assert broker.claim("w1")["attempt"] == 1
+    time.sleep(0.1)
+    assert broker.claim("w2")["attempt"] == 2
+    # A stale worker can't overwrite the new owner's outcome
+    broker.complete(job_id, "w1", "late")
+    assert broker.get(job_id)["status"] == RUNNING
+
+    time.sleep(0.1)
+    assert broker.claim("w3") is None
+    assert broker.get(job_id)["status"] == FAILED
+
+
+def test_extend_keeps_the_lease(broker):
+    broker.enqueue("edit", {})
+    broker.claim("w1")
+    for _ in range(4):
+        time.sleep(0.02)
+        broker.extend(_only_job(broker), "w1")
+    assert broker.claim("w2") is None
+
+
+def test_wait_returns_the_result_and_fails_on_unknown_jobs(broker):
+    job_id = broker.enqueue("compress", {})
+    broker.claim("w1")
+    broker.complete(job_id, "w1", Path("out.pdf"))
+    assert asyncio.run(broker.wait(job_id)) == Path("out.pdf")
+
+    with pytest.raises(JobFailed, match="unknown"):
+        asyncio.run(broker.wait("no-such-job"))
+
+
+def _only_job(broker):
+    return broker._connect().execute("SELECT id FROM jobs").fetchone()[0]
+
+
+def test_async_request_returns_job_id_and_polls_to_a_result(app_module, client, monkeypatch, tmp_path):
+    broker = JobBroker(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(app_module, "broker", broker)
+    with open(Path(__file__).parent / "data" / "plain.pdf", "rb") as f:
+        response = client.post("/api/compress", files={"file": ("a.pdf", f)},
+                               data={"quality": "low"}, headers={"Prefer": "respond-async"})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert response.headers["location"] == f"/api/progress/{job_id}"
+    assert client.get(f"/api/progress/{job_id}").json()["status"] == QUEUED
+
+    # Any front end can report it once a worker has finished it
+    job = broker.claim("w1")
+    output = app_module.processed.path_for("compressed_a.pdf")
+    output.write_bytes(b"%PDF-1.4")
+    broker.complete(job["id"], "w1", output)
+    body = client.get(f"/api/progress/{job_id}").json()
+    assert body["status"] == DONE
+    assert client.get(body["result"]["download_url"]).content == b"%PDF-1.4"
+
+
+def test_protect_runs_locally_and_keeps_its_password_out_of_the_queue(app_module, client, monkeypatch, tmp_path):
+    broker = JobBroker(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(app_module, "broker", broker)
+    with open(Path(__file__).parent / "data" / "plain.pdf", "rb") as f:
+        response = client.post("/api/protect", files={"file": ("a.pdf", f)},
+                               data={"password": "new-secret"}, headers={"Prefer": "respond-async"})
+    assert response.status_code == 200, response.text
+    assert broker._connect().execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 0
+    assert b"new-secret" not in (tmp_path / "jobs.db").read_bytes()
@@ -0,0 +1,33 @@
+import fitz
+
+
+def _post(client, path, endpoint="/api/compress", **data):
+    with open(path, "rb") as f:
+        return client.post(endpoint, files={"file": (path.name, f)}, data={"quality": "low", **data})
+
+
+def test_missing_password_is_refused_before_any_work(client, encrypted_pdf):
+    response = _post(client, encrypted_pdf(6, user="u"))
+    assert response.status_code == 401
+    assert "document_password" in response.json()["detail"]
+
+
+def test_wrong_password_is_forbidden(client, encrypted_pdf):
+    response = _post(client, encrypted_pdf(6, user="u"), document_password="nope")
+    assert response.status_code == 403
+
+
+def test_compressed_output_of_a_protected_input_is_decrypted(client, encrypted_pdf):
+    response = _post(client, encrypted_pdf(6, user="u"), document_password="u")
+    assert response.status_code == 200
+    output = client.get(response.json()["download_url"]).content
+    with fitz.open(stream=output, filetype="pdf") as doc:
+        assert not doc.needs_pass and not doc.is_encrypted
+        assert "Page 1" in doc[0].get_text()
+
+
+def test_unlock_takes_its_own_password(client, encrypted_pdf):
+    path = encrypted_pdf(3, user="u")
+    with open(path, "rb") as f:
+        response = client.post("/api/unlock", files={"file": (path.name, f)}, data={"password": "u"})
+    assert response.status_code == 200
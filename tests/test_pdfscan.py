@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import fitz
+import pikepdf
+import pytest
+
+from pdfscan import parse_dictionary, scan_encryption
+
+DATA = Path(__file__).parent / "data"
+
+
+@pytest.mark.parametrize("revision, options, version, cipher, length, metadata", [
+    # Before V4 there is no /EncryptMetadata and metadata is always encrypted
+    (2, {}, 1, "RC4", 40, True),
+    (3, {}, 2, "RC4", 128, True),
+    (4, {"aes": False}, 4, "RC4", 128, False),
+    (4, {"aes": True}, 4, "AES-128", 128, True),
+    (6, {}, 5, "AES-256", 256, True),
+])
+def test_encryption_is_read_from_the_trailer(encrypted_pdf, revision, options, version, cipher, length,
+                                             metadata):
+    path = encrypted_pdf(revision, user="u", allow=pikepdf.Permissions(print_highres=False), **options)
+    scanned = scan_encryption(path)
+
+    assert scanned["encrypted"]
+    encryption = scanned["encryption"]
+    assert (encryption["revision"], encryption["version"]) == (revision, version)
+    assert (encryption["cipher"], encryption["length"]) == (cipher, length)
+    assert encryption["filter"] == "Standard"
+    assert encryption["metadata_encrypted"] == metadata
+    assert scanned["p"] < 0  # a signed 32-bit field with the reserved high bits set
+    if revision >= 3:
+        assert not scanned["p"] & 2048  # high-resolution printing
+
+
+def test_xref_streams_and_incremental_updates(encrypted_pdf):
+    path = encrypted_pdf(4, aes=True, save={"object_stream_mode": pikepdf.ObjectStreamMode.generate})
+    assert scan_encryption(path)["encryption"]["cipher"] == "AES-128"
+
+    # The new section's xref doesn't list /Encrypt; it is found through /Prev
+    with fitz.open(path) as doc:
+        doc.set_metadata({"title": "Updated"})
+        doc.saveIncr()
+    assert scan_encryption(path)["encryption"]["cipher"] == "AES-128"
+
+
+def test_unencrypted_file():
+    assert scan_encryption(DATA / "plain.pdf") == {"encrypted": False, "encryption": None, "p": None}
+
+
+def test_damaged_tail_gives_up(tmp_path):
+    path = tmp_path / "cut.pdf"
+    path.write_bytes((DATA / "plain.pdf").read_bytes()[:-200])
+    assert scan_encryption(path) is None
+
+
+def test_parse_dictionary():
+    parsed = parse_dictionary(b"<< /Filter /Standard /V 2 /Length 128 /P -3904 /EncryptMetadata false"
+                              b" /O (a\\)b) /U <0aff> /CF << /StdCF << /CFM /AESV2 >> >> /Arr [1 2] >>")
+    assert parsed["V"] == 2 and parsed["P"] == -3904
+    assert parsed["EncryptMetadata"] is False
+    assert parsed["CF"]["StdCF"]["CFM"] == "/AESV2"
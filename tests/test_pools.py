@@ -0,0 +1,10 @@
+import asyncio
+import os
+
+from pools import process_pool, run_in_pool
+
+
+def test_workers_do_not_fork_from_a_threaded_parent():
+    # The forkserver's children share no threads (or held locks) with this process
+    assert process_pool()._mp_context.get_start_method() == "forkserver"
+    assert asyncio.run(run_in_pool(os.getpid)) != os.getpid()
@@ -0,0 +1,108 @@
+import asyncio
+import io
+import json
+import shutil
+import zipfile
+from pathlib import Path
+
+import fitz
+import pytest
+
+from pdfscan import scan_encryption
+from protector import PDFProtector, encryption_backend
+
+DATA = Path(__file__).parent / "data"
+
+
+@pytest.mark.parametrize("level, revision, cipher", [
+    ("40bit", 2, "RC4"), ("128bit", 4, "AES-128"), ("256bit", 6, "AES-256"),
+])
+def test_every_level_is_written_by_pikepdf(tmp_path, level, revision, cipher):
+    assert encryption_backend(level) == "pikepdf"
+
+    async def protect():
+        items = [{"input_path": DATA / "plain.pdf", "password": "secret", "encryption_level": level}]
+        return [data async for _, data in PDFProtector().protect_many(items)]
+
+    path = tmp_path / "out.pdf"
+    path.write_bytes(asyncio.run(protect())[0])
+    encryption = scan_encryption(path)["encryption"]
+    assert encryption["revision"] == revision
+    assert encryption["cipher"] == cipher
+
+
+def test_default_level_is_aes_128(tmp_path):
+    import pikepdf
+
+    path = asyncio.run(PDFProtector().protect(DATA / "plain.pdf", "secret"))
+    with pikepdf.open(path, password="secret") as pdf:
+        assert pdf.encryption.stream_method.name == "aes"
+        assert pdf.encryption.bits == 128
+
+
+def test_a_single_file_is_encrypted_off_the_event_loop(monkeypatch):
+    import threading
+    import protector
+
+    threads = []
+
+    def protect_to_bytes(*args):
+        threads.append(threading.current_thread())
+        return b"encrypted"
+
+    monkeypatch.setattr(protector, "_protect_to_bytes", protect_to_bytes)
+    items = [{"input_path": DATA / "plain.pdf", "password": "secret"}]
+
+    async def protect():
+        return [data async for _, data in PDFProtector().protect_many(items)]
+
+    assert asyncio.run(protect()) == [b"encrypted"]
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_many_files_each_get_their_own_password(tmp_path):
+    items = []
+    for index in range(4):
+        path = tmp_path / f"{index}.pdf"
+        shutil.copy(DATA / "plain.pdf", path)
+        items.append({"input_path": path, "password": f"pw{index}", "encryption_level": "128bit"})
+
+    async def protect():
+        return [(item, data) async for item, data in PDFProtector().protect_many(items)]
+
+    results = asyncio.run(protect())
+    assert sorted(item["password"] for item, _ in results) == ["pw0", "pw1", "pw2", "pw3"]
+    for item, data in results:
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            assert doc.needs_pass
+            assert not doc.authenticate("pw0" if item["password"] != "pw0" else "pw1")
+            assert doc.authenticate(item["password"])
+
+
+def _batch(client, names, parameters):
+    files = [("files", (name, (DATA / "plain.pdf").read_bytes())) for name in names]
+    return client.post("/api/batch-process", files=files,
+                       data={"operation": "protect", "parameters": json.dumps(parameters)})
+
+
+def test_batch_manifest_takes_permissions_as_object_or_json_string(client, tmp_path):
+    response = _batch(client, ["a.pdf", "b.pdf"], {
+        "manifest": {
+            "a.pdf": {"password": "a", "permissions": '{"print": false, "copy": false}'},
+            "b.pdf": {"password": "b", "permissions": {"print": True, "copy": False}},
+        },
+    })
+    assert response.status_code == 200, response.text
+    archive = zipfile.ZipFile(io.BytesIO(client.get(response.json()["download_url"]).content))
+    assert sorted(archive.namelist()) == ["protected_a.pdf", "protected_b.pdf"]
+    for name, can_print in (("protected_a.pdf", False), ("protected_b.pdf", True)):
+        path = tmp_path / name
+        path.write_bytes(archive.read(name))
+        assert bool(scan_encryption(path)["p"] & fitz.PDF_PERM_PRINT) == can_print
+
+
+@pytest.mark.parametrize("permissions", ["not json", "[1, 2]", 5])
+def test_batch_manifest_rejects_bad_permissions(client, permissions):
+    response = _batch(client, ["a.pdf"], {"manifest": {"a.pdf": {"password": "a", "permissions": permissions}}})
+    assert response.status_code == 400
+    assert "a.pdf" in response.json()["detail"]
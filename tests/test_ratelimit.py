@@ -0,0 +1,134 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from ratelimit import (MemoryBucketStore, RateLimiter, RateLimitExceeded, SQLiteBucketStore,
+                       _apply)
+
+LIMITS = {"anonymous": {"burst": 10, "refill": 1, "daily": 25},
+          "pro": {"burst": 100, "refill": 1, "daily": 1000}}
+
+A = [("ip:a", "anonymous")]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def limiter(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryBucketStore()
+    else:
+        store = SQLiteBucketStore(str(tmp_path / "buckets.db"))
+    return RateLimiter(store, LIMITS)
+
+
+def test_charges_are_weighted_by_cost(limiter):
+    asyncio.run(limiter.charge(A, 6))
+    with pytest.raises(RateLimitExceeded) as exceeded:
+        asyncio.run(limiter.charge(A, 6))
+    assert exceeded.value.reason == "rate"
+    assert exceeded.value.retry_after >= 1
+    # Another client has its own bucket
+    asyncio.run(limiter.charge([("ip:b", "anonymous")], 6))
+
+
+def test_check_probes_without_spending(limiter):
+    asyncio.run(limiter.charge(A, 9))
+    asyncio.run(limiter.check(A))
+    asyncio.run(limiter.check(A))
+    asyncio.run(limiter.charge(A, 1))
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(limiter.check(A))
+
+
+def test_bucket_refills_over_time():
+    state = _apply("k", None, LIMITS["anonymous"], 10, now=0, force=False)
+    with pytest.raises(RateLimitExceeded):
+        _apply("k", state, LIMITS["anonymous"], 5, now=1, force=False)
+    state = _apply("k", state, LIMITS["anonymous"], 5, now=5, force=False)
+    assert state[0] == 0
+
+
+def test_daily_quota_resets_at_midnight():
+    limits = LIMITS["anonymous"]
+    state = None
+    for hour in range(2):
+        state = _apply("k", state, limits, 10, now=hour * 3600, force=False)
+    with pytest.raises(RateLimitExceeded) as exceeded:
+        _apply("k", state, limits, 10, now=4 * 3600, force=False)
+    assert exceeded.value.reason == "daily quota"
+    # The next UTC day starts from zero
+    state = _apply("k", state, limits, 10, now=86400 + 60, force=False)
+    assert state[3] == 10
+
+
+def test_oversized_job_runs_once_the_bucket_is_full():
+    state = _apply("k", None, LIMITS["anonymous"], 15, now=0, force=False)
+    assert state[0] == -5
+    with pytest.raises(RateLimitExceeded):
+        _apply("k", state, LIMITS["anonymous"], 1, now=5, force=False)
+
+
+def test_limit_charges_processing_time(limiter):
+    async def job():
+        async with limiter.limit(A, 2):
+            await asyncio.sleep(0.05)
+
+    asyncio.run(job())
+    used = asyncio.run(limiter.charge(A, 0))
+    assert 2 < used < 3
+
+
+def test_every_bucket_must_pay_and_a_refusal_charges_none(limiter):
+    alice = [("user:alice", "pro"), ("ip:a", "anonymous")]
+    bob = [("user:bob", "pro"), ("ip:a", "anonymous")]
+    assert asyncio.run(limiter.charge(alice, 10)) == 10
+    # Bob's own bucket is full, but the address they share is empty
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(limiter.check(bob))
+    with pytest.raises(RateLimitExceeded) as exceeded:
+        asyncio.run(limiter.charge(bob, 5))
+    assert exceeded.value.key == "ip:a"
+    assert limiter.store.get("user:bob") is None
+    assert limiter.store.get("user:alice")[0] == 90
+
+
+def test_session_users_are_limited_by_their_own_key_and_plan(app_module, client, monkeypatch):
+    from sessions import SESSION_COOKIE, MemorySessionStore, User
+
+    sessions = MemorySessionStore()
+    sessions.save(User("alice", plan="pro"))
+    monkeypatch.setattr(app_module, "user_sessions", sessions)
+    charged = []
+
+    async def charge(buckets, units, force=False):
+        charged.append(tuple(buckets))
+        return 0
+
+    monkeypatch.setattr(app_module.rate_limiter, "charge", charge)
+
+    client.cookies.set(SESSION_COOKIE, "alice")
+    with open(Path(__file__).parent / "data" / "plain.pdf", "rb") as f:
+        response = client.post("/api/compress", files={"file": ("a.pdf", f)}, data={"quality": "low"})
+    assert response.status_code == 200, response.text
+    assert charged and set(charged) == {(("user:alice", "pro"), ("address:ip:testclient", "address"))}
+
+
+def test_waiting_for_a_locked_store_does_not_block_the_loop(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "buckets.db")
+    limiter = RateLimiter(SQLiteBucketStore(path), LIMITS)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    async def main():
+        charge = asyncio.ensure_future(limiter.charge(A, 1))
+        ticks = 0
+        while ticks < 10:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not charge.done()
+        other.execute("COMMIT")
+        return await charge
+
+    assert asyncio.run(main()) == 1
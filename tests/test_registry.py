@@ -0,0 +1,67 @@
+import asyncio
+import json
+import sys
+
+import pytest
+
+import registry as registry_module
+from registry import ToolRegistry, ToolSpec, configured_preload
+
+TOOL_SOURCE = '''
+created = []
+
+class Sample:
+    def __init__(self):
+        created.append(self)
+        self.levels = {"low": 1, "high": 2}
+
+    async def run(self, value):
+        return value * 2
+'''
+
+
+@pytest.fixture
+def sample_registry(tmp_path, monkeypatch):
+    (tmp_path / "sample_tool.py").write_text(TOOL_SOURCE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "sample_tool", raising=False)
+    return ToolRegistry([
+        ToolSpec("sample", "Sample", "Doubles things", "sample_tool", "Sample", "run",
+                 lambda tool: {"levels": list(tool.levels)}, cost="input MB",
+                 footprint=("json", "sample_tool")),
+        ToolSpec("other", "Other", "Shares a library", "sample_tool", "Sample", "run",
+                 lambda tool: {}, cost="input MB", footprint=("json", "csv")),
+    ])
+
+
+def test_tools_are_imported_on_first_use_and_built_once(sample_registry):
+    assert "sample_tool" not in sys.modules
+    tool = sample_registry.get("sample")
+    assert sample_registry.get("sample") is tool
+    assert len(sys.modules["sample_tool"].created) == 1
+    assert asyncio.run(sample_registry.entry("sample")(21)) == 42
+
+
+def test_describe_is_built_from_the_instances_once(sample_registry):
+    body = sample_registry.describe()
+    tools = json.loads(body)["tools"]
+    assert [tool["id"] for tool in tools] == ["sample", "other"]
+    assert tools[0]["levels"] == ["low", "high"]
+    assert sample_registry.describe() is body
+
+
+def test_footprint_lists_each_library_once(sample_registry):
+    assert sample_registry.footprint() == ["json", "sample_tool", "csv"]
+    assert sample_registry.footprint(["other"]) == ["json", "csv"]
+
+
+def test_configured_preload(monkeypatch):
+    monkeypatch.setenv("FLIPFILE_PRELOAD_TOOLS", "")
+    assert configured_preload() == []
+    monkeypatch.setenv("FLIPFILE_PRELOAD_TOOLS", "compress, protect")
+    assert configured_preload() == ["compress", "protect"]
+    monkeypatch.setenv("FLIPFILE_PRELOAD_TOOLS", "all")
+    assert configured_preload() == list(registry_module.registry.specs)
+    monkeypatch.setenv("FLIPFILE_PRELOAD_TOOLS", "compress,nope")
+    with pytest.raises(ValueError):
+        configured_preload()
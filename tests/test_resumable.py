@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from resumable import MIN_CHUNK_SIZE, ChunkedUploads, UploadError
+from storage import ExpiryIndex, ShardedStorage
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    storage = ShardedStorage(str(tmp_path / "files"), ExpiryIndex(str(tmp_path / "index.db")))
+    return ChunkedUploads(str(tmp_path / "uploads.db"), storage)
+
+
+def _content(size):
+    return bytes(range(256)) * (size // 256) + bytes(size % 256)
+
+
+def _send(uploads, upload_id, index, data, checksum=None):
+    async def body():
+        # Arrives in pieces, like a request stream
+        for start in range(0, len(data), 65536):
+            yield data[start:start + 65536]
+
+    return asyncio.run(uploads.write_chunk(upload_id, index, body(),
+                                           checksum or hashlib.sha256(data).hexdigest()))
+
+
+def test_chunks_in_any_order_assemble_the_file(uploads):
+    content = _content(2 * MIN_CHUNK_SIZE + 1000)
+    chunks = [content[i:i + MIN_CHUNK_SIZE] for i in range(0, len(content), MIN_CHUNK_SIZE)]
+    upload_id = uploads.create("doc.pdf", len(content), MIN_CHUNK_SIZE)["upload_id"]
+
+    _send(uploads, upload_id, 2, chunks[2])
+    _send(uploads, upload_id, 0, chunks[0])
+    status = uploads.status(upload_id)
+    assert status["received"] == [0, 2] and status["offset"] == MIN_CHUNK_SIZE
+    with pytest.raises(UploadError) as missing:
+        uploads.finalize(upload_id)
+    assert missing.value.status_code == 409
+
+    _send(uploads, upload_id, 1, chunks[1])
+    assert uploads.finalize(upload_id)["complete"]
+    assert uploads.resolve(upload_id)["path"].read_bytes() == content
+
+
+def test_bad_chunks_are_rejected(uploads):
+    upload_id = uploads.create("doc.pdf", MIN_CHUNK_SIZE + 10, MIN_CHUNK_SIZE)["upload_id"]
+    with pytest.raises(UploadError) as mismatch:
+        _send(uploads, upload_id, 1, b"x" * 10, checksum="0" * 64)
+    assert mismatch.value.status_code == 422
+    with pytest.raises(UploadError) as too_long:
+        _send(uploads, upload_id, 1, b"x" * 11)
+    assert too_long.value.status_code == 400
+    with pytest.raises(UploadError) as out_of_range:
+        _send(uploads, upload_id, 2, b"x")
+    assert out_of_range.value.status_code == 416
+    assert uploads.status(upload_id)["received"] == []
+
+
+def test_known_content_is_deduplicated_per_client(uploads):
+    content = _content(MIN_CHUNK_SIZE // 2)
+    sha256 = hashlib.sha256(content).hexdigest()
+    first = uploads.create("a.pdf", len(content), owner="alice", sha256=sha256)["upload_id"]
+    _send(uploads, first, 0, content)
+    uploads.finalize(first)
+
+    again = uploads.create("b.pdf", len(content), owner="alice", sha256=sha256)
+    assert again["complete"]
+    assert uploads.resolve(again["upload_id"])["path"].read_bytes() == content
+
+    # Another client has to send the bytes itself
+    other = uploads.create("c.pdf", len(content), owner="bob", sha256=sha256)
+    assert not other["complete"]
+
+
+def test_finalize_checks_the_announced_hash(uploads):
+    content = _content(1000)
+    upload_id = uploads.create("a.pdf", len(content), sha256="0" * 64)["upload_id"]
+    _send(uploads, upload_id, 0, content)
+    with pytest.raises(UploadError) as mismatch:
+        uploads.finalize(upload_id)
+    assert mismatch.value.status_code == 422
+
+
+def _finished(uploads, owner, content, name="a.pdf"):
+    sha256 = hashlib.sha256(content).hexdigest()
+    upload_id = uploads.create(name, len(content), owner=owner, sha256=sha256)["upload_id"]
+    if not uploads.status(upload_id)["complete"]:
+        _send(uploads, upload_id, 0, content)
+        uploads.finalize(upload_id)
+    return uploads.resolve(upload_id)["path"]
+
+
+def test_dedupe_needs_an_owner_and_the_same_size(uploads):
+    content = _content(1000)
+    sha256 = hashlib.sha256(content).hexdigest()
+    _finished(uploads, None, content)
+    assert not uploads.create("b.pdf", len(content), sha256=sha256)["complete"]
+
+    _finished(uploads, "alice", content)
+    assert not uploads.create("b.pdf", len(content) + 1, owner="alice", sha256=sha256)["complete"]
+
+
+def test_each_deduplicated_upload_is_its_own_link(uploads):
+    content = _content(1000)
+    first = _finished(uploads, "alice", content)
+    second = _finished(uploads, "alice", content, "b.pdf")
+    assert first != second and first.stat().st_ino == second.stat().st_ino
+
+    # Expiring one upload leaves the other
+    first.unlink()
+    assert second.read_bytes() == content
+
+
+def test_reaped_content_falls_back_to_a_transfer(uploads):
+    content = _content(1000)
+    sha256 = hashlib.sha256(content).hexdigest()
+    _finished(uploads, "alice", content).unlink()
+
+    again = uploads.create("b.pdf", len(content), owner="alice", sha256=sha256)
+    assert not again["complete"]
+    assert uploads._connect().execute("SELECT COUNT(*) FROM contents").fetchone()[0] == 0
+
+
+def test_expired_rows_are_purged_by_the_reaper_not_by_create(uploads):
+    old = uploads.create("old.pdf", MIN_CHUNK_SIZE + 10, MIN_CHUNK_SIZE)["upload_id"]
+    _send(uploads, old, 1, b"x" * 10)
+    uploads._connect().execute("UPDATE uploads SET created_at = created_at - ? WHERE id = ?",
+                               (uploads.ttl + 1, old))
+
+    new = uploads.create("new.pdf", 10)["upload_id"]
+    assert uploads.status(old)["received"] == [1]
+
+    assert uploads.purge_expired() == 1
+    with pytest.raises(UploadError):
+        uploads.status(old)
+    assert uploads._connect().execute("SELECT COUNT(*) FROM chunks").fetchone()[0] == 0
+    assert uploads.status(new)["size"] == 10
+    plan = uploads._connect().execute(
+        "EXPLAIN QUERY PLAN DELETE FROM uploads WHERE created_at < 0").fetchall()
+    assert "uploads_created_at" in str(plan)
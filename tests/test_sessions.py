@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from sessions import MemorySessionStore, SessionStore, SQLiteSessionStore, User
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return MemorySessionStore(**kwargs)
+        return SQLiteSessionStore(str(tmp_path / "sessions.db"), **kwargs)
+    return make
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_save_get_delete(make_store):
+    store = make_store()
+    store.save(User("alice", plan="pro", daily_tasks=3))
+
+    user = store.get("alice")
+    assert (user.user_id, user.plan, user.daily_tasks) == ("alice", "pro", 3)
+    assert "alice" in store and len(store) == 1
+
+    store.delete("alice")
+    assert store.get("alice") is None
+    assert "alice" not in store and len(store) == 0
+
+
+def test_sessions_expire(make_store):
+    store = make_store(ttl=0.05)
+    store.save(User("alice"))
+    time.sleep(0.1)
+    assert store.get("alice") is None
+    assert len(store) == 0
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemorySessionStore(max_sessions=2)
+    store.save(User("a"))
+    store.save(User("b"))
+    store.get("a")
+    store.save(User("c"))
+    assert "a" in store and "c" in store
+    assert "b" not in store
+
+
+def test_daily_tasks_count_tasks_per_utc_day(make_store):
+    store = make_store()
+    user = User("alice", daily_tasks=7, tasks_day="2000-01-01")
+    user.record_tasks(2)
+    user.record_tasks(1)
+    assert user.daily_tasks == 3
+    store.save(user)
+
+    saved = store.get("alice")
+    assert (saved.daily_tasks, saved.tasks_day) == (3, user.tasks_day)
+
+
+def test_session_user_comes_from_user_id_or_cookie(make_store):
+    from types import SimpleNamespace
+
+    from sessions import SESSION_COOKIE, session_user
+
+    store = make_store()
+    store.save(User("alice"))
+    store.save(User("bob"))
+    request = SimpleNamespace(cookies={SESSION_COOKIE: "alice"})
+    assert session_user(store, request).user_id == "alice"
+    assert session_user(store, request, "bob").user_id == "bob"
+    assert session_user(store, SimpleNamespace(cookies={})) is None
+
+
+def test_login_reuses_the_session_in_its_cookie_and_limits_new_ones(main_module, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from ratelimit import RateLimiter, SESSION_LIMITS
+    from sessions import SESSION_COOKIE
+
+    monkeypatch.setattr(main_module, "user_sessions", MemorySessionStore())
+    monkeypatch.setattr(main_module, "session_limiter", RateLimiter(limits=SESSION_LIMITS))
+    client = TestClient(main_module.app)
+    form = {"email": "a@example.com", "password": "pw"}
+
+    first = client.post("/api/login", data=form).json()["user_id"]
+    assert client.cookies[SESSION_COOKIE] == first
+    assert client.post("/api/login", data=form).json()["user_id"] == first
+    assert len(main_module.user_sessions) == 1
+
+    # A client that drops its cookie every time soon runs out of new sessions
+    statuses = []
+    for _ in range(int(SESSION_LIMITS["anonymous"]["burst"]) + 1):
+        client.cookies.clear()
+        statuses.append(client.post("/api/login", data=form).status_code)
+    assert statuses[-1] == 429
+    assert len(main_module.user_sessions) <= SESSION_LIMITS["anonymous"]["burst"]
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from documents import documents
+from singleflight import SingleFlight, SQLiteFlightStore, request_key
+
+
+def test_concurrent_identical_calls_share_one_run():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "result"
+
+    async def scenario():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["result"] * 5
+    assert len(calls) == 1
+
+
+def test_failure_reaches_every_caller_and_is_not_remembered():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("broken")
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(flight.do("key", work), flight.do("key", work),
+                                       return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        with pytest.raises(ValueError):
+            await flight.do("key", work)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_result_is_reused_only_while_its_output_exists(tmp_path):
+    output = tmp_path / "out.pdf"
+    calls = []
+
+    async def work():
+        calls.append(1)
+        output.write_bytes(b"%PDF")
+        return output
+
+    async def scenario():
+        flight = SingleFlight(linger=30)
+        await flight.do("key", work)
+        await flight.do("key", work)
+        output.unlink()
+        await flight.do("key", work)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_shared_store_joins_calls_across_instances(tmp_path):
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"pages": 3}
+
+    async def scenario():
+        # Two instances stand in for two worker processes
+        first = SingleFlight(SQLiteFlightStore(str(tmp_path / "flights.db")), poll=0.01)
+        second = SingleFlight(SQLiteFlightStore(str(tmp_path / "flights.db")), poll=0.01)
+        second.owner = "other"
+        return await asyncio.gather(first.do("key", work), second.do("key", work))
+
+    assert asyncio.run(scenario()) == [{"pages": 3}] * 2
+    assert len(calls) == 1
+
+
+def test_key_covers_content_parameters_and_password(tmp_path):
+    first, second, other = tmp_path / "a.pdf", tmp_path / "b.pdf", tmp_path / "c.pdf"
+    first.write_bytes(b"%PDF same")
+    second.write_bytes(b"%PDF same")
+    other.write_bytes(b"%PDF other")
+
+    assert request_key("compress", {"input_path": first}) == request_key("compress", {"input_path": second})
+    assert request_key("compress", {"input_path": first}) != request_key("compress", {"input_path": other})
+    assert request_key("compress", {"input_path": first, "level": "low"}) != \
+        request_key("compress", {"input_path": first, "level": "high"})
+
+    try:
+        documents.set_password(first, "right")
+        documents.set_password(second, "wrong")
+        assert request_key("compress", {"input_path": first}) != request_key("compress", {"input_path": second})
+    finally:
+        documents.discard([first, second])
+
+
+def test_outputs_of_separate_calls_never_share_a_name(tmp_path):
+    # A reused result is only the leader's output if no later call can write over it
+    from converter import PDFConverter
+
+    image = tmp_path / "a.png"
+    image.write_bytes(b"not really a png")
+    converter = PDFConverter()
+    first = converter._create_image_zip([image])
+    second = converter._create_image_zip([image])
+    assert first != second
+    assert first.exists() and second.exists()
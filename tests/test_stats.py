@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from stats import ServiceStats, counted
+
+
+def test_in_memory_counts_and_cache_hit_rate():
+    stats = ServiceStats()
+    stats.record("compress", 100, 40)
+    stats.record("compress", 50, 20)
+    stats.record("compress", ok=False)
+    stats.cache("singleflight", hit=True)
+    stats.cache("singleflight", hit=False)
+
+    snapshot = stats.snapshot()
+    assert snapshot["total_files_processed"] == 2
+    assert snapshot["bytes_in"] == {"compress": 150}
+    assert snapshot["failures"] == {"compress": 1}
+    assert snapshot["caches"]["singleflight"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_flush_shares_totals_between_workers(tmp_path):
+    path = str(tmp_path / "stats.db")
+    first, second = ServiceStats(path), ServiceStats(path)
+    first.record("protect", 10, 12)
+    second.record("protect", 5, 6)
+    # Unflushed deltas are local, yet still counted by their own worker
+    assert first.snapshot()["files_processed"] == {"protect": 1}
+
+    first.flush()
+    second.flush()
+    assert second.snapshot()["files_processed"] == {"protect": 2}
+    assert second.snapshot()["bytes_out"] == {"protect": 18}
+    # Nothing is added twice by a second flush
+    second.flush()
+    assert second.snapshot()["total_files_processed"] == 2
+
+
+def test_active_jobs_ignore_workers_without_a_recent_heartbeat(tmp_path):
+    path = str(tmp_path / "stats.db")
+    stats = ServiceStats(path, flush_interval=1)
+    conn = stats._connect()
+    conn.execute("INSERT INTO workers (pid, active, heartbeat) VALUES (?, ?, ?)", (-1, 2, time.time()))
+    conn.execute("INSERT INTO workers (pid, active, heartbeat) VALUES (?, ?, ?)", (-2, 5, time.time() - 60))
+
+    stats.job_started()
+    stats.flush()
+    assert stats.snapshot()["active_jobs"] == 3
+
+
+def test_counted_records_sizes_and_failures_once(tmp_path, monkeypatch):
+    import stats as stats_module
+
+    monkeypatch.setattr(stats_module, "stats", ServiceStats())
+    source = tmp_path / "in.pdf"
+    source.write_bytes(b"x" * 30)
+    output = tmp_path / "out.pdf"
+    output.write_bytes(b"x" * 10)
+
+    class Tool:
+        @counted("edit")
+        async def run(self, input_path, fail=False):
+            if fail:
+                raise ValueError("broken")
+            # A counted call from inside another is not counted again
+            return await self.inner(input_path)
+
+        @counted("inner")
+        async def inner(self, input_path):
+            return output
+
+    asyncio.run(Tool().run(source))
+    try:
+        asyncio.run(Tool().run(source, fail=True))
+    except ValueError:
+        pass
+
+    snapshot = stats_module.stats.snapshot()
+    assert snapshot["files_processed"] == {"edit": 1}
+    assert (snapshot["bytes_in"], snapshot["bytes_out"]) == ({"edit": 30}, {"edit": 10})
+    assert snapshot["failures"] == {"edit": 1}
+    assert snapshot["active_jobs"] == 0
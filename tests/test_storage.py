@@ -0,0 +1,216 @@
+import os
+import threading
+
+import pytest
+
+import storage
+from storage import ExpiryIndex, ShardedStorage, sweep_directory
+
+
+def _store(tmp_path, **kwargs):
+    return ShardedStorage(str(tmp_path / "files"), ExpiryIndex(str(tmp_path / "index.db")), **kwargs)
+
+
+def test_names_map_to_stable_shards(tmp_path):
+    store = _store(tmp_path)
+    path = store.path_for("report.pdf")
+    path.write_bytes(b"%PDF")
+
+    assert path.parent.parent == store.root
+    assert len(path.parent.name) == 2
+    assert store.path_for("report.pdf") == path
+    assert store.locate("report.pdf") is None  # path_for hands out a fresh file
+    path.write_bytes(b"%PDF")
+    assert store.locate("report.pdf") == path
+
+
+def test_locate_finds_flat_layout_files_and_rejects_other_names(tmp_path):
+    store = _store(tmp_path)
+    store.root.mkdir(parents=True)
+    (store.root / "old.pdf").write_bytes(b"%PDF")
+    (tmp_path / "secret.txt").write_text("x")
+
+    assert store.locate("old.pdf") == store.root / "old.pdf"
+    for name in ("", "../secret.txt", ".hidden", "a/b.pdf"):
+        assert store.locate(name) is None
+
+
+def test_expired_paths_are_popped_once(tmp_path):
+    index = ExpiryIndex(str(tmp_path / "index.db"))
+    index.set([tmp_path / "due.pdf"], -1)
+    index.set([tmp_path / "later.pdf"], 3600)
+
+    assert index.pop_due() == [str(tmp_path / "due.pdf")]
+    assert index.pop_due() == []
+
+
+def test_purge_deletes_files_and_directories(tmp_path):
+    single = tmp_path / "out.pdf"
+    single.write_bytes(b"%PDF")
+    folder = tmp_path / "pages"
+    folder.mkdir()
+    (folder / "1.png").write_bytes(b"png")
+    kept = tmp_path / "kept.pdf"
+    kept.write_bytes(b"%PDF")
+
+    storage.expire([single, folder, tmp_path / "already-gone.pdf"], -1)
+    storage.expire([kept], 3600)
+    assert storage.purge_expired() == 2
+    assert not single.exists() and not folder.exists()
+    assert kept.exists()
+
+
+def test_sweep_directory_only_removes_old_top_level_files(tmp_path):
+    old = tmp_path / "old.pdf"
+    old.write_bytes(b"%PDF")
+    os.utime(old, (0, 0))
+    (tmp_path / "new.pdf").write_bytes(b"%PDF")
+    (tmp_path / "shard").mkdir()
+
+    assert sweep_directory(tmp_path, 3600) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["new.pdf", "shard"]
+
+
+def test_forked_child_does_not_inherit_the_index_connection(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage.index, "path", str(tmp_path / "index.db"))
+    monkeypatch.setattr(storage.index, "_local", threading.local())
+    parent_conn = storage.index._connect()
+
+    pid = os.fork()
+    if pid == 0:
+        inherited = getattr(storage.index._local, "conn", None)
+        os._exit(0 if inherited is None and storage.index._connect() is not parent_conn else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+class FakeS3:
+    """Records the calls S3ObjectStore makes"""
+
+    def __init__(self, fail_part=None):
+        self.fail_part = fail_part
+        self.objects = {}
+        self.parts = []
+        self.calls = []
+
+    def put_object(self, Bucket, Key, Body):
+        self.calls.append("put_object")
+        self.objects[Key] = Body.read()
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.calls.append("create_multipart_upload")
+        return {"UploadId": "u1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.fail_part:
+            raise OSError("connection reset")
+        self.parts.append(Body)
+        return {"ETag": f"etag{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append("complete_multipart_upload")
+        assert [part["PartNumber"] for part in MultipartUpload["Parts"]] == list(range(1, len(self.parts) + 1))
+        self.objects[Key] = b"".join(self.parts)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append("abort_multipart_upload")
+
+    def generate_presigned_url(self, method, Params, ExpiresIn):
+        return f"https://s3.test/{Params['Bucket']}/{Params['Key']}?expires_in={ExpiresIn}"
+
+
+def test_s3_store_uploads_large_outputs_in_parts(tmp_path):
+    small, large = tmp_path / "small.pdf", tmp_path / "large.pdf"
+    small.write_bytes(b"s" * 10)
+    large.write_bytes(bytes(range(256)) * 10)
+    client = FakeS3()
+    store = storage.S3ObjectStore("bucket", prefix="out/", part_size=1000, client=client)
+
+    assert store.put(small) == "small.pdf"
+    assert store.put(large) == "large.pdf"
+    assert client.calls == ["put_object", "create_multipart_upload", "complete_multipart_upload"]
+    assert [len(part) for part in client.parts] == [1000, 1000, 560]
+    assert client.objects["out/large.pdf"] == large.read_bytes()
+    assert store.url("large.pdf", expires_in=60) == "https://s3.test/bucket/out/large.pdf?expires_in=60"
+
+
+def test_s3_store_aborts_a_failed_multipart_upload(tmp_path):
+    large = tmp_path / "large.pdf"
+    large.write_bytes(b"x" * 2500)
+    client = FakeS3(fail_part=2)
+    store = storage.S3ObjectStore("bucket", part_size=1000, client=client)
+
+    with pytest.raises(OSError):
+        store.put(large)
+    assert client.calls == ["create_multipart_upload", "abort_multipart_upload"]
+    assert "large.pdf" not in client.objects
+
+
+def test_signed_download_urls_expire_and_resist_tampering(tmp_path):
+    from urllib.parse import parse_qs, urlparse
+
+    store = storage.LocalObjectStore(_store(tmp_path), secret="s3cret")
+
+    def query(url):
+        params = parse_qs(urlparse(url).query)
+        return int(params["expires"][0]), params["signature"][0]
+
+    expires, signature = query(store.url("out.pdf"))
+    assert store.verify("out.pdf", expires, signature)
+    assert not store.verify("other.pdf", expires, signature)
+    assert not store.verify("out.pdf", expires + 1, signature)
+    assert not store.verify("out.pdf", None, None)
+    assert not store.verify("out.pdf", *query(store.url("out.pdf", expires_in=-1)))
+    # Without a secret the links are plain and always valid
+    assert storage.LocalObjectStore(_store(tmp_path)).url("out.pdf") == "/api/download/out.pdf"
+
+
+def test_local_store_moves_outside_outputs_under_its_root(tmp_path):
+    store = storage.LocalObjectStore(_store(tmp_path))
+    outside = tmp_path / "made-elsewhere.pdf"
+    outside.write_bytes(b"%PDF")
+
+    assert store.put(outside) == "made-elsewhere.pdf"
+    assert not outside.exists()
+    assert store.storage.locate("made-elsewhere.pdf").read_bytes() == b"%PDF"
+
+
+def test_link_or_copy_links_then_clones_then_copies(tmp_path, monkeypatch):
+    source = tmp_path / "in.pdf"
+    source.write_bytes(b"%PDF-1.7 content")
+    target = tmp_path / "out.pdf"
+    target.write_bytes(b"partial output")
+
+    assert storage.link_or_copy(source, target) == "link"
+    assert target.stat().st_ino == source.stat().st_ino
+
+    def cross_device(*args):
+        raise OSError(18, "Invalid cross-device link")
+
+    monkeypatch.setattr(os, "link", cross_device)
+    monkeypatch.setattr(storage.fcntl, "ioctl", cross_device)
+    assert storage.link_or_copy(source, target) == "copy"
+    assert target.read_bytes() == source.read_bytes()
+    assert target.stat().st_ino != source.stat().st_ino
+
+
+def test_linked_outputs_are_never_written_through(tmp_path):
+    store = _store(tmp_path)
+    source = tmp_path / "in.pdf"
+    source.write_bytes(b"input")
+    storage.link_or_copy(source, store.path_for("out.pdf"))
+
+    # A later writer of the same name gets a fresh file, not the shared inode
+    store.path_for("out.pdf").write_bytes(b"new output")
+    assert source.read_bytes() == b"input"
+
+
+def test_passthrough_of_an_in_memory_input_writes_its_bytes(tmp_path):
+    import asyncio
+
+    from documents import DocumentStore
+
+    documents = DocumentStore(_store(tmp_path))
+    path = asyncio.run(documents.save("a.pdf", b"%PDF small"))
+    documents.passthrough(path, tmp_path / "out.pdf")
+    assert (tmp_path / "out.pdf").read_bytes() == b"%PDF small"
@@ -0,0 +1,38 @@
+import fitz
+
+from typesetter import PDFTypesetter
+
+
+def _text(path) -> str:
+    with fitz.open(path) as doc:
+        return "".join(page.get_text() for page in doc)
+
+
+def test_windows_1252_punctuation_survives(tmp_path):
+    text = "He said “hello” — it’s €5 … café"
+    output = tmp_path / "out.pdf"
+    with PDFTypesetter(output) as typesetter:
+        typesetter.write_paragraph(text)
+
+    assert _text(output).strip() == text
+
+
+def test_characters_outside_windows_1252_are_replaced(tmp_path):
+    output = tmp_path / "out.pdf"
+    with PDFTypesetter(output, font_name="Courier") as typesetter:
+        typesetter.write_lines(["α → é"])
+
+    assert _text(output).strip() == "? ? é"
+
+
+def test_long_paragraphs_wrap_and_paginate(tmp_path):
+    output = tmp_path / "out.pdf"
+    with PDFTypesetter(output) as typesetter:
+        for _ in range(200):
+            typesetter.write_paragraph("word " * 60)
+
+    with fitz.open(output) as doc:
+        assert doc.page_count == typesetter.page_count > 1
+        for page in doc:
+            for block in page.get_text("blocks"):
+                assert block[2] <= page.rect.width - 72 + 1
@@ -0,0 +1,205 @@
+import zlib
+from pathlib import Path
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Standard 14 fonts need no embedding; Courier is fixed-pitch at 600/1000 em
+MONOSPACE_FONTS = {"Courier", "Courier-Bold", "Courier-Oblique", "Courier-BoldOblique"}
+
+# The fonts are declared /WinAnsiEncoding, which is Windows code page 1252
+ENCODING = "cp1252"
+
+# Per-font glyph width tables (1/1000 em, keyed by character), built once
+_width_tables: Dict[str, Dict[str, float]] = {}
+
+
+def _get_width_table(font_name: str) -> Dict[str, float]:
+    """Return cached glyph widths for every character a standard font can set"""
+    table = _width_tables.get(font_name)
+    if table is None:
+        from reportlab.pdfbase import pdfmetrics
+
+        table = {}
+        for code in range(256):
+            try:
+                char = bytes([code]).decode(ENCODING)
+            except UnicodeDecodeError:
+                continue  # The five codes WinAnsi leaves undefined
+            table[char] = pdfmetrics.stringWidth(char, font_name, 1000)
+        _width_tables[font_name] = table
+    return table
+
+
+class PDFTypesetter:
+    """Stream wrapped text into a PDF file, writing each page as soon as it fills
+
+    Only object offsets are kept in memory, so output size does not affect
+    memory use. Text is set in one of the standard 14 fonts with WinAnsi
+    encoding; characters outside Windows-1252 are replaced with "?".
+    """
+
+    def __init__(self, output_path: Path, page_size: Tuple[float, float] = (612, 792),
+                 margin: float = 72, font_name: str = "Helvetica",
+                 font_size: float = 10, leading: Optional[float] = None):
+        self.output_path = output_path
+        self.page_width, self.page_height = page_size
+        self.margin = margin
+        self.font_name = font_name
+        self.font_size = font_size
+        self.leading = leading or font_size * 1.2
+
+        self.text_width = self.page_width - 2 * margin
+        self.lines_per_page = max(1, int((self.page_height - 2 * margin) // self.leading))
+
+        # Fixed-pitch fonts wrap by character count instead of measuring glyphs
+        self.columns = None
+        if font_name in MONOSPACE_FONTS:
+            self.columns = max(1, int(self.text_width // (0.6 * font_size)))
+
+        self._file = open(output_path, "wb")
+        self._offsets: List[int] = []  # Byte offset of each object, by number - 1
+        self._page_objects: List[int] = []
+        self._page_lines: List[bytes] = []
+
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        # Objects 1 (catalog) and 2 (page tree) are written on close
+        self._offsets.extend([0, 0])
+        self._font_object = self._write_object(
+            f"<< /Type /Font /Subtype /Type1 /BaseFont /{font_name} "
+            f"/Encoding /WinAnsiEncoding >>".encode()
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_objects)
+
+    def write_lines(self, lines: Iterable[str]):
+        """Set pre-broken lines (e.g. a text file), hard-wrapping any that overflow"""
+        for line in lines:
+            line = line.rstrip("\r\n")
+            if self.columns is not None:
+                # Fast path: slice by column count, no per-glyph work
+                line = line.expandtabs(8)
+                if len(line) <= self.columns:
+                    self._add_line(line)
+                else:
+                    for start in range(0, len(line), self.columns):
+                        self._add_line(line[start:start + self.columns])
+            else:
+                self.write_paragraph(line)
+
+    def write_paragraph(self, text: str):
+        """Set a paragraph, word-wrapping it to the text width"""
+        if self.columns is not None:
+            self.write_lines(text.split("\n"))
+            return
+
+        widths = _get_width_table(self.font_name)
+        scale = self.font_size / 1000
+        space_width = widths[" "] * scale
+        unknown_width = widths["?"]
+
+        line_words: List[str] = []
+        line_width = 0.0
+        for word in text.replace("\t", "    ").split(" "):
+            word_width = sum(widths.get(c, unknown_width) for c in word) * scale
+
+            # Break words that are wider than a whole line
+            while word_width > self.text_width:
+                if line_words:
+                    self._add_line(" ".join(line_words))
+                    line_words, line_width = [], 0.0
+                cut, cut_width = self._fit_prefix(word, widths, scale)
+                self._add_line(word[:cut])
+                word = word[cut:]
+                word_width -= cut_width
+
+            needed = word_width + (space_width if line_words else 0)
+            if line_words and line_width + needed > self.text_width:
+                self._add_line(" ".join(line_words))
+                line_words, line_width = [word], word_width
+            else:
+                line_words.append(word)
+                line_width += needed
+
+        self._add_line(" ".join(line_words))
+
+    def _fit_prefix(self, word: str, widths: Dict[str, float], scale: float) -> Tuple[int, float]:
+        """Return the length and width of the longest prefix of word that fits a line"""
+        total = 0.0
+        for index, char in enumerate(word):
+            char_width = widths.get(char, widths["?"]) * scale
+            if total + char_width > self.text_width:
+                return max(1, index), total
+            total += char_width
+        return len(word), total
+
+    def _add_line(self, line: str):
+        encoded = line.encode(ENCODING, "replace")
+        escaped = encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+        self._page_lines.append(escaped)
+        if len(self._page_lines) >= self.lines_per_page:
+            self._flush_page()
+
+    def _flush_page(self):
+        """Write the buffered lines out as one page"""
+        top = self.page_height - self.margin - self.font_size
+        content = b"".join([
+            f"BT /F1 {self.font_size:g} Tf {self.leading:g} TL "
+            f"{self.margin:g} {top:g} Td\n".encode(),
+            b"\n".join(b"(" + line + b") Tj T*" for line in self._page_lines),
+            b"\nET",
+        ])
+        compressed = zlib.compress(content, 6)
+
+        content_object = self._write_object(
+            f"<< /Length {len(compressed)} /Filter /FlateDecode >>\nstream\n".encode()
+            + compressed + b"\nendstream"
+        )
+        page_object = self._write_object(
+            f"<< /Type /Page /Parent 2 0 R "
+            f"/MediaBox [0 0 {self.page_width:g} {self.page_height:g}] "
+            f"/Resources << /Font << /F1 {self._font_object} 0 R >> >> "
+            f"/Contents {content_object} 0 R >>".encode()
+        )
+        self._page_objects.append(page_object)
+        self._page_lines = []
+
+    def _write_object(self, body: bytes, number: Optional[int] = None) -> int:
+        if number is None:
+            self._offsets.append(0)
+            number = len(self._offsets)
+        self._offsets[number - 1] = self._file.tell()
+        self._file.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+        return number
+
+    def close(self):
+        """Flush the last page and write the page tree, xref table and trailer"""
+        if self._page_lines or not self._page_objects:
+            self._flush_page()
+
+        kids = " ".join(f"{number} 0 R" for number in self._page_objects)
+        self._write_object(
+            f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_objects)} >>".encode(), 2
+        )
+        self._write_object(b"<< /Type /Catalog /Pages 2 0 R >>", 1)
+
+        xref_offset = self._file.tell()
+        self._file.write(f"xref\n0 {len(self._offsets) + 1}\n0000000000 65535 f \n".encode())
+        self._file.write(b"".join(f"{offset:010d} 00000 n \n".encode() for offset in self._offsets))
+        self._file.write(
+            f"trailer\n<< /Size {len(self._offsets) + 1} /Root 1 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n".encode()
+        )
+        self._file.close()
@@ -4,6 +4,11 @@ import logging
 from typing import Optional, List, Dict, Any
 import itertools
 
+from stats import counted
+from storage import processed
+from documents import documents
+from inspection import inspections
+
 logger = logging.getLogger(__name__)
 
 class PDFUnlocker:
@@ -24,17 +29,16 @@ class PDFUnlocker:
             "company", "business", "personal", "work", "home", "office"
         ]
     
+    @counted("unlock")
     async def unlock(self, input_path: Path, password: Optional[str] = None) -> Path:
         """Unlock PDF file"""
         
-        output_dir = Path("processed")
-        output_path = output_dir / f"unlocked_{input_path.name}"
+        output_path = processed.path_for(f"unlocked_{input_path.name}")
         
         # First, check if PDF is encrypted
         if not await self._is_encrypted(input_path):
-            # Not encrypted, just copy
-            import shutil
-            shutil.copy2(input_path, output_path)
+            # Not encrypted: the output is the input itself
+            documents.passthrough(input_path, output_path)
             return output_path
         
         # Try provided password first
@@ -74,16 +78,7 @@ class PDFUnlocker:
     
     async def _is_encrypted(self, input_path: Path) -> bool:
         """Check if PDF is encrypted"""
-        try:
-            import pikepdf
-            
-            with pikepdf.open(input_path) as pdf:
-                return pdf.is_encrypted
-                
-        except pikepdf.PasswordError:
-            return True
-        except Exception:
-            return False
+        return inspections.encryption(input_path)["encrypted"]
     
     async def _unlock_with_password(self, input_path: Path, output_path: Path, 
                                    password: str) -> Path:
@@ -92,7 +87,7 @@ class PDFUnlocker:
             import pikepdf
             
             # Try to open with password
-            pdf = pikepdf.open(input_path, password=password)
+            pdf = documents.open_pikepdf(input_path, password=password)
             
             # Save without encryption
             pdf.save(output_path, encryption=False)
@@ -119,7 +114,7 @@ class PDFUnlocker:
                 
                 # Try word as-is
                 try:
-                    pdf = pikepdf.open(input_path, password=word)
+                    pdf = documents.open_pikepdf(input_path, password=word)
                     pdf.save(output_path, encryption=False)
                     pdf.close()
                     logger.info(f"Dictionary attack successful: {word}")
@@ -142,7 +137,7 @@ class PDFUnlocker:
                         break
                     
                     try:
-                        pdf = pikepdf.open(input_path, password=variation)
+                        pdf = documents.open_pikepdf(input_path, password=variation)
                         pdf.save(output_path, encryption=False)
                         pdf.close()
                         logger.info(f"Dictionary attack successful: {variation}")
@@ -173,7 +168,7 @@ class PDFUnlocker:
                     password = ''.join(combo)
                     
                     try:
-                        pdf = pikepdf.open(input_path, password=password)
+                        pdf = documents.open_pikepdf(input_path, password=password)
                         pdf.save(output_path, encryption=False)
                         pdf.close()
                         logger.info(f"Brute force successful: {password}")
@@ -195,7 +190,7 @@ class PDFUnlocker:
             
             # Try to open with empty password
             try:
-                pdf = pikepdf.open(input_path, password="")
+                pdf = documents.open_pikepdf(input_path, password="")
                 pdf.save(output_path, encryption=False)
                 pdf.close()
                 return output_path
@@ -204,7 +199,7 @@ class PDFUnlocker:
             
             # Try with QPDF repair
             try:
-                pdf = pikepdf.open(input_path, allow_overwriting_input=True)
+                pdf = documents.open_pikepdf(input_path, allow_overwriting_input=True)
                 
                 # Remove encryption info from trailer
                 if '/Encrypt' in pdf.trailer:
@@ -238,44 +233,27 @@ class PDFUnlocker:
     
     async def get_encryption_info(self, input_path: Path) -> Dict[str, Any]:
         """Get information about PDF encryption"""
-        try:
-            import pikepdf
-            
-            info = {
-                "is_encrypted": False,
-                "encryption_type": None,
-                "permissions": {},
-                "metadata_encrypted": False,
-                "version": None
-            }
-            
-            try:
-                pdf = pikepdf.open(input_path)
-                info["is_encrypted"] = pdf.is_encrypted
-                
-                if pdf.is_encrypted:
-                    # Try to get encryption details
-                    try:
-                        # Get encryption dictionary
-                        if '/Encrypt' in pdf.trailer:
-                            encrypt = pdf.trailer['/Encrypt']
-                            info["encryption_type"] = str(encrypt.get('/Filter', ''))
-                            info["version"] = str(encrypt.get('/V', ''))
-                            info["length"] = str(encrypt.get('/Length', ''))
-                    except:
-                        pass
-                
-                pdf.close()
-                
-            except pikepdf.PasswordError:
-                info["is_encrypted"] = True
-                info["requires_password"] = True
-            
-            return info
-            
-        except Exception as e:
-            logger.error(f"Encryption info error: {e}")
-            return {"is_encrypted": False, "error": str(e)}
+        record = inspections.encryption(input_path)
+        info = {
+            "is_encrypted": record["encrypted"],
+            "encryption_type": None,
+            "permissions": record["permissions"] if record["encrypted"] else {},
+            "metadata_encrypted": False,
+            "version": None
+        }
+        
+        encryption = record["encryption"]
+        if encryption:
+            # AES-256, AES-128 or RC4
+            info["encryption_type"] = encryption["cipher"]
+            info["filter"] = encryption["filter"]
+            info["version"] = encryption["version"]
+            info["revision"] = encryption["revision"]
+            info["length"] = encryption["length"]
+            info["metadata_encrypted"] = encryption["metadata_encrypted"]
+        if record["needs_password"]:
+            info["requires_password"] = True
+        return info
     
     async def estimate_unlock_time(self, input_path: Path, 
                                   method: str = "dictionary") -> Dict[str, Any]:
@@ -294,7 +272,7 @@ class PDFUnlocker:
         
         # Check encryption strength
         encryption_type = info.get("encryption_type", "")
-        if "AES" in encryption_type or info.get("length") == "256":
+        if "AES" in encryption_type or info.get("length") == 256:
             return {
                 "estimated_time": estimates["impossible"],
                 "method": "password_required",
@@ -0,0 +1,129 @@
+"""Worker node: runs tool jobs pulled from the job broker
+
+    FLIPFILE_BROKER=sqlite:/srv/flipfile/jobs.db python worker.py --concurrency 2
+
+Run it from the same working directory (or shared volume) as the API, since
+jobs refer to uploads by path. Outputs are published to the object store when
+it is remote, so any front end can serve them.
+"""
+import argparse
+import asyncio
+import signal
+import threading
+from pathlib import Path
+import logging
+from typing import Any, Dict
+
+from jobs import OPERATIONS, JobBroker, create_broker, worker_name
+from storage import objects
+from prefork import Supervisor, preload
+from registry import registry
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def _publish(result: Any):
+    """Upload output files so they outlive this node; results keep their local paths"""
+    if isinstance(result, list):
+        for item in result:
+            _publish(item)
+    elif isinstance(result, Path) and result.is_file():
+        objects.put(result)
+
+
+async def run_job(broker: JobBroker, name: str, job: Dict[str, Any]):
+    # The lease is kept alive from a thread, so it is renewed whatever the job is doing
+    done = threading.Event()
+
+    def heartbeat():
+        while not done.wait(broker.lease / 3):
+            broker.extend(job["id"], name)
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    try:
+        # The tools block while they work, so each job gets a thread (and event
+        # loop) of its own; that is what lets --concurrency jobs overlap
+        result = await asyncio.to_thread(asyncio.run, registry.entry(job["operation"])(**job["params"]))
+        if objects.remote:
+            await asyncio.to_thread(_publish, result)
+    except Exception as e:
+        logger.error(f"Job {job['id']} ({job['operation']}) failed: {e}")
+        await asyncio.to_thread(broker.fail, job["id"], name, str(e))
+        return
+    finally:
+        done.set()
+    await asyncio.to_thread(broker.complete, job["id"], name, result)
+    logger.info(f"Job {job['id']} ({job['operation']}) done")
+
+
+async def work(broker: JobBroker, operations, stopping: asyncio.Event, poll: float,
+               budget: Dict[str, int]):
+    name = worker_name()
+    while not stopping.is_set():
+        job = await asyncio.to_thread(broker.claim, name, operations)
+        if job is None:
+            try:
+                await asyncio.wait_for(stopping.wait(), poll)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await run_job(broker, name, job)
+        budget["left"] -= 1
+        if budget["left"] == 0:
+            # Recycle: let the supervisor fork a fresh process
+            logger.info(f"Worker {name} reached its job limit, exiting")
+            stopping.set()
+
+
+async def main_async(args):
+    broker = create_broker()
+    if broker is None:
+        raise SystemExit("Set FLIPFILE_BROKER=sqlite:<path> to run a worker")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        # Finish the jobs in hand, then exit; nothing is lost either way
+        loop.add_signal_handler(sig, stopping.set)
+
+    # A budget of 0 never reaches 0 again on the way down, so it means unlimited
+    budget = {"left": args.max_jobs}
+    logger.info(f"Worker {worker_name()} running {', '.join(args.operations)} x{args.concurrency}")
+    await asyncio.gather(*(work(broker, args.operations, stopping, args.poll, budget)
+                           for _ in range(args.concurrency)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run FlipFile tool jobs from the job broker")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Jobs to run at once in this process, one thread each (they overlap"
+                             " on I/O, Ghostscript and GIL-releasing libraries; use --processes"
+                             " for CPU-bound work)")
+    parser.add_argument("--operations", type=lambda value: value.split(","), default=list(OPERATIONS),
+                        help="Comma-separated operations to accept")
+    parser.add_argument("--poll", type=float, default=0.5,
+                        help="Seconds to wait between polls of an empty queue")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Forked worker processes sharing preloaded libraries")
+    parser.add_argument("--max-jobs", type=int, default=0,
+                        help="Recycle a process after this many jobs (0 = never)")
+    args = parser.parse_args()
+
+    # Load the tools this node accepts up front, before forking, rather than on the first job.
+    # The broker is created in main_async, after the fork; the module-level
+    # stores the tools import reset their SQLite handles in each child.
+    registry.preload(args.operations)
+    if args.processes <= 1 and not args.max_jobs:
+        asyncio.run(main_async(args))
+        return
+
+    timings = preload()
+    logger.info(f"Preloaded {len(timings)} modules in {sum(timings.values()):.2f}s")
+    Supervisor(lambda slot: asyncio.run(main_async(args)), args.processes).run()
+
+
+if __name__ == "__main__":
+    main()